@@ -0,0 +1,44 @@
+"""
+Shows how transform_cfn() (the work of Tagger.cfntransformer()) scales with the size of a template.
+
+    $ python benchmarks/bench_cfntransformer.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# pylint: disable=wrong-import-position
+from cfntagger.cfntagger import transform_cfn
+
+
+def dumped_template(nr_of_resources: int) -> str:
+    """
+    Returns a string shaped like a yaml.dump result, with list and json tagged resources
+    """
+    lines = ["---", "AWSTemplateFormatVersion: 2010-09-09", "Resources:"]
+    for i in range(nr_of_resources):
+        if i % 2:
+            restype = "AWS::SSM::Parameter"
+            tags = ["        Creator: kristof", "        Team: Devops"]
+        else:
+            restype = "AWS::S3::Bucket"
+            tags = ["      - Key: Creator", "        Value: kristof", "      - Key: Team", "        Value: Devops"]
+        lines += [f"  Resource{i}:", f"    Type: {restype}", "    Properties:", "", "      Tags:"] + tags
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    print(f"{'resources':>10} {'lines':>8} {'seconds':>8} {'us/resource':>12}")
+    for nr_of_resources in (1000, 2500, 5000, 10000):
+        template = dumped_template(nr_of_resources)
+        seconds = min(timeit.repeat(lambda t=template: transform_cfn(t), number=1, repeat=5))
+        print(
+            f"{nr_of_resources:>10} {template.count(chr(10)):>8} {seconds:>8.3f} "
+            f"{seconds / nr_of_resources * 1e6:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
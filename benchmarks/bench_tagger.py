@@ -0,0 +1,249 @@
+"""
+Benchmarks cfntagger on synthetic templates (see benchmarks/synthetic.py):
+    - per template size: the time to load a template into a Tagger, to tag its
+      resources, to dump it, to run cfntransformer() on the dump and to write it,
+      and the peak memory of load + tag + write. In patch mode, the time to
+      load a template and to edit the tags into its text
+    - the same templates as JSON (like CDK generates them), which take the json
+      route instead of the yaml one
+    - a directory tree of templates, tagged sequentially and with --jobs
+
+Results are stored per cfntagger version, and compared with a previous run to
+catch regressions:
+
+    $ python benchmarks/bench_tagger.py --save
+    $ python benchmarks/bench_tagger.py --compare benchmarks/results/0.10.3.json
+
+The compare exits with 1 when a timing or peak memory is more than --threshold
+worse than the baseline.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# pylint: disable=wrong-import-position
+from benchmarks.synthetic import BENCHMARK_TAGS, generate_template, generate_tree
+from cfntagger.cfntagger import RunContext, Tagger, get_yaml
+from cfntagger.runner import run
+from cfntagger.version import __version__
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def best_of(repeat: int, setup: Callable, measured: Callable) -> float:
+    """
+    Returns the fastest of repeat timings of measured(setup())
+    """
+    timings = []
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        measured(arg)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_template(resources: int, args, context: RunContext, workdir: str) -> Dict:
+    filename = os.path.join(workdir, f"template-{resources}.yml")
+    template = generate_template(
+        resources=resources, tags_per_resource=args.tags, json_ratio=args.json_ratio,
+        comments=not args.no_comments, intrinsics=not args.no_intrinsics,
+    )
+
+    def fresh_file():
+        with open(filename, "w", encoding='utf-8') as f:
+            f.write(template)
+        return filename
+
+    def loaded():
+        return Tagger(fresh_file(), simulate=False, context=context)
+
+    def tagged():
+        tagger = loaded()
+        tagger.tag_resources()
+        return tagger
+
+    def patch_tagged():
+        tagger = Tagger(fresh_file(), simulate=False, context=context, patch=True)
+        tagger.tag_resources()
+        return tagger
+
+    def dumped():
+        tagger = tagged()
+        stream = io.StringIO()
+        get_yaml().dump(tagger.data, stream)
+        return tagger, stream.getvalue()
+
+    def write(tagger):
+        with open(tagger.filename, "w", encoding='utf-8') as f:
+            tagger.dump(f)
+
+    result = {
+        "load": best_of(args.repeat, fresh_file, lambda f: Tagger(f, simulate=False, context=context)),
+        "tag": best_of(args.repeat, loaded, lambda tagger: tagger.tag_resources()),
+        "dump": best_of(args.repeat, tagged, lambda tagger: get_yaml().dump(tagger.data, io.StringIO())),
+        "cfntransformer": best_of(args.repeat, dumped, lambda arg: arg[0].cfntransformer(arg[1])),
+        "write": best_of(args.repeat, tagged, write),
+        "patch_load": best_of(args.repeat, fresh_file, lambda f: Tagger(f, simulate=False, context=context, patch=True)),
+        "patch_write": best_of(args.repeat, patch_tagged, write),
+    }
+
+    tracemalloc.start()
+    tagger = loaded()
+    tagger.tag_resources()
+    write(tagger)
+    result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return result
+
+
+def bench_json_template(resources: int, args, context: RunContext, workdir: str) -> Dict:
+    filename = os.path.join(workdir, f"template-{resources}.json")
+    data = get_yaml("safe").load(generate_template(
+        resources=resources, tags_per_resource=args.tags, json_ratio=args.json_ratio,
+        comments=False, intrinsics=not args.no_intrinsics,
+    ))
+    # The unquoted AWSTemplateFormatVersion loads as a date
+    template = json.dumps(data, indent=1, default=str) + "\n"
+
+    def fresh_file():
+        with open(filename, "w", encoding='utf-8') as f:
+            f.write(template)
+        return filename
+
+    def loaded():
+        return Tagger(fresh_file(), simulate=False, context=context)
+
+    def tagged():
+        tagger = loaded()
+        tagger.tag_resources()
+        return tagger
+
+    def write(tagger):
+        with open(tagger.filename, "w", encoding='utf-8') as f:
+            tagger.dump(f)
+
+    result = {
+        "load": best_of(args.repeat, fresh_file, lambda f: Tagger(f, simulate=False, context=context)),
+        "tag": best_of(args.repeat, loaded, lambda tagger: tagger.tag_resources()),
+        "write": best_of(args.repeat, tagged, write),
+    }
+
+    tracemalloc.start()
+    tagger = loaded()
+    tagger.tag_resources()
+    write(tagger)
+    result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return result
+
+
+def bench_tree(args, context: RunContext, workdir: str) -> Dict:
+    result = {}
+    for jobs in sorted({1, args.jobs}):
+        root = os.path.join(workdir, f"tree-{jobs}")
+        cfnfiles = generate_tree(root, files=args.files, resources=args.tree_resources, tags_per_resource=args.tags)
+        start = time.perf_counter()
+        for _ in run(cfnfiles, jobs=jobs, context=context, simulate=False):
+            pass
+        result[f"jobs{jobs}"] = time.perf_counter() - start
+    return result
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> bool:
+    """
+    Prints the results relative to the baseline, returns False when one of
+    them regressed more than threshold (a fraction)
+    """
+    ok = True
+    print(f"\nCompared with {baseline['version']} ({baseline['timestamp']}):")
+    for bench, metrics in results["benchmarks"].items():
+        for metric, value in metrics.items():
+            previous = baseline["benchmarks"].get(bench, {}).get(metric)
+            if not previous:
+                continue
+            ratio = value / previous
+            regressed = ratio > 1 + threshold
+            ok = ok and not regressed
+            print(f"{bench + ' ' + metric:<40} {ratio:>8.2f}x{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def report(results: Dict):
+    for bench, metrics in results["benchmarks"].items():
+        for metric, value in metrics.items():
+            if metric == "peak_memory":
+                print(f"{bench + ' ' + metric:<40} {value / 1024 / 1024:>10.1f} MiB")
+            else:
+                print(f"{bench + ' ' + metric:<40} {value * 1000:>10.1f} ms")
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark cfntagger on synthetic templates")
+    parser.add_argument("--resources", type=int, nargs="+", default=[10, 100, 1000],
+                        help="template sizes to benchmark, in resources")
+    parser.add_argument("--tags", type=int, default=3, help="maximum tags per resource")
+    parser.add_argument("--json-ratio", type=float, default=0.2, help="fraction of resources with json tags")
+    parser.add_argument("--no-comments", action="store_true", help="generate templates without comments")
+    parser.add_argument("--no-intrinsics", action="store_true", help="generate templates without !Sub/!Ref")
+    parser.add_argument("--files", type=int, default=1000, help="number of templates in the directory tree")
+    parser.add_argument("--tree-resources", type=int, default=20, help="resources per template in the tree")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="jobs for the parallel tree run")
+    parser.add_argument("--repeat", type=int, default=5, help="repeats per timing, the fastest counts")
+    parser.add_argument("--save", action="store_true", help=f"store the results in {RESULTS_DIR}")
+    parser.add_argument("--compare", metavar="RESULTS", help="compare with previously saved results")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown against --compare before failing (default: 0.25 = 25%%)")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = get_parser().parse_args(argv)
+    os.environ["CFN_TAGS"] = json.dumps(BENCHMARK_TAGS)
+    context = RunContext()
+
+    results = {
+        "version": __version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "benchmarks": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir, redirect_stdout(io.StringIO()):
+        for resources in args.resources:
+            results["benchmarks"][f"template-{resources}"] = bench_template(resources, args, context, workdir)
+            results["benchmarks"][f"template-json-{resources}"] = bench_json_template(resources, args, context, workdir)
+        if args.files:
+            results["benchmarks"][f"tree-{args.files}"] = bench_tree(args, context, workdir)
+
+    report(results)
+
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{__version__}.json")
+        with open(path, "w", encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved to {path}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Compares the per-file cost of setting up a fresh YAML engine with reusing the
+engines of cfntagger.get_yaml(), and the round-trip loader with the safe
+(C-accelerated when ruamel.yaml.clib is installed) loader.
+
+    $ python benchmarks/bench_yaml_setup.py
+"""
+import io
+import os
+import sys
+import timeit
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# pylint: disable=wrong-import-position
+from ruamel.yaml import YAML
+from cfntagger.cfntagger import get_yaml
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'templates', 'canary-template.yml')
+NUMBER = 200
+
+
+def fresh_engine() -> YAML:
+    yaml = YAML()
+    yaml.explicit_start = True
+    yaml.indent(mapping=2)
+    yaml.line_break = True
+    yaml.width = 200
+    yaml.preserve_quotes = True
+    yaml.Representer.add_representer(OrderedDict, yaml.Representer.represent_dict)
+    return yaml
+
+
+def roundtrip(yaml: YAML, template: str):
+    data = yaml.load(template)
+    yaml.dump(data, io.StringIO())
+
+
+def report(name: str, seconds: float):
+    print(f"{name:<40} {seconds / NUMBER * 1e6:>10.0f} us/file")
+
+
+def main():
+    with open(TEMPLATE, encoding='utf-8') as f:
+        template = f.read()
+
+    report("setup: fresh YAML()", min(timeit.repeat(fresh_engine, number=NUMBER, repeat=5)))
+    report("setup: get_yaml()", min(timeit.repeat(get_yaml, number=NUMBER, repeat=5)))
+    report(
+        "load+dump: fresh engine per file",
+        min(timeit.repeat(lambda: roundtrip(fresh_engine(), template), number=NUMBER, repeat=5)),
+    )
+    report(
+        "load+dump: shared engine",
+        min(timeit.repeat(lambda: roundtrip(get_yaml(), template), number=NUMBER, repeat=5)),
+    )
+    report("load: round-trip", min(timeit.repeat(lambda: get_yaml().load(template), number=NUMBER, repeat=5)))
+    report("load: safe", min(timeit.repeat(lambda: get_yaml("safe").load(template), number=NUMBER, repeat=5)))
+    print(f"safe parser: {get_yaml('safe').Parser.__module__}.{get_yaml('safe').Parser.__name__}")
+
+
+if __name__ == "__main__":
+    main()
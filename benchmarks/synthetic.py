@@ -0,0 +1,139 @@
+"""
+Generator for synthetic CloudFormation templates and directory trees of templates,
+used by the benchmarks.
+"""
+import os
+import random
+from dataclasses import dataclass
+from typing import List
+
+LIST_RESOURCETYPES = [
+    "AWS::S3::Bucket",
+    "AWS::EC2::Instance",
+    "AWS::SQS::Queue",
+    "AWS::SNS::Topic",
+    "AWS::Lambda::Function",
+    "AWS::DynamoDB::Table",
+]
+JSON_RESOURCETYPES = [
+    "AWS::SSM::Parameter",
+    "AWS::Serverless::Function",
+    "AWS::Glue::Job",
+]
+UNTAGGED_RESOURCETYPES = [
+    "AWS::EC2::Route",
+    "AWS::IAM::Policy",
+]
+
+# What the benchmarks tag the synthetic templates with: Tag0 is found on most
+# resources, but with another value, Creator is never found.
+BENCHMARK_TAGS = {"Tag0": "benchmark", "Tag1": "value1", "Creator": "cfntagger"}
+
+
+@dataclass(frozen=True)
+class TemplateShape:
+    """
+    The shape of a synthetic template:
+        - json_ratio of the resources take json (key/value map) tags, untagged_ratio
+          don't support tags, the others take Key/Value list tags
+        - each taggable resource gets up to tags_per_resource tags
+        - optionally with comments and intrinsic functions (!Sub, !Ref)
+    """
+    resources: int = 100
+    tags_per_resource: int = 3
+    json_ratio: float = 0.2
+    untagged_ratio: float = 0.1
+    comments: bool = True
+    intrinsics: bool = True
+
+
+def resource_lines(i: int, shape: TemplateShape, rng: random.Random) -> List[str]:
+    """
+    Returns the lines of the i-th resource of a template
+    """
+    draw = rng.random()
+    if draw < shape.untagged_ratio:
+        restype, tagformat = rng.choice(UNTAGGED_RESOURCETYPES), None
+    elif draw < shape.untagged_ratio + shape.json_ratio:
+        restype, tagformat = rng.choice(JSON_RESOURCETYPES), "json"
+    else:
+        restype, tagformat = rng.choice(LIST_RESOURCETYPES), "list"
+
+    lines = [f"  # Resource {i} of {shape.resources}"] if shape.comments else []
+    lines += [f"  Resource{i}:", f"    Type: {restype}", "    Properties:"]
+    if shape.intrinsics:
+        lines.append(f'      Name: !Sub "${{AWS::StackName}}-resource-{i}"')
+    else:
+        lines.append(f"      Name: resource-{i}")
+
+    nr_of_tags = rng.randint(0, shape.tags_per_resource) if tagformat else 0
+    if nr_of_tags > 0:
+        lines.append("      Tags:" + ("  # tags of this resource" if shape.comments else ""))
+    for t in range(nr_of_tags):
+        value = "!Ref Environment" if shape.intrinsics and t == nr_of_tags - 1 else f"value{t}"
+        if tagformat == "json":
+            lines.append(f"        Tag{t}: {value}")
+        else:
+            lines += [f"        - Key: Tag{t}", f"          Value: {value}"]
+    lines.append("")
+    return lines
+
+
+def generate_template(seed: int = 0, **shape) -> str:
+    """
+    Returns a CloudFormation template of the given shape, see TemplateShape for
+    the arguments
+    """
+    shape = TemplateShape(**shape)
+    rng = random.Random(seed)
+    lines = [
+        "---",
+        "AWSTemplateFormatVersion: 2010-09-09",
+        "Description: Synthetic template for benchmarking cfntagger",
+        "",
+        "Parameters:",
+        "  Environment:",
+        "    Type: String",
+        "",
+        "Resources:",
+    ]
+    for i in range(shape.resources):
+        lines += resource_lines(i, shape, rng)
+
+    return "\n".join(lines)
+
+
+def generate_noise(seed: int = 0) -> str:
+    """
+    Returns a yaml file which is not a CloudFormation template (a docker-compose file)
+    """
+    rng = random.Random(seed)
+    lines = ["version: '3'", "services:"]
+    for i in range(rng.randint(1, 5)):
+        lines += [f"  service{i}:", f"    image: example/service{i}:latest", "    ports:", f"      - {8000 + i}:80"]
+    return "\n".join(lines) + "\n"
+
+
+def generate_tree(
+    root: str, files: int = 1000, files_per_dir: int = 50, noise_ratio: float = 0.0, seed: int = 0, **template_args
+) -> List[str]:
+    """
+    Writes a directory tree of files templates below root, files_per_dir per
+    directory, and returns their paths. A noise_ratio of the files are yaml
+    files which are no CloudFormation templates.
+    Other arguments are passed on to generate_template().
+    """
+    rng = random.Random(seed)
+    paths = []
+    for i in range(files):
+        directory = os.path.join(root, f"stack{i // files_per_dir:04d}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"template{i:05d}.yml")
+        with open(path, "w", encoding='utf-8') as f:
+            if rng.random() < noise_ratio:
+                f.write(generate_noise(seed=seed + i))
+            else:
+                f.write(generate_template(seed=seed + i, **template_args))
+        paths.append(path)
+
+    return paths
@@ -1 +1,42 @@
-from .cfntagger import Tagger
+# pylint: disable=undefined-all-variable
+import importlib
+from typing import TYPE_CHECKING
+
+# The public API, imported on first use (PEP 562), so importing the package
+# (e.g. to run the command line tool) doesn't import ruamel.yaml right away
+_EXPORTS = {
+    "Tagger": ".cfntagger",
+    "RunContext": ".cfntagger",
+    "tag_template": ".api",
+    "CfnTaggerError": ".api",
+    "InvalidTemplateError": ".api",
+    "InvalidTagsError": ".api",
+    "RESOURCE_TYPES": ".resourcetypes",
+    "TAGFORMAT_LIST": ".resourcetypes",
+    "TAGFORMAT_JSON": ".resourcetypes",
+    "get_tag_format": ".resourcetypes",
+    "supports_tags": ".resourcetypes",
+    "uses_json_tags": ".resourcetypes",
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    # For type checkers and linters, which don't run __getattr__
+    from .api import tag_template, CfnTaggerError, InvalidTemplateError, InvalidTagsError
+    from .cfntagger import Tagger, RunContext
+    from .resourcetypes import (
+        RESOURCE_TYPES, TAGFORMAT_LIST, TAGFORMAT_JSON, get_tag_format, supports_tags, uses_json_tags
+    )
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,107 @@
+import io
+from typing import Dict, Optional, Tuple
+
+from ruamel.yaml.error import YAMLError
+
+from .cfntagger import get_yaml, tag_resources, transform_cfn
+
+
+class CfnTaggerError(Exception):
+    """
+    Base class of the errors raised by the library API
+    """
+
+
+class InvalidTemplateError(CfnTaggerError, ValueError):
+    """
+    The template is no valid yaml, or no CloudFormation template
+    """
+
+
+class InvalidTagsError(CfnTaggerError, ValueError):
+    """
+    The tags to add are not a dict of tag key => value
+    """
+
+
+def load_template(text: str):
+    """
+    Parses a template with the round-trip engine, so it can be dumped with its
+    comments and formatting preserved
+    """
+    try:
+        return get_yaml().load(text)
+    except (YAMLError, ValueError) as e:
+        raise InvalidTemplateError(f"malformed template: {e}") from e
+
+
+def dump_template(data) -> str:
+    """
+    Returns a (tagged) template as text, formatted like the command line tool does
+    """
+    stream = io.StringIO()
+    get_yaml().dump(data, stream, transform=transform_cfn)
+    return stream.getvalue()
+
+
+def check_tags(tags, what: str = "tags"):
+    if not isinstance(tags, dict) or not all(isinstance(key, str) for key in tags):
+        raise InvalidTagsError(f"{what} must be a dict of tag key => value, got {type(tags).__name__}")
+
+
+def tag_template(template, tags: Dict, git_tags: Optional[Dict] = None) -> Tuple:
+    """
+    Adds the tags to all resources of a template which support tags, and
+    updates the tags with another value. The template is either:
+        - yaml text (str or utf-8 bytes) or a text stream, the result is the
+          tagged template as text
+        - a template loaded as a dict (preferably with the round-trip engine of
+          cfntagger.get_yaml(), which preserves comments), the result is the
+          same dict, tagged in place
+    git_tags (e.g. gitrepo and gitfile) are merged in after the tags.
+
+    Returns a tuple (result, report), where report has:
+        - changed: whether any resource changed
+        - resources: per tagged resource its type and the lists of foundtags,
+          addedtags and updatedtags keys, like Tagger.stats
+    Raises InvalidTemplateError or InvalidTagsError.
+    """
+    check_tags(tags)
+    if git_tags is not None:
+        check_tags(git_tags, "git_tags")
+
+    if hasattr(template, "read"):
+        template = template.read()
+    if isinstance(template, bytes):
+        try:
+            template = template.decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise InvalidTemplateError(f"template is not utf-8 encoded: {e}") from e
+
+    text = isinstance(template, str)
+    data = load_template(template) if text else template
+
+    if not isinstance(data, dict):
+        raise InvalidTemplateError("template is not a mapping")
+    resources = data.get("Resources")
+    if not isinstance(resources, dict):
+        raise InvalidTemplateError("template has no Resources section")
+    for name, resource in resources.items():
+        if not isinstance(resource, dict) or not isinstance(resource.get("Properties", {}), dict):
+            raise InvalidTemplateError(f"resource {name} is not a mapping with Properties")
+
+    resourcereport = tag_resources(resources, tags, git_tags)
+    report = {
+        "changed": any(entry["changed"] for entry in resourcereport.values()),
+        "resources": {
+            name: {
+                "type": entry["type"],
+                "foundtags": list(entry["found"]),
+                "addedtags": entry["added"],
+                "updatedtags": entry["updated"],
+            }
+            for name, entry in resourcereport.items()
+        },
+    }
+
+    return (dump_template(data) if text else data), report
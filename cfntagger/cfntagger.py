@@ -1,13 +1,99 @@
-from collections import OrderedDict
+import io
 import os
 import re
 import sys
 import json
-from typing import List, Dict
+import threading
+from typing import Any, Iterable, Iterator, List, Dict, Optional, TextIO, Tuple, Union
 from configparser import ConfigParser
-import git
-from colorama import Fore, Style
 from ruamel.yaml import YAML
+from ruamel.yaml.comments import CommentedMap
+from ruamel.yaml.constructor import SafeConstructor
+from ruamel.yaml.error import YAMLError
+from ruamel.yaml.nodes import Node, ScalarNode, SequenceNode
+from ruamel.yaml.scalarstring import ScalarString
+from ruamel.yaml.tokens import CommentToken
+from .resourcetypes import TAGGABLE_RESOURCETYPES, JSON_RESOURCETYPES, supports_tags, uses_json_tags
+from .colors import Fore, Style
+from .fileio import atomic_write, FSYNC_ALWAYS
+from .options import RunOptions, make_options
+from .patch import CannotPatch, apply_edits, patch_edits
+from .prefilter import JSON_EXTENSIONS
+from .timings import Timings
+
+
+class CfnSafeConstructor(SafeConstructor):
+    """
+    Safe constructor which loads CloudFormation intrinsic functions in their
+    long form, e.g. !Ref foo as {"Ref": "foo"} and !Sub bar as {"Fn::Sub": "bar"}
+    """
+
+
+def construct_intrinsic_function(constructor, tag_suffix, node):
+    name = "Ref" if tag_suffix == "Ref" else f"Fn::{tag_suffix}"
+    if isinstance(node, ScalarNode):
+        return {name: constructor.construct_scalar(node)}
+    if isinstance(node, SequenceNode):
+        return {name: constructor.construct_sequence(node, deep=True)}
+    return {name: constructor.construct_mapping(node, deep=True)}
+
+
+CfnSafeConstructor.add_multi_constructor('!', construct_intrinsic_function)
+
+_yaml_engines = threading.local()
+# The first key of a JSON document, with the whitespace around its colon
+_JSON_KEY = re.compile(r'"(?:[^"\\\n]|\\.)*"([ \t]*):([ \t]*)')
+_JSON_INDENT = re.compile(r'\n([ \t]+)\S')
+
+
+def get_yaml(typ: str = "rt") -> YAML:
+    """
+    Returns a YAML engine, created and configured once per thread (ruamel
+    engines are not thread safe, but can be reused for many loads and dumps):
+        - rt: the round-trip engine, which preserves comments, quotes and formatting
+        - safe: a read-only engine, which uses the C-accelerated parser of
+          ruamel.yaml.clib if it's installed. Only use it when the template is
+          not written back.
+    """
+    engines = _yaml_engines.__dict__
+    if typ not in engines:
+        if typ == "safe":
+            yaml = YAML(typ="safe")
+            yaml.Constructor = CfnSafeConstructor
+        else:
+            yaml = YAML()
+            yaml.explicit_start = True
+            yaml.indent(mapping=2)
+            yaml.line_break = True
+            yaml.width = 200
+            yaml.preserve_quotes = True
+        engines[typ] = yaml
+    return engines[typ]
+
+
+def safe_load(text: str):
+    """
+    Loads yaml with the safe engine. libyaml is stricter than the round-trip
+    parser, e.g. it rejects a plain scalar with a : (like AWS::S3::Bucket) in
+    a flow mapping, so what it can't load is loaded with the round-trip engine.
+    """
+    try:
+        return get_yaml("safe").load(text)
+    except YAMLError:
+        return get_yaml().load(text)
+
+
+def compose(text: str) -> Tuple[Optional[Node], Any]:
+    """
+    Loads a template to patch with the safe engine, returns its node tree and
+    its data. Raises CannotPatch if the safe engine can't read it, see safe_load().
+    """
+    yaml = get_yaml("safe")
+    try:
+        node = yaml.compose(text)
+        return node, yaml.constructor.construct_document(node) if node is not None else None
+    except YAMLError as e:
+        raise CannotPatch(f"the safe loader can't read it: {getattr(e, 'problem', None) or e}") from e
 
 
 def get_tag_kv(resourcetag, resourcetaglist):
@@ -29,18 +115,376 @@ def get_tag_kv(resourcetag, resourcetaglist):
         return resourcetag, resourcetaglist.get(resourcetag)
 
 
-def load_config():
+def new_tag_block(json_tags: bool = False):
+    """
+    Returns an empty tag block: a key/value map for resource types using json tags,
+    a Key/Value list otherwise
+    """
+    return CommentedMap() if json_tags else []
+
+
+def new_tag(key: str, value) -> CommentedMap:
+    return CommentedMap([("Key", key), ("Value", value)])
+
+
+def last_scalar_position(node):
+    """
+    Returns the (mapping, key) of the last scalar in a node, which is where
+    ruamel keeps the comment lines following the node. None if there's none.
+    """
+    while True:
+        if isinstance(node, dict) and len(node) > 0:
+            key = next(reversed(node))
+            if isinstance(node[key], (dict, list)) and len(node[key]) > 0:
+                node = node[key]
+                continue
+            return node, key
+        if isinstance(node, list) and len(node) > 0:
+            node = node[-1]
+            continue
+        return None
+
+
+def move_trailing_comment(src, dst):
+    """
+    Moves the comment lines trailing a node (e.g. a blank line and the comments in
+    front of the next resource) from src to dst, both positions as returned by
+    last_scalar_position(). This keeps them below the nodes added at the end of a
+    block. An end-of-line comment stays where it is.
+    """
+    if src is None or dst is None or (src[0] is dst[0] and src[1] == dst[1]):
+        return
+    (srcmap, srckey), (dstmap, dstkey) = src, dst
+    if not hasattr(srcmap, 'ca') or not hasattr(dstmap, 'ca'):
+        return
+
+    comment = srcmap.ca.items.get(srckey)
+    if not comment or len(comment) < 3 or comment[2] is None:
+        return
+
+    token = comment[2]
+    eol, _, trailing = token.value.partition('\n')
+    if not trailing:
+        return
+
+    dstmap.ca.items[dstkey] = [None, None, CommentToken('\n' + trailing, token.start_mark), None]
+    if eol.strip():
+        token.value = eol + '\n'
+    else:
+        comment[2] = None
+
+
+def keep_style(oldvalue, newvalue):
+    """
+    Returns newvalue, quoted the same way as the oldvalue it replaces
+    """
+    if isinstance(oldvalue, ScalarString) and isinstance(newvalue, str):
+        return type(oldvalue)(newvalue)
+    return newvalue
+
+
+def merge_tags(tags, obligatory_tags: Dict, json_tags: bool = False):
+    """
+    Merges the obligatory tags into a tag block (None if there's none yet).
+    Existing tags are indexed by key once and updated in place, so the nodes
+    loaded from the template (and their comments) are preserved. Only a tag
+    block which isn't in the format of the resource type is rebuilt.
+    Returns a tuple of:
+        - the merged tag block
+        - the tags found, as a dict of key => value in template order
+        - the set of added tag keys
+        - the set of updated tag keys
+    """
+    found = {}
+    nodes = {}
+    for tag in tags or []:
+        key, value = get_tag_kv(tag, tags)
+        if key not in found:
+            found[key] = value
+            nodes[key] = tag
+
+    if tags is None or isinstance(tags, dict) != json_tags:
+        merged = new_tag_block(json_tags)
+        for key, value in found.items():
+            if json_tags:
+                merged[key] = value
+            else:
+                nodes[key] = new_tag(key, value)
+                merged.append(nodes[key])
+    else:
+        merged = tags
+
+    trailing = last_scalar_position(merged)
+    added = set()
+    updated = set()
+    for key, value in obligatory_tags.items():
+        if key not in found:
+            added.add(key)
+            if json_tags:
+                merged[key] = f"{value}"
+            else:
+                merged.append(new_tag(key, f"{value}"))
+        elif found[key] != value:
+            updated.add(key)
+            if json_tags:
+                merged[key] = keep_style(found[key], value)
+            else:
+                nodes[key]["Value"] = keep_style(found[key], value)
+
+    if added:
+        move_trailing_comment(trailing, last_scalar_position(merged))
+
+    return merged, found, added, updated
+
+
+def transform_cfn_lines(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Single forward pass over the lines of a yaml.dump result, which removes
+    an empty line in front of a tag block. Lines are yielded as soon as they're
+    final, only an empty line is held back.
+    """
+    blank = None            # an empty line, held back until we know no tag block follows
+
+    for line in lines:
+        if blank is not None:
+            if not line.lstrip().startswith('Tags:'):
+                yield blank
+            # else: we have an empty line before a tag block, let's remove it
+            blank = None
+
+        if line == '':
+            blank = line
+            continue
+
+        yield line
+
+    if blank is not None:
+        yield blank
+
+
+def transform_cfn(s: str) -> str:
+    """
+    Removes faulty tag formatting from a yaml.dump result
+    """
+    return '\n'.join(transform_cfn_lines(s.split('\n')))
+
+
+# The yaml written to a TransformStream is transformed in chunks of (at least) this many characters
+TRANSFORM_CHUNK = 1 << 16
+
+
+class TransformStream:
+    """
+    Text stream which applies transform_cfn() to the yaml dumped to it on the fly
+    and writes the result to another stream, so the dump of a template is never
+    held in memory as a whole. Once a chunk is full, everything up to the last
+    line which is not empty is transformed and written: transform_cfn() only
+    looks ahead from an empty line. close() transforms and writes the rest.
+    """
+    # ruamel writes text (not bytes) to streams which have an encoding
+    encoding = None
+
+    def __init__(self, stream, timings: Optional[Timings] = None):
+        self.stream = stream
+        self.timings = timings if timings is not None else Timings(enabled=False)
+        self.parts: List[str] = []
+        self.size = 0
+        self.first = True
+
+    def write(self, data: str):
+        self.parts.append(data)
+        self.size += len(data)
+        if self.size >= TRANSFORM_CHUNK:
+            self.transform(final=False)
+
+    def transform(self, final: bool):
+        pending = ''.join(self.parts)
+        if final:
+            lines, rest = pending, ''
+        else:
+            end = pending.rfind('\n')
+            while end > 0 and pending[end - 1] == '\n':
+                end -= 1
+            if end <= 0:
+                return
+            lines, rest = pending[:end], pending[end + 1:]
+        self.parts = [rest]
+        self.size = len(rest)
+
+        with self.timings.phase("transform"):
+            transformed = '\n'.join(transform_cfn_lines(lines.split('\n')))
+        if not self.first:
+            transformed = '\n' + transformed
+        self.first = False
+        self.stream.write(transformed)
+        if self.timings.enabled:
+            self.timings.count("bytes_written", len(transformed.encode('utf-8')))
+
+    def close(self):
+        self.transform(final=True)
+
+
+def is_json_template(filename: str, text: str) -> bool:
+    """
+    Returns whether a template is JSON: all .json files, and the .template
+    files (which are either JSON or yaml) starting with a {
+    """
+    if filename.endswith(".json"):
+        return True
+    return filename.endswith(".template") and text.lstrip(" \t\r\n").startswith("{")
+
+
+def get_json_style(text: str) -> Dict:
+    """
+    Returns the json.dump arguments which reproduce the layout of a JSON
+    document: its indentation (none when it's on a single line), the
+    whitespace around colons and commas and whether non-ascii characters
+    were escaped. Whether it ends with a newline is kept as "newline".
+    """
+    indent = _JSON_INDENT.search(text)
+    key = _JSON_KEY.search(text)
+    colon = f"{key.group(1)}:{key.group(2)}" if key else ": "
+
+    if indent is None:
+        indentation = None
+        comma = ", " if colon.endswith(" ") else ","
+    else:
+        whitespace = indent.group(1)
+        indentation = len(whitespace) if whitespace.strip(" ") == "" else whitespace
+        comma = ","
+
+    return {
+        "indent": indentation,
+        "separators": (comma, colon),
+        "ensure_ascii": text.isascii(),
+        "newline": text.endswith("\n"),
+    }
+
+
+def json_chunks(data, style: Dict, chunked: bool = False) -> Iterator[str]:
+    """
+    Yields a JSON template as text in the given style (see get_json_style): in
+    one go, or chunked as it's encoded, which is slower but doesn't hold the
+    whole text in memory
+    """
+    options = {key: value for key, value in style.items() if key != "newline"}
+    if chunked:
+        yield from json.JSONEncoder(**options).iterencode(data)
+    else:
+        yield json.dumps(data, **options)
+    if style["newline"]:
+        yield "\n"
+
+
+def set_resource_tags(resource: Dict, tags):
+    """
+    Sets the tags of a resource. A resource without Properties is valid CFN,
+    so we might need to add a Properties block as well.
+    """
+    if "Properties" not in resource:
+        trailing = last_scalar_position(resource)
+        resource["Properties"] = CommentedMap([("Tags", tags)])
+        move_trailing_comment(trailing, last_scalar_position(resource))
+
+    properties = resource["Properties"]
+    if "Tags" not in properties:
+        trailing = last_scalar_position(properties)
+        properties["Tags"] = tags
+        move_trailing_comment(trailing, last_scalar_position(properties))
+    elif properties["Tags"] is not tags:
+        properties["Tags"] = tags
+
+
+def tag_resources(resources: Dict, obligatory_tags: Dict, git_tags: Optional[Dict] = None) -> Dict:
+    """
+    Merges the obligatory tags (and the git tags, if any) into all resources
+    which support tags, in place. Doesn't print nor raise on missing tags.
+    Returns a dict of resource => report, in template order, where a report has:
+        - type: the resource type
+        - found: the tags found, as a dict of key => value
+        - added: the obligatory tags added, in config order
+        - updated: the obligatory tags changed, in template order
+        - converted: whether its tags were converted to the format of the resource type
+        - gitfound, gitadded, gitupdated: the same for the git tags
+        - changed: whether the resource changed, including git tags and a conversion
+    """
+    report = {}
+    for name, resource in (resources or {}).items():
+        restype = resource.get("Type") if isinstance(resource, dict) else None
+        if supports_tags(restype):
+            report[name] = tag_resource(resource, obligatory_tags, git_tags)
+
+    return report
+
+
+def tag_resource(resource: Dict, obligatory_tags: Dict, git_tags: Optional[Dict] = None) -> Dict:
+    """
+    Merges the obligatory tags (and the git tags, if any) into one resource
+    which supports tags, in place. Returns its report, see tag_resources()
+    """
+    restype = resource["Type"]
+    json_tags = uses_json_tags(restype)
+
+    restags = None
+    converted = False
+    if "Properties" in resource:
+        restags = resource.get("Properties").get("Tags")
+        # Tags which are not in the format of the resource type are converted
+        converted = restags is not None and isinstance(restags, dict) != json_tags
+
+    merged, found, added, updated = merge_tags(restags, obligatory_tags, json_tags)
+    changed = converted or bool(added or updated)
+    gitfound, gitadded, gitupdated = {}, set(), set()
+    if git_tags:
+        merged, gitfound, gitadded, gitupdated = merge_tags(merged, git_tags, json_tags)
+        changed = changed or bool(gitadded or gitupdated)
+
+    if restags is not None or len(merged) > 0:
+        set_resource_tags(resource, merged)
+
+    return {
+        "type": restype,
+        "found": found,
+        "added": [key for key in obligatory_tags if key in added],
+        "updated": [key for key in found if key in updated],
+        "converted": converted,
+        "gitfound": gitfound,
+        "gitadded": [key for key in git_tags or {} if key in gitadded],
+        "gitupdated": [key for key in gitfound if key in gitupdated],
+        "changed": changed,
+    }
+
+
+def get_repo_root() -> Optional[str]:
+    """
+    Returns the root dir of the git repo we're in, or None if this ain't a git repo.
+    Looks for the .git dir (or file, for worktrees and submodules) ourselves, so
+    a run without git features doesn't need to import GitPython.
+    """
+    directory = os.getcwd()
+    while True:
+        if os.path.exists(os.path.join(directory, ".git")):
+            return directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def load_config(repo_root: Optional[str] = None):
     """
     This function constructs a JSON string with the tags to add, either found in (in this order):
         - a configfile in the git root dir (or current dir) in ini-file format
         - the envvar CFN_TAGS in json format
     """
 
-    try:
+    if repo_root is None:
+        repo_root = get_repo_root()
+
+    if repo_root is not None:
         # Find a .cfntaggerrc in the git root dir
-        repo = git.Repo('.', search_parent_directories=True)
-        configfile = f"{repo.working_tree_dir}/.cfntaggerrc"
-    except git.exc.InvalidGitRepositoryError:
+        configfile = f"{repo_root}/.cfntaggerrc"
+    else:
         # This ain't a git repo, just try the current dir
         configfile = "./.cfntaggerrc"
 
@@ -64,540 +508,181 @@ def load_config():
     return configstr
 
 
+class RunContext:
+    """
+    Run-scoped cache of the tag config and the git metadata. Everything is resolved
+    once, on first use, and shared by all Taggers of a run. Only plain values are
+    cached, so a context can be handed to worker processes as well.
+    Call invalidate() when the config or the repo changes during a run.
+    """
+    def __init__(self):
+        self._resolved: dict = {}
+
+    def invalidate(self):
+        """
+        Drops all cached values, they will be resolved again on next use
+        """
+        self._resolved = {}
+
+    def resolve(self, setgit: bool = False):
+        """
+        Resolves everything a run needs upfront, e.g. before fanning out to workers
+        """
+        _ = self.obligatory_tags
+        if setgit:
+            _ = self.remote
+
+    @property
+    def repo_root(self) -> Optional[str]:
+        if "repo_root" not in self._resolved:
+            self._resolved["repo_root"] = get_repo_root()
+        return self._resolved["repo_root"]
+
+    @property
+    def obligatory_tags(self) -> Dict:
+        if "obligatory_tags" not in self._resolved:
+            obligatory_tags_str = load_config(repo_root=self.repo_root)
+            try:
+                obligatory_tags = json.loads(obligatory_tags_str)
+            except json.decoder.JSONDecodeError as e:
+                print(f"{Fore.RED}FAIL: malformed CFN_TAGS JSON => {e}{Style.RESET_ALL}")
+                sys.exit(1)
+            except TypeError:
+                print(
+                    f"{Fore.RED}FAIL: Please set CFN_TAGS as environment variable{Style.RESET_ALL}"
+                )
+                sys.exit(1)
+            self._resolved["obligatory_tags"] = obligatory_tags
+        return self._resolved["obligatory_tags"]
+
+    @property
+    def remote(self) -> str:
+        if "remote" not in self._resolved:
+            if self.repo_root is None:
+                print("FAIL: this is no git repo, please drop the --git argument")
+                sys.exit(1)
+            import git  # pylint: disable=import-outside-toplevel
+
+            try:
+                remote = git.Repo(self.repo_root).remote().url
+            except ValueError as e:
+                print(f"FAIL: could not find the git remote => {e}")
+                sys.exit(1)
+
+            # remove any tokens from the remote string
+            self._resolved["remote"] = re.sub('https://[a-zA-Z0-9_]+@', 'https://', remote)
+        return self._resolved["remote"]
+
+    def get_git_path(self, filename: str) -> str:
+        """
+        Returns the relative path for a file from the repo root dir
+        instead of any abritrary path the user has given us
+        """
+        return os.path.relpath(os.path.realpath(filename), os.path.realpath(self.repo_root))
+
+
 
 class Tagger:
     """
-    Main class for cfntagger
+    Main class for cfntagger: tags one template, as set by the options of the
+    run. simulate and setgit (when given) and the other options passed by
+    keyword override those options, e.g. Tagger(filename, False) or
+    Tagger(filename, options=options, quiet=True). source is the text of the
+    template, if it was read already.
     """
-    def __init__(self, filename: str, simulate: bool = True, setgit: bool = False):
+    resourcetypes_to_tag = TAGGABLE_RESOURCETYPES
+    resourcetypes_json = JSON_RESOURCETYPES
+
+    # simulate and setgit stay positional, as before the run options
+    def __init__(  # pylint: disable=too-many-arguments
+        self, filename: str, simulate: Optional[bool] = None, setgit: Optional[bool] = None, *,
+        options: Optional[RunOptions] = None, context: Optional[RunContext] = None, source: Optional[str] = None,
+        **overrides
+    ):
+        if simulate is not None:
+            overrides["simulate"] = simulate
+        if setgit is not None:
+            overrides["setgit"] = setgit
+        options = make_options(options, **overrides)
         self.filename: str = filename
+        self.context = context if context is not None else RunContext()
         self.resources: dict = {}
         self.stats: dict = {}
         self.obligatory_tags: dict = {}
-        self.simulate = simulate
-        self.git = setgit
-        self.has_properties = True
-        self.resourcetypes_json = [
-            "AWS::AmplifyUIBuilder::Component",
-            "AWS::AmplifyUIBuilder::Form",
-            "AWS::AmplifyUIBuilder::Theme",
-            "AWS::ApiGatewayV2::Api",
-            "AWS::ApiGatewayV2::DomainName",
-            "AWS::ApiGatewayV2::Stage",
-            "AWS::ApiGatewayV2::VpcLink",
-            "AWS::Batch::ComputeEnvironment",
-            "AWS::Batch::JobDefinition",
-            "AWS::Batch::JobQueue",
-            "AWS::Batch::SchedulingPolicy",
-            "AWS::CodeStarNotifications::NotificationRule",
-            "AWS::DAX::Cluster",
-            "AWS::FIS::ExperimentTemplate",
-            "AWS::Glue::Crawler",
-            "AWS::Glue::DataQualityRuleset",
-            "AWS::Glue::DevEndpoint",
-            "AWS::Glue::Job",
-            "AWS::Glue::MLTransform",
-            "AWS::Glue::Trigger",
-            "AWS::Glue::Workflow",
-            "AWS::M2::Application",
-            "AWS::M2::Environment",
-            "AWS::MSK::Cluster",
-            "AWS::MSK::ServerlessCluster",
-            "AWS::MSK::VpcConnection",
-            "AWS::MWAA::Environment",
-            "AWS::Pipes::Pipe",
-            "AWS::ResilienceHub::App",
-            "AWS::ResilienceHub::ResiliencyPolicy",
-            "AWS::ResourceExplorer2::Index",
-            "AWS::ResourceExplorer2::View",
-            "AWS::Serverless::Function",
-            "AWS::ServiceCatalogAppRegistry::Application",
-            "AWS::ServiceCatalogAppRegistry::AttributeGroup",
-            "AWS::SecurityHub::AutomationRule",
-            "AWS::SecurityHub::Hub",
-            "AWS::SSM::Parameter",
-        ]
-        self.resourcetypes_to_tag: List = [
-            "AWS::ACMPCA::CertificateAuthority",
-            "AWS::Amplify::App",
-            "AWS::Amplify::Branch",
-            "AWS::AmplifyUIBuilder::Component",
-            "AWS::AmplifyUIBuilder::Form",
-            "AWS::AmplifyUIBuilder::Theme",
-            "AWS::AccessAnalyzer::Analyzer",
-            "AWS::ApiGateway::ClientCertificate",
-            "AWS::ApiGateway::DomainName",
-            "AWS::ApiGateway::RestApi",
-            "AWS::ApiGateway::Stage",
-            "AWS::ApiGateway::UsagePlan",
-            "AWS::ApiGateway::VpcLink",
-            "AWS::ApiGatewayV2::Api",
-            "AWS::ApiGatewayV2::DomainName",
-            "AWS::ApiGatewayV2::Stage",
-            "AWS::ApiGatewayV2::VpcLink",
-            "AWS::AppConfig::Application",
-            "AWS::AppConfig::ConfigurationProfile",
-            "AWS::AppConfig::Deployment",
-            "AWS::AppConfig::DeploymentStrategy",
-            "AWS::AppConfig::Environment",
-            "AWS::AppConfig::Extension",
-            "AWS::AppConfig::ExtensionAssociation",
-            "AWS::AppFlow::Flow",
-            "AWS::AppIntegrations::DataIntegration",
-            "AWS::AppIntegrations::EventIntegration",
-            "AWS::ApplicationInsights::Application",
-            "AWS::AppMesh::GatewayRoute",
-            "AWS::AppMesh::Mesh",
-            "AWS::AppMesh::Route",
-            "AWS::AppMesh::VirtualGateway",
-            "AWS::AppMesh::VirtualNode",
-            "AWS::AppMesh::VirtualRouter",
-            "AWS::AppMesh::VirtualService",
-            "AWS::AppStream::AppBlock",
-            "AWS::AppStream::AppBlockBuilder",
-            "AWS::AppStream::Application",
-            "AWS::AppStream::Fleet",
-            "AWS::AppStream::ImageBuilder",
-            "AWS::AppStream::Stack",
-            "AWS::AppSync::GraphQLApi",
-            "AWS::APS::RuleGroupsNamespace",
-            "AWS::APS::Workspace",
-            "AWS::Athena::CapacityReservation",
-            "AWS::Athena::DataCatalog",
-            "AWS::Athena::WorkGroup",
-            "AWS::AuditManager::Assessment",
-            "AWS::BackupGateway::Hypervisor",
-            "AWS::Batch::ComputeEnvironment",
-            "AWS::Batch::JobDefinition",
-            "AWS::Batch::JobQueue",
-            "AWS::Batch::SchedulingPolicy",
-            "AWS::BillingConductor::BillingGroup",
-            "AWS::BillingConductor::CustomLineItem",
-            "AWS::BillingConductor::PricingPlan",
-            "AWS::BillingConductor::PricingRule",
-            "AWS::Cassandra::Keyspace",
-            "AWS::Cassandra::Table",
-            "AWS::CertificateManager::Certificate",
-            "AWS::CleanRooms::Collaboration",
-            "AWS::CleanRooms::ConfiguredTable",
-            "AWS::CleanRooms::ConfiguredTableAssociation",
-            "AWS::CleanRooms::Membership",
-            "AWS::Cloud9::EnvironmentEC2",
-            "AWS::CloudFormation::Stack",
-            "AWS::CloudFormation::StackSet",
-            "AWS::CloudFront::Distribution",
-            "AWS::CloudFront::StreamingDistribution",
-            "AWS::CloudTrail::Channel",
-            "AWS::CloudTrail::EventDataStore",
-            "AWS::CloudTrail::Trail",
-            "AWS::CloudWatch::InsightRule",
-            "AWS::CloudWatch::MetricStream",
-            "AWS::CodeBuild::Project",
-            "AWS::CodeBuild::ReportGroup",
-            "AWS::CodeArtifact::Domain",
-            "AWS::CodeArtifact::Repository",
-            "AWS::CodeCommit::Repository",
-            "AWS::CodeDeploy::Application",
-            "AWS::CodeDeploy::DeploymentGroup",
-            "AWS::CodeGuruProfiler::ProfilingGroup",
-            "AWS::CodeGuruReviewer::RepositoryAssociation",
-            "AWS::CodePipeline::CustomActionType",
-            "AWS::CodePipeline::Pipeline",
-            "AWS::CodeStarConnections::Connection",
-            "AWS::CodeStarNotifications::NotificationRule",
-            "AWS::Comprehend::DocumentClassifier",
-            "AWS::Comprehend::Flywheel",
-            "AWS::Config::AggregationAuthorization",
-            "AWS::Config::ConfigurationAggregator",
-            "AWS::Config::StoredQuery",
-            "AWS::Connect::ContactFlow",
-            "AWS::Connect::ContactFlowModule",
-            "AWS::Connect::EvaluationForm",
-            "AWS::Connect::HoursOfOperation",
-            "AWS::Connect::PhoneNumber",
-            "AWS::Connect::Prompt",
-            "AWS::Connect::QuickConnect",
-            "AWS::Connect::Rule",
-            "AWS::Connect::TaskTemplate",
-            "AWS::Connect::User",
-            "AWS::ConnectCampaigns::Campaign",
-            "AWS::CustomerProfiles::CalculatedAttributeDefinition",
-            "AWS::CustomerProfiles::Domain",
-            "AWS::CustomerProfiles::EventStream",
-            "AWS::CustomerProfiles::Integration",
-            "AWS::CustomerProfiles::ObjectType",
-            "AWS::DataBrew::Dataset",
-            "AWS::DataBrew::Job",
-            "AWS::DataBrew::Project",
-            "AWS::DataBrew::Recipe",
-            "AWS::DataBrew::Ruleset",
-            "AWS::DataBrew::Schedule",
-            "AWS::DLM::LifecyclePolicy",
-            "AWS::DataSync::Agent",
-            "AWS::DataSync::LocationEFS",
-            "AWS::DataSync::LocationFSxLustre",
-            "AWS::DataSync::LocationFSxONTAP",
-            "AWS::DataSync::LocationFSxOpenZFS",
-            "AWS::DataSync::LocationFSxWindows",
-            "AWS::DataSync::LocationHDFS",
-            "AWS::DataSync::LocationNFS",
-            "AWS::DataSync::LocationObjectStorage",
-            "AWS::DataSync::LocationS3",
-            "AWS::DataSync::LocationSMB",
-            "AWS::DataSync::StorageSystem",
-            "AWS::DataSync::Task",
-            "AWS::DAX::Cluster",
-            "AWS::Detective::Graph",
-            "AWS::DeviceFarm::DevicePool",
-            "AWS::DeviceFarm::InstanceProfile",
-            "AWS::DeviceFarm::NetworkProfile",
-            "AWS::DeviceFarm::Project",
-            "AWS::DeviceFarm::TestGridProject",
-            "AWS::DeviceFarm::VPCEConfiguration",
-            "AWS::DMS::Endpoint",
-            "AWS::DMS::EventSubscription",
-            "AWS::DMS::ReplicationInstance",
-            "AWS::DMS::ReplicationSubnetGroup",
-            "AWS::DMS::ReplicationTask",
-            "AWS::DocDB::DBCluster",
-            "AWS::DocDB::DBClusterParameterGroup",
-            "AWS::DocDB::DBInstance",
-            "AWS::DocDB::DBSubnetGroup",
-            "AWS::DocDBElastic::Cluster",
-            "AWS::DynamoDB::Table",
-            "AWS::EC2::CarrierGateway",
-            "AWS::EC2::CustomerGateway",
-            "AWS::EC2::DHCPOptions",
-            "AWS::EC2::EIP",
-            "AWS::EC2::FlowLog",
-            "AWS::EC2::Instance",
-            "AWS::EC2::InternetGateway",
-            "AWS::EC2::IPAM",
-            "AWS::EC2::IPAMPool",
-            "AWS::EC2::IPAMResourceDiscovery",
-            "AWS::EC2::IPAMResourceDiscoveryAssociation",
-            "AWS::EC2::KeyPair",
-            "AWS::EC2::LocalGatewayRouteTable",
-            "AWS::EC2::LocalGatewayRouteTableVirtualInterfaceGroupAssociation",
-            "AWS::EC2::LocalGatewayRouteTableVPCAssociation",
-            "AWS::EC2::NatGateway",
-            "AWS::EC2::NetworkAcl",
-            "AWS::EC2::NetworkInsightsAccessScope",
-            "AWS::EC2::NetworkInsightsAccessScopeAnalysis",
-            "AWS::EC2::NetworkInsightsAnalysis",
-            "AWS::EC2::NetworkInsightsPath",
-            "AWS::EC2::NetworkInterface",
-            "AWS::EC2::PlacementGroup",
-            "AWS::EC2::PrefixList",
-            "AWS::EC2::RouteTable",
-            "AWS::EC2::SecurityGroup",
-            "AWS::EC2::Subnet",
-            "AWS::EC2::TrafficMirrorFilter",
-            "AWS::EC2::TrafficMirrorSession",
-            "AWS::EC2::TrafficMirrorTarget",
-            "AWS::EC2::TransitGateway",
-            "AWS::EC2::TransitGatewayAttachment",
-            "AWS::EC2::TransitGatewayConnect",
-            "AWS::EC2::TransitGatewayMulticastDomain",
-            "AWS::EC2::TransitGatewayPeeringAttachment",
-            "AWS::EC2::TransitGatewayRouteTable",
-            "AWS::EC2::TransitGatewayVpcAttachment",
-            "AWS::EC2::VerifiedAccessEndpoint",
-            "AWS::EC2::VerifiedAccessGroup",
-            "AWS::EC2::VerifiedAccessInstance",
-            "AWS::EC2::VerifiedAccessTrustProvider",
-            "AWS::EC2::VPNConnection",
-            "AWS::EC2::VPNGateway",
-            "AWS::EC2::Volume",
-            "AWS::EC2::VPC",
-            "AWS::ECR::PublicRepository",
-            "AWS::ECR::Repository",
-            "AWS::ECS::CapacityProvider",
-            "AWS::ECS::Cluster",
-            "AWS::ECS::ContainerInstance",
-            "AWS::ECS::Service",
-            "AWS::ECS::Task",
-            "AWS::ECS::TaskDefinition",
-            "AWS::EKS::Cluster",
-            "AWS::EKS::Addon",
-            "AWS::EKS::NodeGroup",
-            "AWS::EKS::FargateProfile",
-            "AWS::EKS::IdentityProviderConfig",
-            "AWS::ElasticBeanstalk::Environment",
-            "AWS::ElastiCache::CacheCluster",
-            "AWS::ElastiCache::ParameterGroup",
-            "AWS::ElastiCache::SecurityGroup",
-            "AWS::ElastiCache::ReplicationGroup",
-            "AWS::ElastiCache::SubnetGroup",
-            "AWS::ElastiCache::Snapshot",
-            "AWS::ElasticLoadBalancing::LoadBalancer",
-            "AWS::ElasticLoadBalancingV2::LoadBalancer",
-            "AWS::ElasticLoadBalancingV2::TargetGroup",
-            "AWS::ElasticSearch::Domain",
-            "AWS::EMR::Cluster",
-            "AWS::EMR::Studio",
-            "AWS::EMRServerless::Application",
-            "AWS::EMRContainers::VirtualCluster",
-            "AWS::Events::EventBus",
-            "AWS::Evidently::Experiment",
-            "AWS::Evidently::Feature",
-            "AWS::Evidently::Launch",
-            "AWS::Evidently::Project",
-            "AWS::Evidently::Segment",
-            "AWS::FinSpace::Environment",
-            "AWS::FIS::ExperimentTemplate",
-            "AWS::FMS::Policy",
-            "AWS::FMS::ResourceSet",
-            "AWS::Forecast::Dataset",
-            "AWS::Forecast::DatasetGroup",
-            "AWS::FraudDetector::Detector",
-            "AWS::FraudDetector::EntityType",
-            "AWS::FraudDetector::EventType",
-            "AWS::FraudDetector::Label",
-            "AWS::FraudDetector::List",
-            "AWS::FraudDetector::Outcome",
-            "AWS::FraudDetector::Variable",
-            "AWS::FSx::DataRepositoryAssociation",
-            "AWS::FSx::FileSystem",
-            "AWS::FSx::Snapshot",
-            "AWS::FSx::StorageVirtualMachine",
-            "AWS::FSx::Volume",
-            "AWS::GlobalAccelerator::Accelerator",
-            "AWS::Glue::Crawler",
-            "AWS::Glue::DataQualityRuleset",
-            "AWS::Glue::DevEndpoint",
-            "AWS::Glue::MLTransform",
-            "AWS::Glue::Job",
-            "AWS::Glue::Registry",
-            "AWS::Glue::Schema",
-            "AWS::Glue::Trigger",
-            "AWS::Glue::Workflow",
-            "AWS::GroundStation::Config",
-            "AWS::GroundStation::DataflowEndpointGroup",
-            "AWS::GroundStation::MissionProfile",
-            "AWS::GuardDuty::Detector",
-            "AWS::GuardDuty::Filter",
-            "AWS::GuardDuty::IPSet",
-            "AWS::GuardDuty::ThreatIntelSet",
-            "AWS::HealthLake::FHIRDatastore",
-            "AWS::IAM::Role",
-            "AWS::IAM::OIDCProvider",
-            "AWS::IAM::SAMLProvider",
-            "AWS::IAM::ServerCertificate",
-            "AWS::IAM::User",
-            "AWS::IAM::VirtualMFADevice",
-            "AWS::ImageBuilder::Component",
-            "AWS::ImageBuilder::ContainerRecipe",
-            "AWS::ImageBuilder::DistributionConfiguration",
-            "AWS::ImageBuilder::Image",
-            "AWS::ImageBuilder::ImagePipeline",
-            "AWS::ImageBuilder::ImageRecipe",
-            "AWS::ImageBuilder::InfrastructureConfiguration",
-            "AWS::InternetMonitor::Monitor",
-            "AWS::Kendra::DataSource",
-            "AWS::Kendra::Faq",
-            "AWS::Kendra::Index",
-            "AWS::KendraRanking::ExecutionPlan",
-            "AWS::SSMIncidents::ReplicationSet",
-            "AWS::SSMIncidents::ResponsePlan",
-            "AWS::KMS::Key",
-            "AWS::KMS::ReplicaKey",
-            "AWS::Kinesis::Stream",
-            "AWS::KinesisAnalyticsV2::Application",
-            "AWS::KinesisFirehose::DeliveryStream",
-            "AWS::KinesisVideo::SignalingChannel",
-            "AWS::KinesisVideo::Stream",
-            "AWS::Lambda::Function",
-            "AWS::Lightsail::Bucket",
-            "AWS::Lightsail::Certificate",
-            "AWS::Lightsail::Container",
-            "AWS::Lightsail::Database",
-            "AWS::Lightsail::Disk",
-            "AWS::Lightsail::Distribution",
-            "AWS::Lightsail::Instance",
-            "AWS::Lightsail::LoadBalancer",
-            "AWS::Logs::LogGroup",
-            "AWS::LookoutEquipment::InferenceScheduler",
-            "AWS::M2::Application",
-            "AWS::M2::Environment",
-            "AWS::Macie::AllowList",
-            "AWS::ManagedBlockchain::Accessor",
-            "AWS::AmazonMQ::Broker",
-            "AWS::AmazonMQ::Configuration",
-            "AWS::MemoryDB::User",
-            "AWS::MemoryDB::ACL",
-            "AWS::MemoryDB::Cluster",
-            "AWS::MemoryDB::ParameterGroup",
-            "AWS::MemoryDB::SubnetGroup",
-            "AWS::MSK::Cluster",
-            "AWS::MSK::ServerlessCluster",
-            "AWS::MSK::VpcConnection",
-            "AWS::MWAA::Environment",
-            "AWS::Neptune::DBSubnetGroup",
-            "AWS::Neptune::DBCluster",
-            "AWS::Neptune::DBClusterParameterGroup",
-            "AWS::Neptune::DBInstance",
-            "AWS::Neptune::DBParameterGroup",
-            "AWS::NetworkFirewall::RuleGroup",
-            "AWS::NetworkFirewall::Firewall",
-            "AWS::NetworkFirewall::FirewallPolicy",
-            "AWS::NetworkManager::ConnectAttachment",
-            "AWS::NetworkManager::ConnectPeer",
-            "AWS::NetworkManager::CoreNetwork",
-            "AWS::NetworkManager::Device",
-            "AWS::NetworkManager::GlobalNetwork",
-            "AWS::NetworkManager::Link",
-            "AWS::NetworkManager::Site",
-            "AWS::NetworkManager::SiteToSiteVpnAttachment",
-            "AWS::NetworkManager::VpcAttachment",
-            "AWS::OpenSearchService::Domain",
-            "AWS::OpenSearchServerless::Collection",
-            "AWS::OpsWorks::Layer",
-            "AWS::OpsWorks::Stack",
-            "AWS::OpsWorksCM::Server",
-            "AWS::Organizations::Account",
-            "AWS::Organizations::OrganizationalUnit",
-            "AWS::Organizations::Policy",
-            "AWS::Organizations::ResourcePolicy",
-            "AWS::OSIS::Pipeline",
-            "AWS::Panorama::ApplicationInstance",
-            "AWS::Panorama::Package",
-            "AWS::Pipes::Pipe",
-            "AWS::Proton::EnvironmentAccountConnection",
-            "AWS::Proton::EnvironmentTemplate",
-            "AWS::Proton::ServiceTemplate",
-            "AWS::QLDB::Ledger",
-            "AWS::QLDB::Stream",
-            "AWS::QuickSight::Theme",
-            "AWS::QuickSight::Analysis",
-            "AWS::QuickSight::Dashboard",
-            "AWS::QuickSight::DataSet",
-            "AWS::QuickSight::DataSource",
-            "AWS::QuickSight::Template",
-            "AWS::RAM::Permission",
-            "AWS::RAM::ResourceShare",
-            "AWS::RDS::DBInstance",
-            "AWS::RDS::DBCluster",
-            "AWS::RDS::DBClusterParameterGroup",
-            "AWS::RDS::DBParameterGroup",
-            "AWS::RDS::DBProxy",
-            "AWS::RDS::DBProxyEndpoint",
-            "AWS::RDS::DBSecurityGroup",
-            "AWS::RDS::DBSubnetGroup",
-            "AWS::RDS::OptionGroup",
-            "AWS::Redshift::Cluster",
-            "AWS::Redshift::ClusterParameterGroup",
-            "AWS::Redshift::ClusterSecurityGroup",
-            "AWS::Redshift::ClusterSubnetGroup",
-            "AWS::Redshift::EventSubscription",
-            "AWS::RedshiftServerless::Namespace",
-            "AWS::RedshiftServerless::Workgroup",
-            "AWS::Rekognition::Collection",
-            "AWS::Rekognition::StreamProcessor",
-            "AWS::ResilienceHub::App",
-            "AWS::ResilienceHub::ResiliencyPolicy",
-            "AWS::ResourceExplorer2::Index",
-            "AWS::ResourceExplorer2::View",
-            "AWS::Route53RecoveryControl::Cluster",
-            "AWS::Route53RecoveryControl::ControlPanel",
-            "AWS::Route53RecoveryControl::SafetyRule",
-            "AWS::Route53Resolver::FirewallDomainList",
-            "AWS::Route53Resolver::FirewallRuleGroup",
-            "AWS::Route53Resolver::FirewallRuleGroupAssociation",
-            "AWS::Route53Resolver::ResolverEndpoint",
-            "AWS::Route53Resolver::ResolverRule",
-            "AWS::RUM::AppMonitor",
-            "AWS::S3::Bucket",
-            "AWS::S3::StorageLens",
-            "AWS::SageMaker::App",
-            "AWS::SageMaker::AppImageConfig",
-            "AWS::SageMaker::CodeRepository",
-            "AWS::SageMaker::DataQualityJobDefinition",
-            "AWS::SageMaker::Device",
-            "AWS::SageMaker::DeviceFleet",
-            "AWS::SageMaker::Domain",
-            "AWS::SageMaker::Endpoint",
-            "AWS::SageMaker::EndpointConfig",
-            "AWS::SageMaker::FeatureGroup",
-            "AWS::SageMaker::Image",
-            "AWS::SageMaker::Model",
-            "AWS::SageMaker::ModelBiasJobDefinition",
-            "AWS::SageMaker::ModelExplainabilityJobDefinition",
-            "AWS::SageMaker::ModelPackage",
-            "AWS::SageMaker::ModelPackageGroup",
-            "AWS::SageMaker::ModelQualityJobDefinition",
-            "AWS::SageMaker::MonitoringSchedule",
-            "AWS::SageMaker::NotebookInstance",
-            "AWS::SageMaker::Pipeline",
-            "AWS::SageMaker::Project",
-            "AWS::SageMaker::UserProfile",
-            "AWS::SageMaker::Workteam",
-            "AWS::Scheduler::ScheduleGroup",
-            "AWS::SecretsManager::Secret",
-            "AWS::Serverless::Function",
-            "AWS::ServiceCatalog::CloudFormationProduct",
-            "AWS::ServiceCatalog::CloudFormationProvisionedProduct",
-            "AWS::ServiceCatalog::Portfolio",
-            "AWS::ServiceCatalogAppRegistry::Application",
-            "AWS::ServiceCatalogAppRegistry::AttributeGroup",
-            "AWS::SecurityHub::AutomationRule",
-            "AWS::SecurityHub::Hub",
-            "AWS::SES::ContactList",
-            "AWS::Shield::Protection",
-            "AWS::Shield::ProtectionGroup",
-            "AWS::SNS::Topic",
-            "AWS::SQS::Queue",
-            "AWS::StepFunctions::Activity",
-            "AWS::StepFunctions::StateMachine",
-            "AWS::SSM::Document",
-            "AWS::SSM::MaintenanceWindow",
-            "AWS::SSM::PatchBaseline",
-            "AWS::SSM::Parameter",
-            "AWS::Synthetics::Canary",
-            "AWS::Synthetics::Group",
-            "AWS::WAFv2::IPSet",
-            "AWS::WAFv2::RegexPatternSet",
-            "AWS::WAFv2::RuleGroup",
-            "AWS::WAFv2::WebACL",
-            "AWS::WorkSpaces::Workspace",
-            "AWS::WorkSpaces::ConnectionAlias",
-            "AWS::XRay::SamplingRule",
-            "AWS::XRay::Group",
-        ]
-
-        yaml = YAML()
-        yaml.explicit_start = True
-        yaml.preserve_quotes = True
-        yaml.line_break = True
-        yaml.width = 200
-
+        self.simulate = options.simulate
+        self.git = options.setgit
+        self.skip_unchanged = options.skip_unchanged
+        self.changed = False
+        self.written = False
+        self.fsync = options.fsync
+        self.check = options.check
+        self.quiet = options.quiet
+        self.patch = options.patch and not options.check
+        self.low_memory = options.low_memory
+        # With defer_write the tagged template is kept in output, for the caller to write it
+        self.defer_write = options.defer_write
+        self.output: Optional[str] = None
+        # With patch, the original text and the node tree composed from it
+        self.text: Optional[str] = None
+        self.node = None
+        # The report of tag_resources(), per resource what changed
+        self.resource_report: Dict = {}
+        self.skipped: Optional[str] = None
+        self.timings = Timings(enabled=options.timings)
+        # The layout of a JSON template (see get_json_style), None for yaml
+        self.json_style: Optional[Dict] = None
 
         try:
-            with open(filename, encoding='utf-8') as cfn:
-                self.data = yaml.load(cfn)
+            # The source of the template may have been read ahead already
+            with self.timings.phase("load"):
+                if source is not None:
+                    self.data = self.load(source)
+                else:
+                    with open(filename, encoding='utf-8') as cfn:
+                        self.data = self.load(cfn)
         except FileNotFoundError:
             print(f"{Fore.RED}FAIL: Please provide a valid filename{Style.RESET_ALL}")
             sys.exit(1)
         except ValueError:
             print(
-                f"{Fore.RED}FAIL: Please provide a filename with valid YML{Style.RESET_ALL}"
+                f"{Fore.RED}FAIL: Please provide a filename with valid "
+                f"{'JSON' if self.json_style is not None else 'YML'}{Style.RESET_ALL}"
             )
             sys.exit(1)
 
-        obligatory_tags_str = load_config()
-        try:
-            obligatory_tags = json.loads(obligatory_tags_str)
-        except json.decoder.JSONDecodeError as e:
-            print(f"{Fore.RED}FAIL: malformed CFN_TAGS JSON => {e}{Style.RESET_ALL}")
-            sys.exit(1)
-        except TypeError:
-            print(
-                f"{Fore.RED}FAIL: Please set CFN_TAGS as environment variable{Style.RESET_ALL}"
-            )
-            sys.exit(1)
-        else:
-            self.resources = self.data.get("Resources")
-            self.obligatory_tags = obligatory_tags
+        # Any yaml file can be handed to us, e.g. an empty one or a docker-compose file
+        self.resources = self.data.get("Resources") if isinstance(self.data, dict) else None
+        if not isinstance(self.resources, dict):
+            self.resources = None
+        self.timings.count("resources", len(self.resources or ()))
+        self.obligatory_tags = self.context.obligatory_tags
+
+
+    def load(self, cfn: Union[TextIO, str]):
+        """
+        Loads a template: JSON with the json module, which keeps the key order
+        and is much faster than any yaml loader. A check never writes the
+        template back, so it loads yaml with the faster safe loader. So does
+        patch, which keeps the text and its node tree to edit the text later on.
+        """
+        if not self.filename.endswith(JSON_EXTENSIONS) and not self.patch and not self.check:
+            return get_yaml().load(cfn)
+
+        text = cfn if isinstance(cfn, str) else cfn.read()
+        if self.filename.endswith(JSON_EXTENSIONS) and is_json_template(self.filename, text):
+            self.json_style = get_json_style(text)
+            return json.loads(text)
+        if self.patch:
+            try:
+                self.node, data = compose(text)
+                self.text = text
+                return data
+            except CannotPatch as e:
+                self.log(f"[INFO] {self.filename} cannot be patched ({e}), rewriting it in full")
+            return get_yaml().load(text)
+        if self.check:
+            return safe_load(text)
+        return get_yaml().load(text)
 
 
     def get_updated_tags(self, resource: str) -> List:
@@ -639,38 +724,11 @@ class Tagger:
         """
         This function removes faulty tag formatting from a yaml.dump result
         """
-
-        cfnlist = s.split('\n')
-        UseJsonTags = False
-        TagBlock = False
-
-        for i, line in enumerate(cfnlist):
-            # Python 3 interprets string literals as Unicode strings
-            # and therefore \s is treated as an escaped Unicode character.
-            # We must declare our RegEx pattern as a raw string by prepending r
-
-            if re.search(r'^\s+Type:\s*AWS', line):
-                # Extracting the resource type from Type: AWS::xx::yy
-                ResourceType = ':'.join(line.split(':')[1:]).strip()
-                UseJsonTags =  ResourceType in self.resourcetypes_json
-
-            if line.strip().startswith('Tags:'):
-                TagBlock = True
-                if cfnlist[i-1] == '':
-                    # we have an empty line before a tag block, let's remove it
-                    del cfnlist[i-1]
-
-            if re.search(r'^\s+\w:\s*$', line):
-                # Single word followed by a colon --> start of a new resource block
-                TagBlock = False
-
-            if TagBlock and UseJsonTags and line.strip().startswith('- Key:'):
-                tagvalue = ''.join(cfnlist[i+1].strip().split(':')[1:]).strip()
-                cfnlist[i] = line.replace('- Key:', " ")
-                cfnlist[i] += f": {tagvalue}"
-                del cfnlist[i+1]
-
-        return '\n'.join(cfnlist)
+        with self.timings.phase("transform"):
+            transformed = transform_cfn(s)
+        if self.timings.enabled:
+            self.timings.count("bytes_written", len(transformed.encode('utf-8')))
+        return transformed
 
 
     def get_git_path(self, filename: str) -> str:
@@ -678,17 +736,7 @@ class Tagger:
         Returns the relative path for a file from the repo root dir
         instead of any abritrary path the user has given us
         """
-
-        if filename.startswith('./'):
-            filename = filename.replace('./', '')
-
-        full_path = os.getcwd()
-        full_path_with_file = f"{full_path}/{filename}"
-        repo = git.Repo('.', search_parent_directories=True)
-        repodir = f"{repo.working_tree_dir}/"
-        relative_file_path = f"{full_path_with_file}".replace(repodir, '')
-
-        return relative_file_path
+        return self.context.get_git_path(filename)
 
 
     def get_git_tags(self, filename: str) -> dict:
@@ -698,144 +746,211 @@ class Tagger:
 
         gitdict = {}
         if self.git:
-            try:
-                repo = git.Repo(os.getcwd(), search_parent_directories=True)
-                remote = repo.remote().url
-
-                # remove any tokens from the remote string
-                remote = re.sub('https://[a-zA-Z0-9_]+@', 'https://', remote)
-            except git.exc.InValidGitRepositoryError:
-                print("FAIL: this is no git repo, please drop the --git argument")
-                sys.exit(1)
-            else:
-                gitdict = { 'gitrepo': remote, 'gitfile': self.get_git_path(filename) }
+            gitdict = { 'gitrepo': self.context.remote, 'gitfile': self.get_git_path(filename) }
 
         return gitdict
 
 
-    def change_tags(
-        self, taglist: List[OrderedDict], resource: str
-    ) -> List[OrderedDict]:
+    def change_tags(self, taglist, resource: str, json_tags: bool = False):
+        """
+        Merges the obligatory tags into the tags of a resource (None if it hasn't any),
+        records what was found, updated and added in the stats and returns the merged tags
+        """
 
-        resultlist = []
+        merged, found, added, updated = merge_tags(taglist, self.obligatory_tags, json_tags)
+        self.record_tags(
+            resource, found,
+            added=[key for key in self.obligatory_tags if key in added],
+            updated=[key for key in found if key in updated],
+        )
 
-        for tags in taglist:
-            key, value = get_tag_kv(tags, taglist)
-            self.stats[resource]["foundtags"].append(key)
+        return merged
 
-            if key in self.obligatory_tags.keys():
-                if value != self.obligatory_tags[key]:
-                    print(
-                        f"{Fore.YELLOW}    [tag][CHANGE] {key.ljust(15, ' ')} => {value} ==> {self.obligatory_tags[key]}{Style.RESET_ALL}"
-                    )
-                    resultlist.append(
-                        OrderedDict(
-                            {
-                                "Key": key,
-                                "Value": self.obligatory_tags[key],
-                            }
-                        )
-                    )
-                    self.stats[resource]["updatedtags"].append(key)
 
-                else:
-                    resultlist.append(OrderedDict({"Key": key, "Value": value}))
-            else:
-                resultlist.append(OrderedDict({"Key": key, "Value": value}))
+    def print_tag_changes(self, found: Dict, added: List, updated: List, tags: Dict):
+        """
+        Prints the updated and added tags of a resource, or in check mode the
+        divergent and missing ones
+        """
+        if self.quiet:
+            return
+        change, add = ("DIFFERS", "MISSING") if self.check else ("CHANGE", "   ADD")
+        for key in updated:
+            print(
+                f"{Fore.YELLOW}    [tag][{change}] {key.ljust(15, ' ')} => {found[key]} ==> {tags[key]}{Style.RESET_ALL}"
+            )
+        for key in added:
+            print(
+                f"{Fore.GREEN}    [tag][{add}] {key.ljust(15, ' ')} => {tags[key]}{Style.RESET_ALL}"
+            )
 
-        return resultlist
 
+    def record_tags(self, resource: str, found: Dict, added: List, updated: List):
+        """
+        Prints the changes to the tags of a resource and records them in the stats
+        """
+        self.stats.setdefault(resource, {"foundtags": [], "updatedtags": [], "addedtags": []})
+        self.print_tag_changes(found, added, updated, self.obligatory_tags)
 
-    def tag(self):
+        self.stats[resource]["foundtags"].extend(found)
+        self.stats[resource]["updatedtags"].extend(updated)
+        self.stats[resource]["addedtags"].extend(added)
+
+        if added or updated:
+            self.changed = True
+        self.timings.count("tags_added", len(added))
+        self.timings.count("tags_changed", len(updated))
+
+
+    def set_tags(self, resource: str, tags):
+        """
+        Sets the tags of a resource, adding a Properties block if needed
+        """
+        set_resource_tags(self.resources[resource], tags)
+
+
+    def tag_resources(self):
+        """
+        Merges the obligatory (and git) tags into all resources which support tags
+        """
+
+        with self.timings.phase("git"):
+            found_git_tags = self.get_git_tags(self.filename)
 
-        for item in self.resources:
-            restype = self.resources[item].get("Type")
-            if restype in self.resourcetypes_to_tag:
-                self.stats[item] = {"foundtags": [], "updatedtags": [], "addedtags": []}
+        report = tag_resources(self.resources, self.obligatory_tags, found_git_tags)
+        self.resource_report = report
+
+        for item, entry in report.items():
+            self.timings.count("tagged_resources")
+            self.stats[item] = {"type": entry["type"], "foundtags": [], "updatedtags": [], "addedtags": []}
+            if self.check and not entry["changed"]:
+                # A check only lists the resources which are not compliant
+                self.stats[item]["foundtags"].extend(entry["found"])
+                continue
+
+            if not self.quiet:
                 print(" ")
                 print(
-                    f"{Fore.CYAN}[{self.filename}][Resource] {item} => {restype}{Style.RESET_ALL}"
+                    f"{Fore.CYAN}[{self.filename}][Resource] {item} => {entry['type']}{Style.RESET_ALL}"
                 )
-                if "Properties" in self.resources[item]:
-                    if "Tags" in self.resources[item].get("Properties"):
-                        restags = self.resources[item].get("Properties").get("Tags")
-                        updated = self.change_tags(taglist=restags, resource=item)
-                        self.resources[item]["Properties"]["Tags"] = updated
-                else:
-                    self.has_properties = False
-
-                for obligtag in self.obligatory_tags.keys():
-                    if obligtag not in self.stats[item]["foundtags"]:
-                        # tag is not present, let's add it
-                        print(
-                            f"{Fore.GREEN}    [tag][   ADD] {obligtag.ljust(15, ' ')} => {self.obligatory_tags[obligtag]}{Style.RESET_ALL}"
-                        )
-                        self.stats[item]["addedtags"].append(obligtag)
-
-
-                        addtags = OrderedDict(
-                            {
-                                "Key": obligtag,
-                                "Value": f"{self.obligatory_tags[obligtag]}",
-                            }
-                        )
-
-                        if "Properties" in self.resources[item]:
-                            if "Tags" not in self.resources[item].get("Properties"):
-                                # Resource support tags, but hasn't any
-                                self.resources[item]["Properties"]["Tags"] = [addtags]
-
-                            else:
-                                self.resources[item].get("Properties").get("Tags").append(
-                                    addtags
-                                )
-                        else:
-                            # resource has no Properties defined, this is valid CFN !
-                            # So we need to add a Properties block.  Beware that we're in a
-                            # obligtag loop, so only add it once
-                            if not self.has_properties:
-                                self.resources[item].update({'Properties': OrderedDict({'Tags': [addtags]})})
-                                self.has_properties = True
-
-                if self.git:
-                    found_git_tags = self.get_git_tags(self.filename)
-
-                    gittags = OrderedDict(
-                        {
-                            "Key": "gitrepo",
-                            "Value": found_git_tags['gitrepo']
-                        }
-                    )
-                    if "Tags" in self.resources[item].get("Properties"):
-                        self.resources[item].get("Properties").get("Tags").append(
-                                gittags
-                        )
-                    else:
-                        self.resources[item]["Properties"]["Tags"] = [gittags]
-
-                    gittags = OrderedDict(
-                        {
-                            "Key": "gitfile",
-                            "Value": found_git_tags['gitfile']
-                        }
-                    )
-                    self.resources[item].get("Properties").get("Tags").append(
-                            gittags
-                    )
-
-        yaml = YAML()
-        yaml.explicit_start = True
-        yaml.indent(mapping=2)
-        yaml.line_break = True
-        yaml.width = 200
-        yaml.preserve_quotes = True
-        yaml.Representer.add_representer(OrderedDict, yaml.Representer.represent_dict)
+            self.record_tags(item, entry["found"], added=entry["added"], updated=entry["updated"])
+            if self.check:
+                if entry["converted"]:
+                    self.log(f"{Fore.YELLOW}    [tag][ FORMAT] tags are not in the format of {entry['type']}{Style.RESET_ALL}")
+                self.print_tag_changes(entry["gitfound"], entry["gitadded"], entry["gitupdated"], found_git_tags)
+            if entry["changed"]:
+                self.changed = True
+
+    def log(self, message: str):
+        """
+        Prints a message, unless we're quiet
+        """
+        if not self.quiet:
+            print(message)
+
+    def patched(self) -> Optional[List]:
+        """
+        Returns the edits which make the tag changes to the original text, or None
+        if a change can't be made as a text edit. Then the template is loaded again
+        with the round-trip engine and tagged again, to be dumped in full.
+        """
+        try:
+            with self.timings.phase("transform"):
+                return patch_edits(self.text, self.node, self.resources, self.resource_report)
+        except CannotPatch as e:
+            self.log(f"[INFO] {self.filename} cannot be patched ({e}), rewriting it in full")
+
+        with self.timings.phase("load"):
+            self.data = get_yaml().load(self.text)
+            self.resources = self.data["Resources"]
+        with self.timings.phase("merge"):
+            tag_resources(self.resources, self.obligatory_tags, self.get_git_tags(self.filename))
+        self.node = self.text = None
+        return None
+
+    def release(self):
+        """
+        Drops the loaded template as soon as it's no longer needed, in low memory mode
+        """
+        if self.low_memory:
+            self.data = self.resources = self.node = None
+            self.resource_report = {}
+
+    def write(self, stream, pieces: Iterable[str]):
+        """
+        Writes the pieces of a template to a stream one by one
+        """
+        for piece in pieces:
+            stream.write(piece)
+            if self.timings.enabled:
+                self.timings.count("bytes_written", len(piece.encode('utf-8')))
+
+    def dump(self, stream):
+        """
+        Serializes the (tagged) template to a stream, in its own format. yaml is
+        written as it's dumped (see TransformStream), a patch piece by piece and
+        in low memory mode JSON as it's encoded.
+        """
+        if self.node is not None:
+            edits = self.patched()
+            if edits is not None:
+                text, self.text = self.text, None
+                self.release()
+                self.write(stream, apply_edits(text, edits))
+                return
+        if self.json_style is not None:
+            self.write(stream, json_chunks(self.data, self.json_style, chunked=self.low_memory))
+            self.release()
+            return
+
+        transformed = TransformStream(stream, self.timings)
+        get_yaml().dump(self.data, transformed)
+        self.release()
+        transformed.close()
+
+
+    def tag(self):
+
+        if self.resources is None:
+            self.skipped = "no CloudFormation Resources"
+            self.log(f"[INFO] {self.filename} has no CloudFormation Resources, skipping")
+            return None
+
+        with self.timings.phase("merge"):
+            self.tag_resources()
+        if self.check or self.skip_unchanged and not self.changed:
+            self.release()
+
+        if self.check:
+            # Only report, never serialize
+            if self.changed:
+                self.log(f"{Fore.RED}[CHECK] {self.filename} has missing or divergent tags{Style.RESET_ALL}")
+            else:
+                self.log(f"[CHECK] {self.filename} is compliant")
+            return None
+
+        if self.skip_unchanged and not self.changed:
+            self.skipped = "unchanged"
+            self.log(f"[INFO] {self.filename} is unchanged, skipping")
+            return None
 
         if self.simulate:
-            print(" ")
+            self.log(" ")
             # self.data['AWSTemplateFormatVersion'] = '2010-09-09'
-            return yaml.dump(self.data, sys.stdout, transform=self.cfntransformer)
+            with self.timings.phase("write"):
+                self.dump(sys.stdout)
+            return None
+        elif self.defer_write:
+            self.log("Writing file...")
+            with self.timings.phase("write"):
+                output = io.StringIO()
+                self.dump(output)
+                self.output = output.getvalue()
+            return None
         else:
-            print("Writing file...")
-            with open(self.filename, "w", encoding='utf-8') as file:
-                return yaml.dump(self.data, file, transform=self.cfntransformer)
+            self.log("Writing file...")
+            # Write a temp file and rename it, so a failure never leaves a truncated template
+            with self.timings.phase("write"), atomic_write(self.filename, fsync=self.fsync == FSYNC_ALWAYS) as file:
+                self.dump(file)
+            self.written = True
+            return None
@@ -0,0 +1,651 @@
+import argparse
+import json
+import os
+import sys
+from contextlib import nullcontext, redirect_stdout
+from typing import BinaryIO, Callable, Iterable, Iterator, List, TYPE_CHECKING
+
+from .discover import find_templates, is_template
+from .fileio import sync_files, FSYNC_MODES, FSYNC_BATCH, FSYNC_NEVER
+from .manifest import Manifest, MANIFEST_FILE, config_hash
+from .prefilter import looks_like_template
+from .report import Report, REPORT_FORMATS, get_report, file_entry, skipped_entry
+from .timings import Timings, summarize, format_summary
+from .version import __version__
+
+# Only the modules needed for the arguments given are imported, so e.g. --version
+# and runs without --git start fast (GitPython and ruamel.yaml take most of the startup)
+# pylint: disable=import-outside-toplevel
+if TYPE_CHECKING:
+    from .cfntagger import RunContext
+    from .options import RunOptions
+
+
+def dir_path(path):
+    if os.path.isdir(path):
+        return path
+    else:
+        raise argparse.ArgumentTypeError(f"readable_dir:{path} is not a valid path")
+
+
+def nr_of_threads(value):
+    threads = int(value)
+    if threads < 0:
+        raise argparse.ArgumentTypeError(f"threads:{value} must be a positive number")
+    return threads
+
+
+def queue_depth(value):
+    depth = int(value)
+    if depth < 1:
+        raise argparse.ArgumentTypeError(f"depth:{value} must be at least 1")
+    return depth
+
+
+def nr_of_jobs(value):
+    jobs = int(value)
+    if jobs < 0:
+        raise argparse.ArgumentTypeError(f"jobs:{value} must be a positive number")
+
+    # 0 means: use all cores
+    return jobs or os.cpu_count() or 1
+
+
+def parse_dir(
+    directory: str,
+    include: Iterable[str] = (),
+    exclude: Iterable[str] = (),
+    ignore: bool = True,
+    follow_symlinks: bool = False,
+) -> List:
+    """
+    Returns the templates in a directory tree, without those in ignored or
+    excluded directories, see find_templates()
+    """
+    return list(find_templates(directory, include=include, exclude=exclude, ignore=ignore,
+                               follow_symlinks=follow_symlinks))
+
+
+def parse_git_changes(ref: str = None, staged: bool = False) -> List:
+    """
+    Returns the templates which git reports as added, copied, modified or renamed:
+    either the staged changes, or the changes in the working tree since ref
+    """
+    import git
+
+    try:
+        repo = git.Repo('.', search_parent_directories=True)
+    except git.exc.InvalidGitRepositoryError:
+        print("FAIL: this is no git repo, please drop the --changed-since/--staged argument")
+        sys.exit(1)
+
+    diffargs = ["--cached"] if staged else [ref]
+    try:
+        changes = repo.git.diff("--name-only", "-z", "--diff-filter=ACMR", *diffargs)
+    except git.exc.GitCommandError as e:
+        print(f"FAIL: could not get the changed files from git => {e.stderr.strip()}")
+        sys.exit(1)
+
+    rlist = []
+    for changed in changes.split("\0"):
+        filepath = os.path.relpath(os.path.join(repo.working_tree_dir, changed))
+        if changed and is_template(changed) and os.path.isfile(filepath):
+            rlist.append(filepath)
+
+    return rlist
+
+
+def read_paths(stream: BinaryIO, null: bool = False) -> Iterator[str]:
+    """
+    Yields the paths in a stream as soon as they arrive, one per line or NUL delimited
+    """
+    separator = b"\0" if null else b"\n"
+    read = getattr(stream, "read1", None) or stream.read
+    pending = b""
+    while True:
+        chunk = read(1 << 16)
+        if not chunk:
+            break
+        *paths, pending = (pending + chunk).split(separator)
+        for path in paths:
+            if path.strip():
+                yield os.fsdecode(path if null else path.rstrip(b"\r"))
+
+    if pending.strip():
+        yield os.fsdecode(pending if null else pending.rstrip(b"\r"))
+
+
+def stream_templates(stream: BinaryIO, null: bool = False, close: bool = False) -> Iterator[str]:
+    """
+    Yields the templates in a stream of paths, e.g. the output of git diff --name-only -z
+    or find -print0. Other files are left out, missing files are reported and skipped.
+    With close, the stream is closed once it's read (stdin never is).
+    """
+    try:
+        for path in read_paths(stream, null):
+            if not is_template(path):
+                continue
+            if not os.path.isfile(path):
+                print(f"[INFO] Skipping {path}, no such file")
+                continue
+            yield path
+    finally:
+        if close and stream is not sys.stdin.buffer:
+            stream.close()
+
+
+def open_paths(args) -> BinaryIO:
+    if args.stdin_paths or args.files_from == "-":
+        return sys.stdin.buffer
+    try:
+        return open(args.files_from, "rb")  # pylint: disable=consider-using-with
+    except OSError as e:
+        print(f"FAIL: cannot read the list of files => {e}")
+        sys.exit(1)
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cfntagger", description="Add bulk tags to CloudFormation resources")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        "--file",
+        "-f",
+        type=str,
+        help="The CloudFormation template file to modify",
+    )
+    group.add_argument(
+        "--directory",
+        "-d",
+        type=dir_path,
+        help="A directory containing CFN templates to modify",
+    )
+    group.add_argument(
+        "--changed-since",
+        metavar="REF",
+        type=str,
+        help="Only modify the CFN templates changed in git since REF",
+    )
+    group.add_argument(
+        "--staged",
+        action="store_true",
+        help="Only modify the CFN templates staged in git",
+    )
+    group.add_argument(
+        "--stdin-paths",
+        action="store_true",
+        help="Modify the CFN templates listed on stdin, as they arrive",
+    )
+    group.add_argument(
+        "--files-from",
+        metavar="FILE",
+        type=str,
+        help="Modify the CFN templates listed in FILE (- for stdin)",
+    )
+    group.add_argument(
+        "--serve",
+        metavar="ADDRESS",
+        type=str,
+        help="Serve tagging requests over HTTP on [HOST:]PORT or a unix:PATH socket",
+    )
+    parser.add_argument(
+        "--null",
+        "-0",
+        action="store_true",
+        help="with --stdin-paths or --files-from, the paths are NUL delimited instead of one per line",
+        required=False,
+    )
+    parser.add_argument(
+        "--include",
+        metavar="GLOB",
+        action="append",
+        default=[],
+        help="with --directory, only the templates matching GLOB (relative to the directory, can be repeated)",
+        required=False,
+    )
+    parser.add_argument(
+        "--exclude",
+        metavar="GLOB",
+        action="append",
+        default=[],
+        help="with --directory, skip the templates and directories matching GLOB (can be repeated)",
+        required=False,
+    )
+    parser.add_argument(
+        "--no-ignore",
+        action="store_true",
+        help="with --directory, also look in the directories ignored by .gitignore or .cfntaggerignore files, "
+             "version control, dependency and virtualenv directories",
+        required=False,
+    )
+    parser.add_argument(
+        "--follow-symlinks",
+        action="store_true",
+        help="with --directory, follow symbolic links to templates and directories",
+        required=False,
+    )
+    parser.add_argument(
+        "--simulate",
+        "-s",
+        action="store_true",
+        help="simulate, do not overwrite the inputfile",
+        required=False,
+    )
+    parser.add_argument(
+        "--check",
+        "-c",
+        action="store_true",
+        help="only check the tags: list the missing and divergent tags and exit with 1 if there are any, "
+             "never write nor dump the templates",
+        required=False,
+    )
+    parser.add_argument(
+        "--git",
+        "-g",
+        action="store_true",
+        help="add git remote and file info as tags",
+        required=False,
+    )
+    parser.add_argument(
+        "--fsync",
+        choices=FSYNC_MODES,
+        default=FSYNC_NEVER,
+        help="flush every written template to disk (always), all of them at the end of the run (batch) "
+             "or leave it to the OS (never, the default)",
+        required=False,
+    )
+    parser.add_argument(
+        "--no-prefilter",
+        action="store_true",
+        help="parse every yml/yaml/json file, also those which don't look like CFN templates with resources to tag",
+        required=False,
+    )
+    parser.add_argument(
+        "--patch",
+        action="store_true",
+        help="only edit the changed tags into the yaml templates instead of rewriting them in full",
+        required=False,
+    )
+    parser.add_argument(
+        "--low-memory",
+        action="store_true",
+        help="release every template as soon as it's written, to tag very large templates",
+        required=False,
+    )
+    parser.add_argument(
+        "--skip-unchanged",
+        action="store_true",
+        help="do not rewrite templates which already carry the right tags",
+        required=False,
+    )
+    parser.add_argument(
+        "--manifest",
+        "-m",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="MANIFEST",
+        help=f"skip templates which didn't change since the last run, as recorded in a manifest "
+             f"(default: {MANIFEST_FILE} in the directory)",
+        required=False,
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=nr_of_jobs,
+        default=1,
+        help="number of templates to tag in parallel (0 = all cores)",
+        required=False,
+    )
+    parser.add_argument(
+        "--readers",
+        type=nr_of_threads,
+        default=0,
+        help="number of threads reading templates ahead of the tagging (0 = read them while tagging)",
+        required=False,
+    )
+    parser.add_argument(
+        "--writers",
+        type=nr_of_threads,
+        default=0,
+        help="number of threads writing the tagged templates behind the tagging (0 = write them while tagging)",
+        required=False,
+    )
+    parser.add_argument(
+        "--read-ahead",
+        metavar="DEPTH",
+        type=queue_depth,
+        help="with --readers, the maximum number of templates read ahead (default: 16)",
+        required=False,
+    )
+    parser.add_argument(
+        "--write-behind",
+        metavar="DEPTH",
+        type=queue_depth,
+        help="with --writers, the maximum number of tagged templates waiting to be written (default: 16)",
+        required=False,
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=nr_of_jobs,
+        default=0,
+        help="with --serve, number of templates tagged at the same time (0 = all cores)",
+        required=False,
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=64,
+        help="with --serve, number of requests waiting to be tagged before answering 503",
+        required=False,
+    )
+    parser.add_argument(
+        "--report",
+        choices=REPORT_FORMATS,
+        help="write a machine readable report of the run instead of the console output, "
+             "to stdout (the other messages go to stderr) or to --report-file",
+        required=False,
+    )
+    parser.add_argument(
+        "--report-file",
+        metavar="FILE",
+        help="with --report, the file to write the report to",
+        required=False,
+    )
+    parser.add_argument(
+        "--timings",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="JSONFILE",
+        help="print the time spent per phase (config, load, merge, git, transform, write) and the counters "
+             "of the run, optionally also write them per template to a JSON file",
+        required=False,
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PROFILE",
+        help="write cProfile stats of the run to PROFILE (only the main process is profiled, use --jobs 1)",
+        required=False,
+    )
+    parser.add_argument(
+        "-v",
+        "--version",
+        help="Version of cfntagger",
+        action="version",
+        version=f"%(prog)s {__version__}",
+    )
+    return parser
+
+
+def get_manifest(args, context: "RunContext") -> Manifest:
+    if args.manifest:
+        path = args.manifest
+    else:
+        path = os.path.join(args.directory or ".", MANIFEST_FILE)
+
+    remote = context.remote if args.git else None
+    return Manifest(path, config_hash(context.obligatory_tags, setgit=args.git, remote=remote))
+
+
+def run_context(args, run_timings: Timings) -> "RunContext":
+    from .cfntagger import RunContext
+    context = RunContext()
+    if run_timings.enabled:
+        # Resolve upfront, so the config isn't timed as part of the first template
+        with run_timings.phase("config"):
+            context.resolve(setgit=args.git)
+    return context
+
+
+def run_options(args, report: Report, run_timings: Timings) -> "RunOptions":
+    """
+    Returns the options of the run, for the runner and every Tagger
+    """
+    from .options import RunOptions, QUEUE_DEPTH
+    return RunOptions(
+        simulate=args.simulate,
+        setgit=args.git,
+        skip_unchanged=args.skip_unchanged,
+        check=args.check,
+        patch=args.patch,
+        low_memory=args.low_memory,
+        fsync=args.fsync,
+        timings=run_timings.enabled,
+        # The report gets the output and the failures per template, instead of the console
+        quiet=report is not None,
+        capture=report is not None,
+        jobs=args.jobs,
+        readers=args.readers,
+        writers=args.writers,
+        read_depth=args.read_ahead or QUEUE_DEPTH,
+        write_depth=args.write_behind or QUEUE_DEPTH,
+    )
+
+
+def write_timings(args, run_timings: Timings, results: List):
+    summary = summarize(run_timings, results)
+    print(format_summary(summary))
+    if args.timings:
+        with open(args.timings, "w", encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+
+def stream_kept(cfnfiles: Iterable[str], keep: Callable[[str], bool], skipped: List) -> Iterator[str]:
+    for cfnfile in cfnfiles:
+        if keep(cfnfile):
+            yield cfnfile
+        else:
+            skipped.append(cfnfile)
+
+
+def keep_files(
+    cfnfiles: Iterable[str], keep: Callable[[str], bool], skipped: List, threads: int = 0
+) -> Iterable[str]:
+    """
+    Returns the files for which keep() is true, the others are added to skipped.
+    A list is filtered right away (with threads, by a pool of threads, as keep()
+    reads the file), a stream is filtered as it's consumed.
+    """
+    if isinstance(cfnfiles, list):
+        if threads > 0:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                keep = dict(zip(cfnfiles, executor.map(keep, cfnfiles))).__getitem__
+        return list(stream_kept(cfnfiles, keep, skipped))
+    return stream_kept(cfnfiles, keep, skipped)
+
+
+class SkippedFiles:
+    """
+    The files one filter (the prefilter, the manifest) leaves out before
+    tagging. They're reported once they're all known: right away when a list
+    is filtered, at the end of the run when a stream is.
+    """
+    def __init__(self, description: str, reason: str):
+        self.description = description
+        self.reason = reason
+        self.files: List = []
+        self.streamed = False
+
+    def filter(self, cfnfiles: Iterable[str], keep: Callable[[str], bool], report: Report, threads: int = 0):
+        cfnfiles = keep_files(cfnfiles, keep, self.files, threads=threads)
+        self.streamed = not isinstance(cfnfiles, list)
+        if not self.streamed:
+            self.report(report, "Skipping")
+        return cfnfiles
+
+    def finish(self, report: Report):
+        if self.streamed:
+            self.report(report, "Skipped")
+
+    def report(self, report: Report, verb: str):
+        print(f"[INFO] {verb} {len(self.files)} {self.description}")
+        report_skipped(report, self.files, self.reason)
+
+
+class RunResults:
+    """
+    Collects what the end of a run needs from the results: the exit code, the
+    number of templates which fail the check, the templates written without
+    fsync (for --fsync batch) and, with timings, the results themselves.
+    A manifest is updated with every template tagged, and saved at the end.
+    """
+    def __init__(self, args, manifest: Manifest = None):
+        self.args = args
+        self.manifest = manifest
+        self.exitcode = 0
+        self.noncompliant = 0
+        self.written: List = []
+        self.results: List = []
+
+    def add(self, result: dict):
+        self.exitcode = max(self.exitcode, result["exitcode"])
+        if self.args.check and result["changed"]:
+            self.noncompliant += 1
+            self.exitcode = max(self.exitcode, 1)
+        if self.args.fsync == FSYNC_BATCH and result.get("written"):
+            self.written.append(result["filename"])
+        if self.args.timings is not None:
+            self.results.append(result)
+
+        if self.manifest is not None:
+            if result["exitcode"] == 0:
+                self.manifest.update(result["filename"])
+            else:
+                self.manifest.remove(result["filename"])
+
+    def save_manifest(self):
+        if self.manifest is not None:
+            self.manifest.save()
+
+
+def discover_templates(args) -> Iterable[str]:
+    """
+    Returns the templates selected by the command line arguments: a list, or a
+    stream with --stdin-paths and --files-from
+    """
+    if args.directory is not None:
+        return parse_dir(args.directory, include=args.include, exclude=args.exclude,
+                         ignore=not args.no_ignore, follow_symlinks=args.follow_symlinks)
+    if args.changed_since is not None or args.staged:
+        return parse_git_changes(ref=args.changed_since, staged=args.staged)
+    if args.stdin_paths or args.files_from is not None:
+        # A stream: the templates are tagged while the paths are still being read
+        return stream_templates(open_paths(args), null=args.null, close=True)
+    return [args.file]
+
+
+def tag_templates(args, report: Report = None) -> int:
+    """
+    Tags the templates selected by the command line arguments, returns the exit code.
+    With a report, the results are added to it instead of being printed.
+    """
+    from .runner import run
+
+    run_timings = Timings(enabled=args.timings is not None)
+    context = run_context(args, run_timings)
+    prefiltered = SkippedFiles(
+        "files without taggable CloudFormation resources", "no taggable CloudFormation resources"
+    )
+    unchanged = SkippedFiles("templates unchanged since the last run", "unchanged since the last run")
+
+    with run_timings.phase("discover"):
+        cfnfiles = discover_templates(args)
+        # Skip the yaml files which are no templates (with resources to tag) without parsing them
+        if args.file is None and not args.no_prefilter:
+            cfnfiles = prefiltered.filter(cfnfiles, looks_like_template, report, threads=args.readers)
+
+    manifest = None
+    if args.manifest is not None:
+        manifest = get_manifest(args, context)
+        cfnfiles = unchanged.filter(cfnfiles, lambda cfnfile: not manifest.is_fresh(cfnfile), report,
+                                    threads=args.readers)
+
+    # The manifest only records the templates which were written
+    results = RunResults(args, manifest if not (args.simulate or args.check) else None)
+    for result in run(cfnfiles, run_options(args, report, run_timings), context):
+        if report is not None:
+            report.add(file_entry(result, check=args.check))
+        else:
+            # Output of parallel runs is captured per file, print it in one go
+            sys.stdout.write(result["output"])
+            sys.stdout.flush()
+        results.add(result)
+
+    with run_timings.phase("sync"):
+        sync_files(results.written)
+    run_timings.count("prefiltered", len(prefiltered.files))
+
+    if args.check:
+        print(f"[CHECK] {results.noncompliant} templates with missing or divergent tags")
+
+    prefiltered.finish(report)
+    unchanged.finish(report)
+
+    results.save_manifest()
+
+    if run_timings.enabled:
+        write_timings(args, run_timings, results.results)
+
+    if report is not None:
+        report.finish(results.exitcode)
+
+    return results.exitcode
+
+
+def report_skipped(report: Report, filenames: List, reason: str):
+    """
+    Adds the files skipped before tagging to the report, if any
+    """
+    if report is not None:
+        for filename in filenames:
+            report.add(skipped_entry(filename, reason))
+
+
+def open_report(args):
+    """
+    Returns the stream to write the report to
+    """
+    if not args.report_file:
+        return nullcontext(sys.stdout)
+    try:
+        return open(args.report_file, "w", encoding='utf-8')
+    except OSError as e:
+        print(f"FAIL: cannot write the report => {e}")
+        sys.exit(1)
+
+
+def main(argv: List = None) -> int:
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.serve is not None:
+        from .server import serve
+        return serve(args.serve, max_concurrency=args.max_concurrency, max_pending=args.max_pending)
+
+    if args.report is None:
+        return profile_tag_templates(args)
+
+    if args.simulate and not args.report_file:
+        parser.error("--simulate writes the templates to stdout, use --report-file to write the report elsewhere")
+
+    with open_report(args) as stream:
+        report = get_report(args.report, stream)
+        report.start()
+        # The report owns stdout, the other messages (if any) go to stderr
+        with redirect_stdout(sys.stderr) if stream is sys.stdout else nullcontext():
+            return profile_tag_templates(args, report)
+
+
+def profile_tag_templates(args, report: Report = None) -> int:
+    """
+    Runs tag_templates(), under cProfile with --profile
+    """
+    if args.profile is None:
+        return tag_templates(args, report)
+
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(tag_templates, args, report)
+    finally:
+        profiler.dump_stats(args.profile)
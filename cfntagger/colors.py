@@ -0,0 +1,27 @@
+import os
+import sys
+
+
+class NoColor:  # pylint: disable=too-few-public-methods
+    """
+    Stands in for colorama's Fore and Style when the output is no terminal:
+    every color is an empty string
+    """
+    def __getattr__(self, name: str) -> str:
+        return ""
+
+
+def use_colors(stream=None) -> bool:
+    """
+    Returns whether to color the output: only on a terminal, unless NO_COLOR is set
+    """
+    stream = stream if stream is not None else sys.stdout
+    isatty = getattr(stream, "isatty", None)
+    return not os.getenv("NO_COLOR") and isatty is not None and isatty()
+
+
+# colorama is only imported when we're going to use it
+if use_colors():
+    from colorama import Fore, Style  # pylint: disable=unused-import
+else:
+    Fore = Style = NoColor()
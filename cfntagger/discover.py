@@ -0,0 +1,303 @@
+import os
+import re
+from typing import Iterable, Iterator, List, Optional, Pattern, Set, Tuple
+
+from .manifest import MANIFEST_FILE
+from .prefilter import JSON_EXTENSIONS, YAML_EXTENSIONS
+
+# The ignore files honoured in every directory, in gitignore syntax
+IGNORE_FILES = (".gitignore", ".cfntaggerignore")
+
+# Directories which never hold templates to tag: version control metadata,
+# dependencies, virtualenvs, build output (e.g. CDK assets) and caches
+PRUNED_DIRS = frozenset({
+    ".git", ".hg", ".svn", "node_modules", "bower_components", "cdk.out", ".aws-sam", ".serverless",
+    ".terraform", ".venv", "venv", ".tox", ".nox", "__pycache__", ".mypy_cache", ".pytest_cache",
+})
+# A directory with this file is a virtualenv, whatever its name
+VENV_MARKER = "pyvenv.cfg"
+
+_TRAILING_SPACES = re.compile(r'(?<!\\) +$')
+
+
+def is_template(filename: str) -> bool:
+    """
+    Returns whether a file is a template by its extension, the manifest of
+    --manifest is a .json file as well but never a template
+    """
+    if filename.endswith(YAML_EXTENSIONS):
+        return True
+    return filename.endswith(JSON_EXTENSIONS) and os.path.basename(filename) != MANIFEST_FILE
+
+
+def glob_to_regex(pattern: str) -> str:
+    """
+    Returns the regex of a gitignore style glob, matched against a / separated
+    path relative to the directory of the pattern: * and ? don't match a /,
+    ** matches any number of directories. A pattern without a / (but at the
+    end) matches a name at any depth, a pattern with one is relative to the
+    directory.
+    """
+    anchored = "/" in pattern
+    pattern = pattern[1:] if pattern.startswith("/") else pattern
+
+    regex = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            regex.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex.append("/.*")
+            i += 3
+        elif char == "*":
+            regex.append("[^/]*")
+            while i < len(pattern) and pattern[i] == "*":
+                i += 1
+        elif char == "?":
+            regex.append("[^/]")
+            i += 1
+        elif char == "[":
+            start = i + 2 if pattern[i + 1:i + 2] in ("!", "^") else i + 1
+            end = pattern.find("]", start + 1)
+            if end == -1:
+                regex.append(re.escape(char))
+                i += 1
+                continue
+            members = pattern[i + 1:end].replace("\\", "\\\\")
+            if members[0] in "!^":
+                members = "^" + members[1:]
+            regex.append(f"[{members}]")
+            i = end + 1
+        elif char == "\\" and i + 1 < len(pattern):
+            regex.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            regex.append(re.escape(char))
+            i += 1
+
+    return "".join(regex) if anchored else "(?:.*/)?" + "".join(regex)
+
+
+class IgnoreRules:
+    """
+    The patterns of an ignore file, in gitignore syntax: blank lines and
+    comments are skipped, a trailing / only matches directories, a leading !
+    includes again what an earlier pattern ignored. The last matching pattern
+    decides. All patterns are compiled into one regex (one for directories, one
+    for files), with the last pattern as the first alternative.
+    """
+    def __init__(self, lines: Iterable[str]):
+        dirs: List[str] = []
+        files: List[str] = []
+        for n, line in enumerate(lines):
+            line = _TRAILING_SPACES.sub("", line.rstrip("\r\n"))
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            line = line[1:] if negated else line
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+
+            alternative = f"(?P<{'keep' if negated else 'ignore'}{n}>{glob_to_regex(line)})"
+            dirs.append(alternative)
+            if not dir_only:
+                files.append(alternative)
+
+        self.dirs = self.compile(dirs)
+        self.files = self.compile(files)
+
+    @staticmethod
+    def compile(alternatives: List[str]) -> Optional[Pattern]:
+        return re.compile("|".join(reversed(alternatives)), re.DOTALL) if alternatives else None
+
+    def __bool__(self) -> bool:
+        return self.dirs is not None
+
+    def match(self, path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Returns True if the path is ignored, False if it's included again and
+        None if no pattern matches it
+        """
+        regex = self.dirs if is_dir else self.files
+        match = regex.fullmatch(path) if regex is not None else None
+        if match is None:
+            return None
+        return match.lastgroup.startswith("ignore")
+
+    @classmethod
+    def from_file(cls, path: str) -> "IgnoreRules":
+        try:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                return cls(f)
+        except OSError:
+            return cls([])
+
+
+class Discovery:
+    """
+    Finds the templates in a directory tree with os.scandir. Directories are
+    pruned before they're scanned: the well-known directories without
+    templates (PRUNED_DIRS, virtualenvs), those ignored by a .gitignore or
+    .cfntaggerignore on the way down and those matching an exclude glob.
+    Only files with a template extension are matched against the ignore
+    rules and globs, the others cost nothing but their directory entry.
+    Symbolic links are skipped, unless they're followed.
+    """
+    def __init__(
+        self,
+        include: Iterable[str] = (),
+        exclude: Iterable[str] = (),
+        ignore: bool = True,
+        follow_symlinks: bool = False,
+    ):
+        self.include = IgnoreRules(include)
+        self.exclude = IgnoreRules(exclude)
+        self.ignore = ignore
+        self.follow_symlinks = follow_symlinks
+        self.visited: Set[Tuple[int, int]] = set()
+        # The length of the prefix of the paths, up to the top of the walk
+        self.offset = 0
+
+    def ignored(self, rules: List[Tuple[int, IgnoreRules]], path: str, is_dir: bool) -> bool:
+        """
+        Returns whether a path (relative to the top of the walk) is excluded or
+        ignored, by the rules of the deepest ignore file with a matching pattern
+        """
+        if self.exclude.match(path[self.offset:], is_dir):
+            return True
+        for offset, ignorerules in reversed(rules):
+            ignored = ignorerules.match(path[offset:], is_dir)
+            if ignored is not None:
+                return ignored
+        return False
+
+    def included(self, path: str) -> bool:
+        return not self.include or bool(self.include.match(path[self.offset:], False))
+
+    def seen(self, entry: os.DirEntry) -> bool:
+        """
+        Returns whether a directory or file was visited before, through another
+        symbolic link (or a loop)
+        """
+        try:
+            stat = entry.stat()
+        except OSError:
+            return True
+        key = (stat.st_dev, stat.st_ino)
+        if key in self.visited:
+            return True
+        self.visited.add(key)
+        return False
+
+    def walk(self, directory: str) -> Iterator[str]:
+        """
+        Yields the templates in a directory tree, in the order of os.walk: the
+        templates in a directory first, then those of its subdirectories
+        """
+        if self.follow_symlinks:
+            stat = os.stat(directory)
+            self.visited.add((stat.st_dev, stat.st_ino))
+
+        relpath, rules = "", []
+        if self.ignore:
+            relpath, rules = self.parent_rules(directory)
+        self.offset = len(relpath) + 1 if relpath else 0
+        yield from self.scan(directory, relpath, rules, top=True)
+
+    @staticmethod
+    def parent_rules(directory: str) -> Tuple[str, List[Tuple[int, IgnoreRules]]]:
+        """
+        Returns the path of a directory relative to the root of its git working
+        tree and the ignore rules of the directories above it, up to that root
+        (including .git/info/exclude), like git applies them. Outside of a git
+        working tree, there are none.
+        """
+        parents = []
+        current = os.path.abspath(directory)
+        while not os.path.exists(os.path.join(current, ".git")):
+            parent = os.path.dirname(current)
+            if parent == current:
+                return "", []
+            parents.append(os.path.basename(current))
+            current = parent
+
+        rules = []
+        exclude = IgnoreRules.from_file(os.path.join(current, ".git", "info", "exclude"))
+        if exclude:
+            rules.append((0, exclude))
+        relpath = ""
+        for name in reversed(parents):
+            for ignorefile in IGNORE_FILES:
+                ignorerules = IgnoreRules.from_file(os.path.join(current, ignorefile))
+                if ignorerules:
+                    rules.append((len(relpath) + 1 if relpath else 0, ignorerules))
+            current = os.path.join(current, name)
+            relpath = f"{relpath}/{name}" if relpath else name
+        return relpath, rules
+
+    def scan(
+        self, directory: str, relpath: str, rules: List[Tuple[int, IgnoreRules]], top: bool = False
+    ) -> Iterator[str]:
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            return
+
+        if self.ignore:
+            names = {entry.name for entry in entries}
+            if not top and VENV_MARKER in names:
+                return
+            for name in IGNORE_FILES:
+                if name in names:
+                    ignorerules = IgnoreRules.from_file(os.path.join(directory, name))
+                    if ignorerules:
+                        rules = rules + [(len(relpath) + 1 if relpath else 0, ignorerules)]
+
+        subdirs = []
+        for entry in entries:
+            path = f"{relpath}/{entry.name}" if relpath else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if self.ignore and entry.name in PRUNED_DIRS or self.ignored(rules, path, True):
+                        continue
+                    subdirs.append((entry, path))
+                elif is_template(entry.name):
+                    if entry.is_symlink() and not self.follow_symlinks:
+                        continue
+                    if self.ignored(rules, path, False):
+                        continue
+                    if not self.included(path):
+                        continue
+                    if self.follow_symlinks and (self.seen(entry) or not entry.is_file()):
+                        continue
+                    yield entry.path
+                elif self.follow_symlinks and entry.is_symlink() and entry.is_dir():
+                    if self.ignore and entry.name in PRUNED_DIRS or self.ignored(rules, path, True):
+                        continue
+                    subdirs.append((entry, path))
+            except OSError:
+                continue
+
+        for entry, path in subdirs:
+            if self.follow_symlinks and self.seen(entry):
+                continue
+            yield from self.scan(entry.path, path, rules)
+
+
+def find_templates(
+    directory: str,
+    include: Iterable[str] = (),
+    exclude: Iterable[str] = (),
+    ignore: bool = True,
+    follow_symlinks: bool = False,
+) -> Iterator[str]:
+    """
+    Yields the templates in a directory tree, see Discovery
+    """
+    discovery = Discovery(include=include, exclude=exclude, ignore=ignore, follow_symlinks=follow_symlinks)
+    return discovery.walk(directory)
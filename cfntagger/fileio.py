@@ -0,0 +1,87 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterable
+
+FSYNC_ALWAYS = "always"
+FSYNC_BATCH = "batch"
+FSYNC_NEVER = "never"
+FSYNC_MODES = (FSYNC_ALWAYS, FSYNC_BATCH, FSYNC_NEVER)
+
+
+def get_umask() -> int:
+    # The umask can only be read by setting it
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+# Read once at import, before any writer threads run
+_UMASK = get_umask()
+
+
+def fsync_path(path: str):
+    """
+    Flushes a file or directory (its entries, e.g. a rename) to disk. Not all
+    platforms can open a directory, those don't need it either.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(filename: str, fsync: bool = False):
+    """
+    Opens a temp file in the directory of filename for writing, which replaces
+    filename (keeping its permissions) in one atomic rename when the block
+    completes. A new file gets the permissions open() would give it. When the block fails, the temp file is removed and filename
+    is left untouched, so readers never see a partially written file.
+    With fsync, the file and the rename are flushed to disk before returning.
+    A symlink is followed: its target is replaced, not the link itself.
+    """
+    filename = os.path.realpath(filename)
+    directory = os.path.dirname(filename)
+    fd, tmpfile = tempfile.mkstemp(prefix=f".{os.path.basename(filename)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding='utf-8') as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            os.chmod(tmpfile, os.stat(filename).st_mode & 0o7777)
+        except FileNotFoundError:
+            # mkstemp() creates the temp file as 0600
+            os.chmod(tmpfile, 0o666 & ~_UMASK)
+        os.replace(tmpfile, filename)
+    except BaseException:
+        try:
+            os.unlink(tmpfile)
+        except OSError:
+            pass
+        raise
+
+    if fsync:
+        fsync_path(directory)
+
+
+def sync_files(filenames: Iterable[str]):
+    """
+    Flushes files written without fsync to disk in one go, e.g. at the end of a
+    run: first the contents of every file, then every directory they're in
+    """
+    directories = set()
+    for filename in filenames:
+        filename = os.path.realpath(filename)
+        fsync_path(filename)
+        directories.add(os.path.dirname(filename))
+    for directory in sorted(directories):
+        fsync_path(directory)
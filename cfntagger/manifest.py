@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+from typing import Dict
+
+from .fileio import atomic_write
+from .version import __version__
+
+
+MANIFEST_FILE = ".cfntagger-manifest.json"
+
+
+def file_hash(filename: str) -> str:
+    """
+    Returns the sha256 hash of the contents of a file
+    """
+    sha = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def config_hash(obligatory_tags: Dict, setgit: bool = False, remote: str = None) -> str:
+    """
+    Returns a hash of the effective tag config: when it changes, all templates
+    need to be tagged again
+    """
+    config = {"tags": obligatory_tags, "git": setgit, "remote": remote}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """
+    On-disk record of the templates tagged by a previous run: for each file its
+    content hash, the hash of the tag config and the cfntagger version used.
+    A template whose contents, config and version did not change since then
+    doesn't need to be tagged again.
+    """
+    def __init__(self, path: str, confighash: str):
+        self.path = path
+        self.confighash = confighash
+        self.basedir = os.path.dirname(os.path.abspath(path))
+        self.entries: Dict = {}
+
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f).get("files", {})
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError):
+            print(f"[INFO] Ignoring malformed manifest {path}")
+
+    def key(self, filename: str) -> str:
+        return os.path.relpath(os.path.abspath(filename), self.basedir)
+
+    def is_fresh(self, filename: str) -> bool:
+        """
+        Returns whether a file is unchanged since it was recorded with the current config
+        """
+        entry = self.entries.get(self.key(filename))
+        if entry is None or entry.get("config") != self.confighash or entry.get("version") != __version__:
+            return False
+
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return False
+
+        if entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime_ns:
+            # Cheap path: don't read the file when size and mtime are untouched
+            return True
+
+        if entry.get("size") != stat.st_size or entry.get("hash") != file_hash(filename):
+            return False
+
+        # Same contents with a new mtime (e.g. a fresh checkout), remember the new stat
+        entry["mtime"] = stat.st_mtime_ns
+        return True
+
+    def update(self, filename: str):
+        """
+        Records the current contents of a successfully tagged file
+        """
+        stat = os.stat(filename)
+        self.entries[self.key(filename)] = {
+            "hash": file_hash(filename),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "config": self.confighash,
+            "version": __version__,
+        }
+
+    def remove(self, filename: str):
+        self.entries.pop(self.key(filename), None)
+
+    def save(self):
+        """
+        Writes the manifest, leaving out files which no longer exist
+        """
+        files = {
+            key: entry for key, entry in sorted(self.entries.items())
+            if os.path.exists(os.path.join(self.basedir, key))
+        }
+        with atomic_write(self.path) as f:
+            json.dump({"version": __version__, "files": files}, f, indent=2)
@@ -0,0 +1,50 @@
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from .fileio import FSYNC_NEVER
+
+# Default number of templates read ahead of the tagging, and waiting to be written behind it
+QUEUE_DEPTH = 16
+
+
+@dataclass(frozen=True)
+class RunOptions:
+    """
+    The options of a run, which flow from the command line through the runner
+    to every Tagger:
+        - how a template is tagged and written: simulate, setgit, skip_unchanged,
+          check, patch, low_memory and fsync (one of FSYNC_MODES)
+        - what's reported: timings, quiet (print nothing) and capture (a
+          sequential run captures the output and the failures per template in
+          its result, like a parallel run does)
+        - how the run is scheduled: jobs, readers, writers, read_depth and
+          write_depth, see run()
+        - defer_write: the Tagger keeps the tagged template in its output, for
+          the runner to write it
+    """
+    simulate: bool = True
+    setgit: bool = False
+    skip_unchanged: bool = False
+    check: bool = False
+    patch: bool = False
+    low_memory: bool = False
+    fsync: str = FSYNC_NEVER
+    timings: bool = False
+    quiet: bool = False
+    capture: bool = False
+    jobs: int = 1
+    readers: int = 0
+    writers: int = 0
+    read_depth: int = QUEUE_DEPTH
+    write_depth: int = QUEUE_DEPTH
+    defer_write: bool = False
+
+
+def make_options(options: Optional[RunOptions] = None, **overrides) -> RunOptions:
+    """
+    Returns options (the defaults if None) with some of them overridden, e.g.
+    make_options(simulate=False)
+    """
+    if options is None:
+        options = RunOptions()
+    return replace(options, **overrides) if overrides else options
@@ -0,0 +1,297 @@
+import json
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ruamel.yaml.nodes import MappingNode, Node, ScalarNode, SequenceNode
+from ruamel.yaml.resolver import VersionedResolver
+
+from .resourcetypes import uses_json_tags
+
+# A text edit: replaces text[start:end] with the replacement, an insertion has start == end
+Edit = Tuple[int, int, str]
+
+STR_TAG = "tag:yaml.org,2002:str"
+MERGE_TAG = "tag:yaml.org,2002:merge"
+
+# CloudFormation reads yaml 1.1, we dump yaml 1.2: a plain string must be a string in both
+_RESOLVERS = (VersionedResolver(version=(1, 1)), VersionedResolver(version=(1, 2)))
+_PLAIN = re.compile(r'[^\s\-?:,\[\]{}#&*!|>\'"%@`][^\n]*')
+_BETWEEN_KEY_AND_VALUE = re.compile(r'[ \t]*:[ \t]*')
+
+
+class CannotPatch(Exception):
+    """
+    A change which can't be made with a text edit, the template has to be dumped instead
+    """
+
+
+def is_plain(value: str) -> bool:
+    """
+    Returns whether a string can be written as a plain (unquoted) yaml scalar
+    """
+    return (
+        _PLAIN.fullmatch(value) is not None
+        and value == value.rstrip()
+        and ": " not in value and " #" not in value and not value.endswith(":")
+        and all(resolver.resolve(ScalarNode, value, (True, False)) == STR_TAG for resolver in _RESOLVERS)
+    )
+
+
+def format_scalar(value, style: Optional[str] = None) -> str:
+    """
+    Returns a tag key or value as yaml text, quoted like the scalar it replaces (if any)
+    """
+    if not isinstance(value, str) or "\n" in value:
+        raise CannotPatch(f"{value!r} is no single line string")
+    if style == '"':
+        return json.dumps(value, ensure_ascii=False)
+    if style == "'" or not is_plain(value):
+        return "'" + value.replace("'", "''") + "'"
+    return value
+
+
+def mapping_get(node: MappingNode, key: str) -> Tuple[Optional[Node], Optional[Node]]:
+    """
+    Returns the (key node, value node) of a key in a mapping node, (None, None) if it's not there
+    """
+    for keynode, valuenode in node.value:
+        if keynode.tag == MERGE_TAG:
+            raise CannotPatch("merge keys")
+        if isinstance(keynode, ScalarNode) and keynode.value == key:
+            return keynode, valuenode
+    return None, None
+
+
+def is_block(node: Node, kind: type) -> bool:
+    return isinstance(node, kind) and not node.flow_style and len(node.value) > 0
+
+
+def node_end(node: Node) -> int:
+    """
+    Returns the index where the text of a node ends. A block collection only ends
+    at the next token, after the comments following it, so the end of its last
+    scalar (or flow collection) is taken instead.
+    """
+    while isinstance(node, (MappingNode, SequenceNode)) and not node.flow_style and node.value:
+        node = node.value[-1][1] if isinstance(node, MappingNode) else node.value[-1]
+    if isinstance(node, ScalarNode) and (node.style in ("|", ">") or node.value == "" and not node.style):
+        raise CannotPatch("the block ends with an empty or a block scalar")
+    return node.end_mark.index
+
+
+def line_end(text: str, index: int) -> int:
+    """
+    Returns the index right after the end of the line index is on
+    """
+    end = text.find("\n", index)
+    return len(text) if end == -1 else end + 1
+
+
+def insert_lines(text: str, index: int, lines: List[str]) -> Edit:
+    """
+    Returns the edit inserting lines after the line of index
+    """
+    position = line_end(text, index)
+    block = "".join(f"{line}\n" for line in lines)
+    if position == len(text) and not text.endswith("\n"):
+        block = "\n" + block[:-1]
+    return position, position, block
+
+
+def tag_lines(tags: Dict, json_tags: bool, keycol: int, dashcol: int) -> List[str]:
+    """
+    Returns the lines of tags: key: value lines at keycol for json tags,
+    - Key / Value items with the dash at dashcol otherwise
+    """
+    if json_tags:
+        return [f"{' ' * keycol}{format_scalar(key)}: {format_scalar(value)}" for key, value in tags.items()]
+
+    lines = []
+    for key, value in tags.items():
+        lines.append(f"{' ' * dashcol}-{' ' * (keycol - dashcol - 1)}Key: {format_scalar(key)}")
+        lines.append(f"{' ' * keycol}Value: {format_scalar(value)}")
+    return lines
+
+
+def value_edit(text: str, keynode: Node, valuenode: Node, value) -> Edit:
+    """
+    Returns the edit replacing the value of a key with value
+    """
+    if isinstance(valuenode, (MappingNode, SequenceNode)) and not valuenode.flow_style:
+        raise CannotPatch("a tag value is a block")
+    start, end = valuenode.start_mark.index, node_end(valuenode)
+    # An alias points to the node of its anchor, which is somewhere else
+    if not _BETWEEN_KEY_AND_VALUE.fullmatch(text, keynode.end_mark.index, start) or text[start] in "&*":
+        raise CannotPatch("a tag value has an anchor or is an alias")
+    style = valuenode.style if isinstance(valuenode, ScalarNode) and valuenode.tag == STR_TAG else None
+    return start, end, format_scalar(value, style)
+
+
+def find_tag_value(tagsnode: Optional[Node], key: str) -> Tuple[Node, Node]:
+    """
+    Returns the (key node, value node) of the value of a tag, in a Key/Value
+    list or a key/value map. The first one counts, like in merge_tags().
+    Raises CannotPatch if the tag isn't there.
+    """
+    keynode, valuenode = None, None
+    if isinstance(tagsnode, MappingNode):
+        keynode, valuenode = mapping_get(tagsnode, key)
+    elif isinstance(tagsnode, SequenceNode):
+        for item in tagsnode.value:
+            if isinstance(item, MappingNode):
+                tagkey = mapping_get(item, "Key")[1]
+                if isinstance(tagkey, ScalarNode) and tagkey.value == key:
+                    keynode, valuenode = mapping_get(item, "Value")
+                    break
+    if valuenode is None:
+        raise CannotPatch(f"tag {key} not found")
+    return keynode, valuenode
+
+
+def final_tags(tags) -> Dict:
+    """
+    Returns the merged tags of a resource as a dict of key => value
+    """
+    if isinstance(tags, dict):
+        return tags
+    final = {}
+    for tag in tags:
+        final.setdefault(tag["Key"], tag["Value"])
+    return final
+
+
+def tags_node(node: MappingNode) -> Optional[Node]:
+    """
+    Returns the node of the Tags of a resource, None if it has none
+    """
+    _, props = mapping_get(node, "Properties")
+    return mapping_get(props, "Tags")[1] if isinstance(props, MappingNode) else None
+
+
+def append_tags_edit(text: str, tagsnode: Node, new_tags: Dict, json_tags: bool) -> Edit:
+    """
+    Returns the edit adding new tags below the last line of the Tags of a
+    resource, indented like the tags which are there
+    """
+    if not is_block(tagsnode, MappingNode if json_tags else SequenceNode):
+        raise CannotPatch("the tags are empty or in flow style")
+    if json_tags:
+        keycol = dashcol = tagsnode.value[0][0].start_mark.column
+    else:
+        dashcol = tagsnode.start_mark.column
+        if not is_block(tagsnode.value[0], MappingNode):
+            raise CannotPatch("a tag is no block mapping")
+        keycol = tagsnode.value[0].start_mark.column
+    return insert_lines(text, node_end(tagsnode), tag_lines(new_tags, json_tags, keycol, dashcol))
+
+
+def tags_block_edit(
+    text: str, nodes: Tuple[Node, MappingNode], new_tags: Dict, json_tags: bool, seq_offset: int
+) -> Edit:
+    """
+    Returns the edit adding a Tags block (and a Properties block if there's
+    none) to a resource without tags, indented like the resource. nodes are the
+    name and the value node of the resource.
+    """
+    namenode, node = nodes
+    propskey, props = mapping_get(node, "Properties")
+    if props is not None:
+        if not is_block(props, MappingNode):
+            raise CannotPatch("the Properties are empty or in flow style")
+        parentkey, parent, lines = propskey, props, []
+    else:
+        parentkey, parent, lines = namenode, node, [f"{' ' * node.value[0][0].start_mark.column}Properties:"]
+    column = parent.value[0][0].start_mark.column
+    step = column - parentkey.start_mark.column
+    if props is None:
+        column += step
+    if step <= 0:
+        raise CannotPatch("unexpected indentation")
+
+    lines.append(f"{' ' * column}Tags:")
+    if json_tags:
+        lines.extend(tag_lines(new_tags, json_tags, column + step, column + step))
+    else:
+        lines.extend(tag_lines(new_tags, json_tags, column + seq_offset + 2, column + seq_offset))
+    return insert_lines(text, node_end(parent), lines)
+
+
+def resource_edits(
+    text: str, nodes: Tuple[Node, Node], resource: Dict, entry: Dict, seq_offset: int
+) -> List[Edit]:
+    """
+    Returns the edits which make the text of a resource match its merged tags,
+    see tag_resources() for the entry. nodes are the name and the value node
+    of the resource.
+    """
+    if entry["converted"]:
+        raise CannotPatch("tags in the wrong format are converted")
+    if not is_block(nodes[1], MappingNode):
+        raise CannotPatch("the resource is no block mapping")
+
+    json_tags = uses_json_tags(entry["type"])
+    tags = final_tags(resource["Properties"]["Tags"])
+    added = list(dict.fromkeys(entry["added"] + entry["gitadded"]))
+    updated = [key for key in dict.fromkeys(entry["updated"] + entry["gitupdated"]) if key not in added]
+    tagsnode = tags_node(nodes[1])
+
+    edits = [value_edit(text, *find_tag_value(tagsnode, key), tags[key]) for key in updated]
+    if added:
+        new_tags = {key: tags[key] for key in added}
+        if tagsnode is not None:
+            edits.append(append_tags_edit(text, tagsnode, new_tags, json_tags))
+        else:
+            edits.append(tags_block_edit(text, nodes, new_tags, json_tags, seq_offset))
+    return edits
+
+
+def sequence_offset(resources: Dict[str, Tuple[Node, Node]]) -> int:
+    """
+    Returns the indentation of the dash of a Key/Value list relative to its Tags
+    key, like the first one of the template, 0 (the way we dump them) if there's none
+    """
+    for _, node in resources.values():
+        if isinstance(node, MappingNode):
+            _, props = mapping_get(node, "Properties")
+            if isinstance(props, MappingNode):
+                tagskey, tagsnode = mapping_get(props, "Tags")
+                if is_block(tagsnode, SequenceNode):
+                    return max(tagsnode.start_mark.column - tagskey.start_mark.column, 0)
+    return 0
+
+
+def patch_edits(text: str, root: Node, resources: Dict, report: Dict) -> List[Edit]:
+    """
+    Returns the minimal edits which make the changes of tag_resources() (its report)
+    to the text of a template: updated tag values are replaced and added tags are
+    inserted after the last line of their block, so everything else stays as it
+    was, byte for byte. root is the node tree composed from the text, resources
+    the resources loaded from it. Raises CannotPatch if a change can't be made
+    as a text edit.
+    """
+    _, resourcesnode = mapping_get(root, "Resources")
+    if not isinstance(resourcesnode, MappingNode):
+        raise CannotPatch("the Resources are no mapping")
+    nodes = {
+        namenode.value: (namenode, node) for namenode, node in resourcesnode.value if isinstance(namenode, ScalarNode)
+    }
+    seq_offset = sequence_offset(nodes)
+
+    edits = []
+    for name, entry in report.items():
+        if entry["changed"]:
+            edits.extend(resource_edits(text, nodes[name], resources[name], entry, seq_offset))
+    return sorted(edits)
+
+
+def apply_edits(text: str, edits: List[Edit]) -> Iterator[str]:
+    """
+    Yields the pieces of the edited text, sorted edits applied to text, to be
+    written one by one
+    """
+    position = 0
+    for start, end, replacement in edits:
+        yield text[position:start]
+        yield replacement
+        position = end
+    yield text[position:]
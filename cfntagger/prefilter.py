@@ -0,0 +1,49 @@
+import mmap
+import os
+import re
+
+from .resourcetypes import supports_tags
+
+# The extensions of templates: yaml, and JSON (.template files can be either)
+YAML_EXTENSIONS = (".yml", ".yaml")
+JSON_EXTENSIONS = (".json", ".template")
+
+# Files up to this size are read, bigger ones are mapped into memory
+MMAP_THRESHOLD = 1 << 20
+
+# A Resources section, in yaml or json
+RESOURCES_PATTERN = re.compile(rb'(?:^|[\s{,])["\']?Resources["\']?[ \t]*:', re.MULTILINE)
+# The resource types, e.g. Type: AWS::S3::Bucket or "Type": "AWS::S3::Bucket"
+TYPE_PATTERN = re.compile(rb'["\']?Type["\']?[ \t]*:[ \t]*["\']?([A-Za-z0-9]+::[A-Za-z0-9]+::[A-Za-z0-9]+)')
+
+
+def has_taggable_resources(data) -> bool:
+    """
+    Returns whether the bytes of a file look like a CloudFormation template with at
+    least one resource type which supports tags
+    """
+    if RESOURCES_PATTERN.search(data) is None:
+        return False
+
+    return any(supports_tags(match.group(1).decode("ascii")) for match in TYPE_PATTERN.finditer(data))
+
+
+def looks_like_template(filename: str) -> bool:
+    """
+    Cheap byte level scan which tells whether a file can contain resources to tag,
+    to skip e.g. GitHub workflows, docker-compose and Ansible files without
+    parsing them. It may let through a file which isn't a template (the Tagger
+    will find out), but never rejects a template with taggable resources.
+    Unreadable files are let through as well, for the Tagger to report them.
+    """
+    try:
+        with open(filename, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return False
+            if size < MMAP_THRESHOLD:
+                return has_taggable_resources(f.read())
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return has_taggable_resources(data)
+    except OSError:
+        return True
@@ -0,0 +1,160 @@
+import json
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, TextIO
+from html import escape
+
+from .version import __version__
+
+REPORT_FORMATS = ("json", "jsonl", "junit")
+
+_ANSI_COLOR = re.compile(r'\x1b\[[0-9;]*m')
+
+
+def quoteattr(value: str) -> str:
+    # xml.sax.saxutils would pull in urllib, too slow to import for --version
+    return f'"{escape(value)}"'
+
+
+def file_entry(result: Dict, check: bool = False) -> Dict:
+    """
+    Returns the report entry of a tagged (or failed) file. The status is one of
+    changed, unchanged, skipped, error or, when checking, compliant and noncompliant.
+    """
+    if result["exitcode"] != 0:
+        status = "error"
+    elif result.get("skipped"):
+        status = "skipped"
+    elif check:
+        status = "noncompliant" if result["changed"] else "compliant"
+    else:
+        status = "changed" if result["changed"] else "unchanged"
+
+    entry = {
+        "filename": result["filename"],
+        "status": status,
+        "exitcode": result["exitcode"],
+        "written": result.get("written", False),
+        "skipped": result.get("skipped"),
+        "resources": result["stats"],
+    }
+    if status == "error":
+        entry["error"] = _ANSI_COLOR.sub("", result.get("output", "")).strip()
+    if "timings" in result:
+        entry["timings"] = result["timings"]
+    return entry
+
+
+def skipped_entry(filename: str, reason: str) -> Dict:
+    """
+    Returns the report entry of a file skipped before tagging
+    """
+    return {
+        "filename": filename, "status": "skipped", "exitcode": 0, "written": False, "skipped": reason, "resources": {}
+    }
+
+
+class Report(ABC):
+    """
+    Streams the results of a run to a file as they come in: call add() per
+    file and finish() with the summary at the end. A report format implements
+    write_entry() and write_summary().
+    """
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.summary = {"files": 0, "exitcode": 0}
+
+    def start(self):
+        pass
+
+    def add(self, entry: Dict):
+        self.summary["files"] += 1
+        self.summary[entry["status"]] = self.summary.get(entry["status"], 0) + 1
+        self.write_entry(entry)
+        self.stream.flush()
+
+    @abstractmethod
+    def write_entry(self, entry: Dict):
+        pass
+
+    def finish(self, exitcode: int):
+        self.summary["exitcode"] = exitcode
+        self.write_summary()
+        self.stream.flush()
+
+    @abstractmethod
+    def write_summary(self):
+        pass
+
+
+class JsonReport(Report):
+    """
+    A single JSON document: {"version": ..., "files": [...], "summary": {...}},
+    written one file entry at a time
+    """
+    def __init__(self, stream: TextIO):
+        super().__init__(stream)
+        self.first = True
+
+    def start(self):
+        self.stream.write(f'{{"version": {json.dumps(__version__)}, "files": [\n')
+
+    def write_entry(self, entry: Dict):
+        self.stream.write(("" if self.first else ",\n") + json.dumps(entry))
+        self.first = False
+
+    def write_summary(self):
+        self.stream.write(f'\n], "summary": {json.dumps(self.summary)}}}\n')
+
+
+class JsonlReport(Report):
+    """
+    JSON lines: one object per file, followed by a summary object
+    """
+    def write_entry(self, entry: Dict):
+        self.stream.write(json.dumps({"type": "file", **entry}) + "\n")
+
+    def write_summary(self):
+        self.stream.write(json.dumps({"type": "summary", "version": __version__, **self.summary}) + "\n")
+
+
+class JunitReport(Report):
+    """
+    JUnit XML, with a testcase per file: a failure for a noncompliant file, an
+    error for a file which couldn't be tagged. The counts of the suite are only
+    known at the end, so they're left out.
+    """
+    def start(self):
+        self.stream.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n')
+        self.stream.write(f'<testsuite name={quoteattr("cfntagger " + __version__)}>\n')
+
+    def write_entry(self, entry: Dict):
+        attributes = f'classname="cfntagger" name={quoteattr(entry["filename"])}'
+        if "timings" in entry:
+            attributes += f' time="{sum(entry["timings"]["phases"].values()):.6f}"'
+
+        details = "\n".join(
+            f'{name} ({resource.get("type", "")}): '
+            f'added {", ".join(resource["addedtags"]) or "-"}, updated {", ".join(resource["updatedtags"]) or "-"}'
+            for name, resource in entry["resources"].items()
+            if resource["addedtags"] or resource["updatedtags"]
+        )
+
+        self.stream.write(f"<testcase {attributes}>")
+        if entry["status"] == "error":
+            self.stream.write(f'<error message="could not tag the template">{escape(entry["error"], quote=False)}</error>')
+        elif entry["status"] == "skipped":
+            self.stream.write(f'<skipped message={quoteattr(entry["skipped"])}/>')
+        elif entry["status"] == "noncompliant":
+            self.stream.write(f'<failure message="missing or divergent tags">{escape(details, quote=False)}</failure>')
+        elif details:
+            self.stream.write(f"<system-out>{escape(details, quote=False)}</system-out>")
+        self.stream.write("</testcase>\n")
+
+    def write_summary(self):
+        self.stream.write("</testsuite>\n</testsuites>\n")
+
+
+def get_report(fmt: str, stream: TextIO) -> Report:
+    reports = {"json": JsonReport, "jsonl": JsonlReport, "junit": JunitReport}
+    return reports[fmt](stream)
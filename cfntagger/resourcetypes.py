@@ -0,0 +1,541 @@
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+
+# Tag formats used by CloudFormation resources:
+#   list: Tags:            json: Tags:
+#           - Key: foo             foo: bar
+#             Value: bar
+TAGFORMAT_LIST = "list"
+TAGFORMAT_JSON = "json"
+
+
+# Resource types which take their tags as a key/value map instead of a Key/Value list
+_RESOURCETYPES_JSON = (
+    "AWS::AmplifyUIBuilder::Component",
+    "AWS::AmplifyUIBuilder::Form",
+    "AWS::AmplifyUIBuilder::Theme",
+    "AWS::ApiGatewayV2::Api",
+    "AWS::ApiGatewayV2::DomainName",
+    "AWS::ApiGatewayV2::Stage",
+    "AWS::ApiGatewayV2::VpcLink",
+    "AWS::Batch::ComputeEnvironment",
+    "AWS::Batch::JobDefinition",
+    "AWS::Batch::JobQueue",
+    "AWS::Batch::SchedulingPolicy",
+    "AWS::CodeStarNotifications::NotificationRule",
+    "AWS::DAX::Cluster",
+    "AWS::FIS::ExperimentTemplate",
+    "AWS::Glue::Crawler",
+    "AWS::Glue::DataQualityRuleset",
+    "AWS::Glue::DevEndpoint",
+    "AWS::Glue::Job",
+    "AWS::Glue::MLTransform",
+    "AWS::Glue::Trigger",
+    "AWS::Glue::Workflow",
+    "AWS::M2::Application",
+    "AWS::M2::Environment",
+    "AWS::MSK::Cluster",
+    "AWS::MSK::ServerlessCluster",
+    "AWS::MSK::VpcConnection",
+    "AWS::MWAA::Environment",
+    "AWS::Pipes::Pipe",
+    "AWS::ResilienceHub::App",
+    "AWS::ResilienceHub::ResiliencyPolicy",
+    "AWS::ResourceExplorer2::Index",
+    "AWS::ResourceExplorer2::View",
+    "AWS::Serverless::Function",
+    "AWS::ServiceCatalogAppRegistry::Application",
+    "AWS::ServiceCatalogAppRegistry::AttributeGroup",
+    "AWS::SecurityHub::AutomationRule",
+    "AWS::SecurityHub::Hub",
+    "AWS::SSM::Parameter",
+)
+
+_RESOURCETYPES_TO_TAG = (
+    "AWS::ACMPCA::CertificateAuthority",
+    "AWS::Amplify::App",
+    "AWS::Amplify::Branch",
+    "AWS::AmplifyUIBuilder::Component",
+    "AWS::AmplifyUIBuilder::Form",
+    "AWS::AmplifyUIBuilder::Theme",
+    "AWS::AccessAnalyzer::Analyzer",
+    "AWS::ApiGateway::ClientCertificate",
+    "AWS::ApiGateway::DomainName",
+    "AWS::ApiGateway::RestApi",
+    "AWS::ApiGateway::Stage",
+    "AWS::ApiGateway::UsagePlan",
+    "AWS::ApiGateway::VpcLink",
+    "AWS::ApiGatewayV2::Api",
+    "AWS::ApiGatewayV2::DomainName",
+    "AWS::ApiGatewayV2::Stage",
+    "AWS::ApiGatewayV2::VpcLink",
+    "AWS::AppConfig::Application",
+    "AWS::AppConfig::ConfigurationProfile",
+    "AWS::AppConfig::Deployment",
+    "AWS::AppConfig::DeploymentStrategy",
+    "AWS::AppConfig::Environment",
+    "AWS::AppConfig::Extension",
+    "AWS::AppConfig::ExtensionAssociation",
+    "AWS::AppFlow::Flow",
+    "AWS::AppIntegrations::DataIntegration",
+    "AWS::AppIntegrations::EventIntegration",
+    "AWS::ApplicationInsights::Application",
+    "AWS::AppMesh::GatewayRoute",
+    "AWS::AppMesh::Mesh",
+    "AWS::AppMesh::Route",
+    "AWS::AppMesh::VirtualGateway",
+    "AWS::AppMesh::VirtualNode",
+    "AWS::AppMesh::VirtualRouter",
+    "AWS::AppMesh::VirtualService",
+    "AWS::AppStream::AppBlock",
+    "AWS::AppStream::AppBlockBuilder",
+    "AWS::AppStream::Application",
+    "AWS::AppStream::Fleet",
+    "AWS::AppStream::ImageBuilder",
+    "AWS::AppStream::Stack",
+    "AWS::AppSync::GraphQLApi",
+    "AWS::APS::RuleGroupsNamespace",
+    "AWS::APS::Workspace",
+    "AWS::Athena::CapacityReservation",
+    "AWS::Athena::DataCatalog",
+    "AWS::Athena::WorkGroup",
+    "AWS::AuditManager::Assessment",
+    "AWS::BackupGateway::Hypervisor",
+    "AWS::Batch::ComputeEnvironment",
+    "AWS::Batch::JobDefinition",
+    "AWS::Batch::JobQueue",
+    "AWS::Batch::SchedulingPolicy",
+    "AWS::BillingConductor::BillingGroup",
+    "AWS::BillingConductor::CustomLineItem",
+    "AWS::BillingConductor::PricingPlan",
+    "AWS::BillingConductor::PricingRule",
+    "AWS::Cassandra::Keyspace",
+    "AWS::Cassandra::Table",
+    "AWS::CertificateManager::Certificate",
+    "AWS::CleanRooms::Collaboration",
+    "AWS::CleanRooms::ConfiguredTable",
+    "AWS::CleanRooms::ConfiguredTableAssociation",
+    "AWS::CleanRooms::Membership",
+    "AWS::Cloud9::EnvironmentEC2",
+    "AWS::CloudFormation::Stack",
+    "AWS::CloudFormation::StackSet",
+    "AWS::CloudFront::Distribution",
+    "AWS::CloudFront::StreamingDistribution",
+    "AWS::CloudTrail::Channel",
+    "AWS::CloudTrail::EventDataStore",
+    "AWS::CloudTrail::Trail",
+    "AWS::CloudWatch::InsightRule",
+    "AWS::CloudWatch::MetricStream",
+    "AWS::CodeBuild::Project",
+    "AWS::CodeBuild::ReportGroup",
+    "AWS::CodeArtifact::Domain",
+    "AWS::CodeArtifact::Repository",
+    "AWS::CodeCommit::Repository",
+    "AWS::CodeDeploy::Application",
+    "AWS::CodeDeploy::DeploymentGroup",
+    "AWS::CodeGuruProfiler::ProfilingGroup",
+    "AWS::CodeGuruReviewer::RepositoryAssociation",
+    "AWS::CodePipeline::CustomActionType",
+    "AWS::CodePipeline::Pipeline",
+    "AWS::CodeStarConnections::Connection",
+    "AWS::CodeStarNotifications::NotificationRule",
+    "AWS::Comprehend::DocumentClassifier",
+    "AWS::Comprehend::Flywheel",
+    "AWS::Config::AggregationAuthorization",
+    "AWS::Config::ConfigurationAggregator",
+    "AWS::Config::StoredQuery",
+    "AWS::Connect::ContactFlow",
+    "AWS::Connect::ContactFlowModule",
+    "AWS::Connect::EvaluationForm",
+    "AWS::Connect::HoursOfOperation",
+    "AWS::Connect::PhoneNumber",
+    "AWS::Connect::Prompt",
+    "AWS::Connect::QuickConnect",
+    "AWS::Connect::Rule",
+    "AWS::Connect::TaskTemplate",
+    "AWS::Connect::User",
+    "AWS::ConnectCampaigns::Campaign",
+    "AWS::CustomerProfiles::CalculatedAttributeDefinition",
+    "AWS::CustomerProfiles::Domain",
+    "AWS::CustomerProfiles::EventStream",
+    "AWS::CustomerProfiles::Integration",
+    "AWS::CustomerProfiles::ObjectType",
+    "AWS::DataBrew::Dataset",
+    "AWS::DataBrew::Job",
+    "AWS::DataBrew::Project",
+    "AWS::DataBrew::Recipe",
+    "AWS::DataBrew::Ruleset",
+    "AWS::DataBrew::Schedule",
+    "AWS::DLM::LifecyclePolicy",
+    "AWS::DataSync::Agent",
+    "AWS::DataSync::LocationEFS",
+    "AWS::DataSync::LocationFSxLustre",
+    "AWS::DataSync::LocationFSxONTAP",
+    "AWS::DataSync::LocationFSxOpenZFS",
+    "AWS::DataSync::LocationFSxWindows",
+    "AWS::DataSync::LocationHDFS",
+    "AWS::DataSync::LocationNFS",
+    "AWS::DataSync::LocationObjectStorage",
+    "AWS::DataSync::LocationS3",
+    "AWS::DataSync::LocationSMB",
+    "AWS::DataSync::StorageSystem",
+    "AWS::DataSync::Task",
+    "AWS::DAX::Cluster",
+    "AWS::Detective::Graph",
+    "AWS::DeviceFarm::DevicePool",
+    "AWS::DeviceFarm::InstanceProfile",
+    "AWS::DeviceFarm::NetworkProfile",
+    "AWS::DeviceFarm::Project",
+    "AWS::DeviceFarm::TestGridProject",
+    "AWS::DeviceFarm::VPCEConfiguration",
+    "AWS::DMS::Endpoint",
+    "AWS::DMS::EventSubscription",
+    "AWS::DMS::ReplicationInstance",
+    "AWS::DMS::ReplicationSubnetGroup",
+    "AWS::DMS::ReplicationTask",
+    "AWS::DocDB::DBCluster",
+    "AWS::DocDB::DBClusterParameterGroup",
+    "AWS::DocDB::DBInstance",
+    "AWS::DocDB::DBSubnetGroup",
+    "AWS::DocDBElastic::Cluster",
+    "AWS::DynamoDB::Table",
+    "AWS::EC2::CarrierGateway",
+    "AWS::EC2::CustomerGateway",
+    "AWS::EC2::DHCPOptions",
+    "AWS::EC2::EIP",
+    "AWS::EC2::FlowLog",
+    "AWS::EC2::Instance",
+    "AWS::EC2::InternetGateway",
+    "AWS::EC2::IPAM",
+    "AWS::EC2::IPAMPool",
+    "AWS::EC2::IPAMResourceDiscovery",
+    "AWS::EC2::IPAMResourceDiscoveryAssociation",
+    "AWS::EC2::KeyPair",
+    "AWS::EC2::LocalGatewayRouteTable",
+    "AWS::EC2::LocalGatewayRouteTableVirtualInterfaceGroupAssociation",
+    "AWS::EC2::LocalGatewayRouteTableVPCAssociation",
+    "AWS::EC2::NatGateway",
+    "AWS::EC2::NetworkAcl",
+    "AWS::EC2::NetworkInsightsAccessScope",
+    "AWS::EC2::NetworkInsightsAccessScopeAnalysis",
+    "AWS::EC2::NetworkInsightsAnalysis",
+    "AWS::EC2::NetworkInsightsPath",
+    "AWS::EC2::NetworkInterface",
+    "AWS::EC2::PlacementGroup",
+    "AWS::EC2::PrefixList",
+    "AWS::EC2::RouteTable",
+    "AWS::EC2::SecurityGroup",
+    "AWS::EC2::Subnet",
+    "AWS::EC2::TrafficMirrorFilter",
+    "AWS::EC2::TrafficMirrorSession",
+    "AWS::EC2::TrafficMirrorTarget",
+    "AWS::EC2::TransitGateway",
+    "AWS::EC2::TransitGatewayAttachment",
+    "AWS::EC2::TransitGatewayConnect",
+    "AWS::EC2::TransitGatewayMulticastDomain",
+    "AWS::EC2::TransitGatewayPeeringAttachment",
+    "AWS::EC2::TransitGatewayRouteTable",
+    "AWS::EC2::TransitGatewayVpcAttachment",
+    "AWS::EC2::VerifiedAccessEndpoint",
+    "AWS::EC2::VerifiedAccessGroup",
+    "AWS::EC2::VerifiedAccessInstance",
+    "AWS::EC2::VerifiedAccessTrustProvider",
+    "AWS::EC2::VPNConnection",
+    "AWS::EC2::VPNGateway",
+    "AWS::EC2::Volume",
+    "AWS::EC2::VPC",
+    "AWS::ECR::PublicRepository",
+    "AWS::ECR::Repository",
+    "AWS::ECS::CapacityProvider",
+    "AWS::ECS::Cluster",
+    "AWS::ECS::ContainerInstance",
+    "AWS::ECS::Service",
+    "AWS::ECS::Task",
+    "AWS::ECS::TaskDefinition",
+    "AWS::EKS::Cluster",
+    "AWS::EKS::Addon",
+    "AWS::EKS::NodeGroup",
+    "AWS::EKS::FargateProfile",
+    "AWS::EKS::IdentityProviderConfig",
+    "AWS::ElasticBeanstalk::Environment",
+    "AWS::ElastiCache::CacheCluster",
+    "AWS::ElastiCache::ParameterGroup",
+    "AWS::ElastiCache::SecurityGroup",
+    "AWS::ElastiCache::ReplicationGroup",
+    "AWS::ElastiCache::SubnetGroup",
+    "AWS::ElastiCache::Snapshot",
+    "AWS::ElasticLoadBalancing::LoadBalancer",
+    "AWS::ElasticLoadBalancingV2::LoadBalancer",
+    "AWS::ElasticLoadBalancingV2::TargetGroup",
+    "AWS::ElasticSearch::Domain",
+    "AWS::EMR::Cluster",
+    "AWS::EMR::Studio",
+    "AWS::EMRServerless::Application",
+    "AWS::EMRContainers::VirtualCluster",
+    "AWS::Events::EventBus",
+    "AWS::Evidently::Experiment",
+    "AWS::Evidently::Feature",
+    "AWS::Evidently::Launch",
+    "AWS::Evidently::Project",
+    "AWS::Evidently::Segment",
+    "AWS::FinSpace::Environment",
+    "AWS::FIS::ExperimentTemplate",
+    "AWS::FMS::Policy",
+    "AWS::FMS::ResourceSet",
+    "AWS::Forecast::Dataset",
+    "AWS::Forecast::DatasetGroup",
+    "AWS::FraudDetector::Detector",
+    "AWS::FraudDetector::EntityType",
+    "AWS::FraudDetector::EventType",
+    "AWS::FraudDetector::Label",
+    "AWS::FraudDetector::List",
+    "AWS::FraudDetector::Outcome",
+    "AWS::FraudDetector::Variable",
+    "AWS::FSx::DataRepositoryAssociation",
+    "AWS::FSx::FileSystem",
+    "AWS::FSx::Snapshot",
+    "AWS::FSx::StorageVirtualMachine",
+    "AWS::FSx::Volume",
+    "AWS::GlobalAccelerator::Accelerator",
+    "AWS::Glue::Crawler",
+    "AWS::Glue::DataQualityRuleset",
+    "AWS::Glue::DevEndpoint",
+    "AWS::Glue::MLTransform",
+    "AWS::Glue::Job",
+    "AWS::Glue::Registry",
+    "AWS::Glue::Schema",
+    "AWS::Glue::Trigger",
+    "AWS::Glue::Workflow",
+    "AWS::GroundStation::Config",
+    "AWS::GroundStation::DataflowEndpointGroup",
+    "AWS::GroundStation::MissionProfile",
+    "AWS::GuardDuty::Detector",
+    "AWS::GuardDuty::Filter",
+    "AWS::GuardDuty::IPSet",
+    "AWS::GuardDuty::ThreatIntelSet",
+    "AWS::HealthLake::FHIRDatastore",
+    "AWS::IAM::Role",
+    "AWS::IAM::OIDCProvider",
+    "AWS::IAM::SAMLProvider",
+    "AWS::IAM::ServerCertificate",
+    "AWS::IAM::User",
+    "AWS::IAM::VirtualMFADevice",
+    "AWS::ImageBuilder::Component",
+    "AWS::ImageBuilder::ContainerRecipe",
+    "AWS::ImageBuilder::DistributionConfiguration",
+    "AWS::ImageBuilder::Image",
+    "AWS::ImageBuilder::ImagePipeline",
+    "AWS::ImageBuilder::ImageRecipe",
+    "AWS::ImageBuilder::InfrastructureConfiguration",
+    "AWS::InternetMonitor::Monitor",
+    "AWS::Kendra::DataSource",
+    "AWS::Kendra::Faq",
+    "AWS::Kendra::Index",
+    "AWS::KendraRanking::ExecutionPlan",
+    "AWS::SSMIncidents::ReplicationSet",
+    "AWS::SSMIncidents::ResponsePlan",
+    "AWS::KMS::Key",
+    "AWS::KMS::ReplicaKey",
+    "AWS::Kinesis::Stream",
+    "AWS::KinesisAnalyticsV2::Application",
+    "AWS::KinesisFirehose::DeliveryStream",
+    "AWS::KinesisVideo::SignalingChannel",
+    "AWS::KinesisVideo::Stream",
+    "AWS::Lambda::Function",
+    "AWS::Lightsail::Bucket",
+    "AWS::Lightsail::Certificate",
+    "AWS::Lightsail::Container",
+    "AWS::Lightsail::Database",
+    "AWS::Lightsail::Disk",
+    "AWS::Lightsail::Distribution",
+    "AWS::Lightsail::Instance",
+    "AWS::Lightsail::LoadBalancer",
+    "AWS::Logs::LogGroup",
+    "AWS::LookoutEquipment::InferenceScheduler",
+    "AWS::M2::Application",
+    "AWS::M2::Environment",
+    "AWS::Macie::AllowList",
+    "AWS::ManagedBlockchain::Accessor",
+    "AWS::AmazonMQ::Broker",
+    "AWS::AmazonMQ::Configuration",
+    "AWS::MemoryDB::User",
+    "AWS::MemoryDB::ACL",
+    "AWS::MemoryDB::Cluster",
+    "AWS::MemoryDB::ParameterGroup",
+    "AWS::MemoryDB::SubnetGroup",
+    "AWS::MSK::Cluster",
+    "AWS::MSK::ServerlessCluster",
+    "AWS::MSK::VpcConnection",
+    "AWS::MWAA::Environment",
+    "AWS::Neptune::DBSubnetGroup",
+    "AWS::Neptune::DBCluster",
+    "AWS::Neptune::DBClusterParameterGroup",
+    "AWS::Neptune::DBInstance",
+    "AWS::Neptune::DBParameterGroup",
+    "AWS::NetworkFirewall::RuleGroup",
+    "AWS::NetworkFirewall::Firewall",
+    "AWS::NetworkFirewall::FirewallPolicy",
+    "AWS::NetworkManager::ConnectAttachment",
+    "AWS::NetworkManager::ConnectPeer",
+    "AWS::NetworkManager::CoreNetwork",
+    "AWS::NetworkManager::Device",
+    "AWS::NetworkManager::GlobalNetwork",
+    "AWS::NetworkManager::Link",
+    "AWS::NetworkManager::Site",
+    "AWS::NetworkManager::SiteToSiteVpnAttachment",
+    "AWS::NetworkManager::VpcAttachment",
+    "AWS::OpenSearchService::Domain",
+    "AWS::OpenSearchServerless::Collection",
+    "AWS::OpsWorks::Layer",
+    "AWS::OpsWorks::Stack",
+    "AWS::OpsWorksCM::Server",
+    "AWS::Organizations::Account",
+    "AWS::Organizations::OrganizationalUnit",
+    "AWS::Organizations::Policy",
+    "AWS::Organizations::ResourcePolicy",
+    "AWS::OSIS::Pipeline",
+    "AWS::Panorama::ApplicationInstance",
+    "AWS::Panorama::Package",
+    "AWS::Pipes::Pipe",
+    "AWS::Proton::EnvironmentAccountConnection",
+    "AWS::Proton::EnvironmentTemplate",
+    "AWS::Proton::ServiceTemplate",
+    "AWS::QLDB::Ledger",
+    "AWS::QLDB::Stream",
+    "AWS::QuickSight::Theme",
+    "AWS::QuickSight::Analysis",
+    "AWS::QuickSight::Dashboard",
+    "AWS::QuickSight::DataSet",
+    "AWS::QuickSight::DataSource",
+    "AWS::QuickSight::Template",
+    "AWS::RAM::Permission",
+    "AWS::RAM::ResourceShare",
+    "AWS::RDS::DBInstance",
+    "AWS::RDS::DBCluster",
+    "AWS::RDS::DBClusterParameterGroup",
+    "AWS::RDS::DBParameterGroup",
+    "AWS::RDS::DBProxy",
+    "AWS::RDS::DBProxyEndpoint",
+    "AWS::RDS::DBSecurityGroup",
+    "AWS::RDS::DBSubnetGroup",
+    "AWS::RDS::OptionGroup",
+    "AWS::Redshift::Cluster",
+    "AWS::Redshift::ClusterParameterGroup",
+    "AWS::Redshift::ClusterSecurityGroup",
+    "AWS::Redshift::ClusterSubnetGroup",
+    "AWS::Redshift::EventSubscription",
+    "AWS::RedshiftServerless::Namespace",
+    "AWS::RedshiftServerless::Workgroup",
+    "AWS::Rekognition::Collection",
+    "AWS::Rekognition::StreamProcessor",
+    "AWS::ResilienceHub::App",
+    "AWS::ResilienceHub::ResiliencyPolicy",
+    "AWS::ResourceExplorer2::Index",
+    "AWS::ResourceExplorer2::View",
+    "AWS::Route53RecoveryControl::Cluster",
+    "AWS::Route53RecoveryControl::ControlPanel",
+    "AWS::Route53RecoveryControl::SafetyRule",
+    "AWS::Route53Resolver::FirewallDomainList",
+    "AWS::Route53Resolver::FirewallRuleGroup",
+    "AWS::Route53Resolver::FirewallRuleGroupAssociation",
+    "AWS::Route53Resolver::ResolverEndpoint",
+    "AWS::Route53Resolver::ResolverRule",
+    "AWS::RUM::AppMonitor",
+    "AWS::S3::Bucket",
+    "AWS::S3::StorageLens",
+    "AWS::SageMaker::App",
+    "AWS::SageMaker::AppImageConfig",
+    "AWS::SageMaker::CodeRepository",
+    "AWS::SageMaker::DataQualityJobDefinition",
+    "AWS::SageMaker::Device",
+    "AWS::SageMaker::DeviceFleet",
+    "AWS::SageMaker::Domain",
+    "AWS::SageMaker::Endpoint",
+    "AWS::SageMaker::EndpointConfig",
+    "AWS::SageMaker::FeatureGroup",
+    "AWS::SageMaker::Image",
+    "AWS::SageMaker::Model",
+    "AWS::SageMaker::ModelBiasJobDefinition",
+    "AWS::SageMaker::ModelExplainabilityJobDefinition",
+    "AWS::SageMaker::ModelPackage",
+    "AWS::SageMaker::ModelPackageGroup",
+    "AWS::SageMaker::ModelQualityJobDefinition",
+    "AWS::SageMaker::MonitoringSchedule",
+    "AWS::SageMaker::NotebookInstance",
+    "AWS::SageMaker::Pipeline",
+    "AWS::SageMaker::Project",
+    "AWS::SageMaker::UserProfile",
+    "AWS::SageMaker::Workteam",
+    "AWS::Scheduler::ScheduleGroup",
+    "AWS::SecretsManager::Secret",
+    "AWS::Serverless::Function",
+    "AWS::ServiceCatalog::CloudFormationProduct",
+    "AWS::ServiceCatalog::CloudFormationProvisionedProduct",
+    "AWS::ServiceCatalog::Portfolio",
+    "AWS::ServiceCatalogAppRegistry::Application",
+    "AWS::ServiceCatalogAppRegistry::AttributeGroup",
+    "AWS::SecurityHub::AutomationRule",
+    "AWS::SecurityHub::Hub",
+    "AWS::SES::ContactList",
+    "AWS::Shield::Protection",
+    "AWS::Shield::ProtectionGroup",
+    "AWS::SNS::Topic",
+    "AWS::SQS::Queue",
+    "AWS::StepFunctions::Activity",
+    "AWS::StepFunctions::StateMachine",
+    "AWS::SSM::Document",
+    "AWS::SSM::MaintenanceWindow",
+    "AWS::SSM::PatchBaseline",
+    "AWS::SSM::Parameter",
+    "AWS::Synthetics::Canary",
+    "AWS::Synthetics::Group",
+    "AWS::WAFv2::IPSet",
+    "AWS::WAFv2::RegexPatternSet",
+    "AWS::WAFv2::RuleGroup",
+    "AWS::WAFv2::WebACL",
+    "AWS::WorkSpaces::Workspace",
+    "AWS::WorkSpaces::ConnectionAlias",
+    "AWS::XRay::SamplingRule",
+    "AWS::XRay::Group",
+)
+
+
+# Registry of all resource types which support tags, with their tag format.
+# Built once at import and read-only afterwards.
+RESOURCE_TYPES: Mapping[str, str] = MappingProxyType(
+    {
+        restype: TAGFORMAT_JSON if restype in _RESOURCETYPES_JSON else TAGFORMAT_LIST
+        for restype in _RESOURCETYPES_TO_TAG
+    }
+)
+
+TAGGABLE_RESOURCETYPES = frozenset(RESOURCE_TYPES)
+JSON_RESOURCETYPES = frozenset(
+    restype for restype, tagformat in RESOURCE_TYPES.items() if tagformat == TAGFORMAT_JSON
+)
+
+
+def get_tag_format(restype) -> Optional[str]:
+    """
+    Returns the tag format (TAGFORMAT_LIST or TAGFORMAT_JSON) of a resource type,
+    or None if the resource type does not support tags
+    """
+    if not isinstance(restype, str):
+        # e.g. Type: !Ref SomeParameter
+        return None
+    return RESOURCE_TYPES.get(restype)
+
+
+def supports_tags(restype) -> bool:
+    """
+    Returns whether a resource type supports tags
+    """
+    return get_tag_format(restype) is not None
+
+
+def uses_json_tags(restype) -> bool:
+    """
+    Returns whether a resource type takes its tags as a key/value map
+    """
+    return get_tag_format(restype) == TAGFORMAT_JSON
@@ -0,0 +1,234 @@
+import io
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, redirect_stdout
+from dataclasses import replace
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .cfntagger import Tagger, RunContext
+from .fileio import atomic_write, FSYNC_ALWAYS
+from .options import RunOptions, make_options
+
+
+def tag_file(
+    cfnfile: str, context: Optional[RunContext] = None, options: Optional[RunOptions] = None, source: Optional[str] = None,
+    **overrides
+) -> Dict:
+    """
+    Tags a single CloudFormation template and returns a result dict with
+    the filename, the per-resource tag stats, whether the template changed
+    and was written, why it was skipped (if so), the exit code and, with the
+    timings option, its timings. Options (and overrides) are passed on to the Tagger.
+    """
+    cfn_tagger = Tagger(cfnfile, options=options, context=context, source=source, **overrides)
+    cfn_tagger.tag()
+
+    result = {
+        "filename": cfnfile,
+        "stats": cfn_tagger.stats,
+        "changed": cfn_tagger.changed,
+        "written": cfn_tagger.written,
+        "skipped": cfn_tagger.skipped,
+        "exitcode": 0,
+        "output": "",
+    }
+    if cfn_tagger.output is not None:
+        result["template"] = cfn_tagger.output
+    if cfn_tagger.timings.enabled:
+        result["timings"] = cfn_tagger.timings.as_dict()
+    return result
+
+
+def tag_file_captured(
+    cfnfile: str, context: Optional[RunContext] = None, options: Optional[RunOptions] = None, source: Optional[str] = None,
+    **overrides
+) -> Dict:
+    """
+    Worker entrypoint for the process pool: runs tag_file() while capturing
+    everything printed for this file, so the parent can print it in one go.
+    A failing file does not stop the run, it just returns a non-zero exit code.
+    """
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        try:
+            result = tag_file(cfnfile, context=context, options=options, source=source, **overrides)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+            result = {"filename": cfnfile, "stats": {}, "changed": False, "exitcode": code}
+        except Exception:  # pylint: disable=broad-except
+            print(traceback.format_exc(), end='')
+            result = {"filename": cfnfile, "stats": {}, "changed": False, "exitcode": 1}
+
+    result["output"] = buffer.getvalue()
+    return result
+
+
+def read_template(cfnfile: str) -> Optional[str]:
+    """
+    Reads a template ahead of tagging it, None if that fails: the Tagger will
+    read it again and report the failure
+    """
+    try:
+        with open(cfnfile, encoding='utf-8') as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def read_ahead(cfnfiles: Iterable[str], readers: int, depth: int) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Yields (cfnfile, text) in input order, with the files read by a pool of reader
+    threads. At most depth files are read ahead: a reader waits for the tagging
+    to catch up, so a stream of files is never read entirely into memory.
+    """
+    with ThreadPoolExecutor(max_workers=readers, thread_name_prefix="cfntagger-read") as executor:
+        inflight = deque()
+        for cfnfile in cfnfiles:
+            inflight.append((cfnfile, executor.submit(read_template, cfnfile)))
+            if len(inflight) > depth:
+                cfnfile, future = inflight.popleft()
+                yield cfnfile, future.result()
+        while inflight:
+            cfnfile, future = inflight.popleft()
+            yield cfnfile, future.result()
+
+
+def write_template(result: Dict, fsync: bool = False) -> Dict:
+    """
+    Writes the template a Tagger kept for us (see defer_write) and marks the result as written
+    """
+    start = time.perf_counter()
+    with atomic_write(result["filename"], fsync=fsync) as f:
+        f.write(result.pop("template"))
+    result["written"] = True
+    if "timings" in result:
+        phases = result["timings"]["phases"]
+        phases["write"] = phases.get("write", 0.0) + time.perf_counter() - start
+    return result
+
+
+def written(future: Future, result: Dict, capture: bool) -> Dict:
+    """
+    Returns the result of a template once it's written. When capturing, a failing
+    write is reported in the result, like a failing template.
+    """
+    try:
+        return future.result()
+    except Exception:  # pylint: disable=broad-except
+        if not capture:
+            raise
+        result["output"] += traceback.format_exc()
+        result["exitcode"] = 1
+        return result
+
+
+def write_behind(
+    results: Iterable[Dict], writers: int, depth: int, capture: bool = False, fsync: bool = False
+) -> Iterator[Dict]:
+    """
+    Writes the tagged templates of results on a pool of writer threads, and yields
+    every result in input order once its template is written. At most depth
+    templates wait to be written: then the tagging waits for the writers.
+    """
+    with ThreadPoolExecutor(max_workers=writers, thread_name_prefix="cfntagger-write") as executor:
+        inflight = deque()
+        for result in results:
+            future = None
+            if "template" in result:
+                future = executor.submit(write_template, result, fsync)
+            inflight.append((future, result))
+            while inflight and (len(inflight) > depth or inflight[0][0] is None or inflight[0][0].done()):
+                future, result = inflight.popleft()
+                yield result if future is None else written(future, result, capture)
+        while inflight:
+            future, result = inflight.popleft()
+            yield result if future is None else written(future, result, capture)
+
+
+def run(
+    cfnfiles: Iterable[str], options: Optional[RunOptions] = None, context: Optional[RunContext] = None, **overrides
+) -> Iterator[Dict]:
+    """
+    Tags all cfnfiles and yields a result dict per file, in input order.
+    With jobs > 1 the files are fanned out to a pool of worker processes,
+    with one Tagger per file. Options (and overrides) are passed on to the Tagger.
+    cfnfiles may be a stream (any iterator, e.g. paths read from stdin): files
+    are tagged as they arrive, with at most a few per worker in flight.
+    With capture, a sequential run also captures the output and the failures
+    per file, like a parallel run does.
+    All files share one RunContext, so the config and the git metadata are
+    only looked up once per run.
+
+    The reading and the writing of the templates can be taken off the tagging
+    (be it sequential or parallel) and overlapped with it: with readers, a pool
+    of reader threads reads up to read_depth templates ahead, with writers a
+    pool of writer threads writes up to write_depth tagged templates behind.
+    Both queues are bounded, a stage which runs ahead waits for the next one.
+    """
+    options = make_options(options, **overrides)
+    if context is None:
+        context = RunContext()
+
+    if options.writers > 0 and not (options.simulate or options.check):
+        results = run(cfnfiles, replace(options, writers=0, defer_write=True), context)
+        fsync = options.fsync == FSYNC_ALWAYS
+        yield from write_behind(results, options.writers, options.write_depth, capture=options.capture, fsync=fsync)
+        return
+
+    if options.readers > 0:
+        sources = read_ahead(cfnfiles, options.readers, options.read_depth)
+    elif options.jobs > 1 and isinstance(cfnfiles, (list, tuple)):
+        # A list is known upfront: hand it out to the workers in chunks
+        with worker_pool(options, context) as (executor, worker):
+            chunksize = max(1, len(cfnfiles) // (options.jobs * 8))
+            yield from executor.map(worker, cfnfiles, chunksize=chunksize)
+        return
+    else:
+        sources = ((cfnfile, None) for cfnfile in cfnfiles)
+    yield from tag_sources(sources, options, context)
+
+
+@contextmanager
+def worker_pool(options: RunOptions, context: RunContext) -> Iterator[Tuple[ProcessPoolExecutor, Callable]]:
+    """
+    Returns the process pool of a parallel run, and the worker to submit the
+    templates to it: tag_file_captured() with the options and the context
+    """
+    # Resolve in the parent, the workers get a copy of the resolved context
+    context.resolve(setgit=options.setgit)
+    with ProcessPoolExecutor(max_workers=options.jobs) as executor:
+        yield executor, partial(tag_file_captured, context=context, options=options)
+
+
+def tag_sources(
+    sources: Iterable[Tuple[str, Optional[str]]], options: RunOptions, context: RunContext
+) -> Iterator[Dict]:
+    """
+    Tags a stream of (cfnfile, text) pairs, text is None for a template which
+    wasn't read ahead. Parallel runs submit as they go, executor.map() would
+    consume the whole stream first.
+    """
+    if options.jobs <= 1:
+        worker = tag_file_captured if options.capture else tag_file
+        for cfnfile, source in sources:
+            yield worker(cfnfile, context=context, options=options, source=source)
+        return
+
+    with worker_pool(options, context) as (executor, worker):
+        inflight = deque()
+        for cfnfile, source in sources:
+            inflight.append(executor.submit(worker, cfnfile, source=source))
+            while inflight and (len(inflight) >= options.jobs * 4 or inflight[0].done()):
+                yield inflight.popleft().result()
+        while inflight:
+            yield inflight.popleft().result()
+
+
+def exit_code(results: List[Dict]) -> int:
+    """
+    Returns the aggregate exit code of a run: the highest exit code of all files
+    """
+    return max((result["exitcode"] for result in results), default=0)
@@ -0,0 +1,297 @@
+import json
+import os
+import socket
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Dict, Optional
+
+from .api import tag_template, CfnTaggerError
+from .cfntagger import load_config
+from .colors import Fore, Style
+from .version import __version__
+
+MAX_BODY = 10 * 1024 * 1024
+
+
+class Metrics:
+    """
+    Thread safe counters of a server, exposed in the Prometheus text format
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests: Dict[int, int] = {}
+        self.in_flight = 0
+        self.tag_count = 0
+        self.tag_seconds = 0.0
+        self.resources = 0
+
+    def request_done(self, status: int):
+        with self.lock:
+            self.requests[status] = self.requests.get(status, 0) + 1
+
+    def tagged(self, seconds: float, resources: int):
+        with self.lock:
+            self.tag_count += 1
+            self.tag_seconds += seconds
+            self.resources += resources
+
+    def render(self) -> str:
+        with self.lock:
+            lines = [
+                "# TYPE cfntagger_requests_total counter",
+                *[f'cfntagger_requests_total{{status="{status}"}} {n}' for status, n in sorted(self.requests.items())],
+                "# TYPE cfntagger_in_flight gauge",
+                f"cfntagger_in_flight {self.in_flight}",
+                "# TYPE cfntagger_tag_seconds summary",
+                f"cfntagger_tag_seconds_sum {self.tag_seconds:.6f}",
+                f"cfntagger_tag_seconds_count {self.tag_count}",
+                "# TYPE cfntagger_resources_tagged_total counter",
+                f"cfntagger_resources_tagged_total {self.resources}",
+                "# TYPE cfntagger_uptime_seconds gauge",
+                f"cfntagger_uptime_seconds {time.time() - self.started:.0f}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+class TaggingService:
+    """
+    The state shared by all requests: a fixed pool of tagging threads (so their
+    YAML engines stay warm), a limit on the requests being tagged or waiting
+    for a thread, the default tags and the metrics
+    """
+    def __init__(self, max_concurrency: int = 0, max_pending: int = 0, default_tags: Optional[Dict] = None):
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self.slots = threading.BoundedSemaphore(self.max_concurrency + max_pending)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="cfntagger")
+        self.default_tags = default_tags
+        self.metrics = Metrics()
+
+    def tag(self, template: str, tags: Dict, git_tags: Optional[Dict] = None):
+        """
+        Tags a template on one of the tagging threads, returns (result, report)
+        """
+        start = time.perf_counter()
+        result, report = self.executor.submit(tag_template, template, tags, git_tags).result()
+        self.metrics.tagged(time.perf_counter() - start, len(report["resources"]))
+        return result, report
+
+    def warm_up(self):
+        """
+        Tags a template on every tagging thread, so the first requests don't pay
+        for setting up the YAML engines
+        """
+        template = "Resources:\n  Bucket:\n    Type: AWS::S3::Bucket\n"
+        barrier = threading.Barrier(self.max_concurrency)
+
+        def warm():
+            tag_template(template, {"Warm": "up"})
+            barrier.wait(timeout=10)
+
+        for future in [self.executor.submit(warm) for _ in range(self.max_concurrency)]:
+            future.result()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class TaggingRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles:
+        - POST /tag with a JSON body {"template": "<yaml>", "tags": {...}, "git_tags": {...}},
+          responds with {"template": "<tagged yaml>", "report": {...}}. The tags
+          default to the tags the server was started with.
+        - GET /health
+        - GET /metrics, in the Prometheus text format
+    """
+    server_version = f"cfntagger/{__version__}"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self) -> TaggingService:
+        return self.server.service
+
+    def respond(self, status: int, body, content_type: str = "application/json"):
+        payload = (json.dumps(body) if content_type == "application/json" else body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        self.service.metrics.request_done(status)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path == "/health":
+            self.respond(200, {"status": "ok", "version": __version__})
+        elif self.path == "/metrics":
+            self.respond(200, self.service.metrics.render(), content_type="text/plain; version=0.0.4")
+        else:
+            self.respond(404, {"error": f"no such endpoint: {self.path}"})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        if self.path != "/tag":
+            self.respond(404, {"error": f"no such endpoint: {self.path}"})
+            return
+
+        length = self.content_length()
+        if length is None:
+            return
+        if length > MAX_BODY:
+            self.close_connection = True
+            self.respond(413, {"error": f"request body exceeds {MAX_BODY} bytes"})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(length))
+            template = body["template"]
+            tags = body.get("tags", self.service.default_tags)
+            git_tags = body.get("git_tags")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.respond(400, {"error": 'expected a JSON body {"template": "<yaml>", "tags": {...}}'})
+            return
+
+        if not self.service.slots.acquire(blocking=False):
+            self.respond(503, {"error": "too many concurrent requests, retry later"})
+            return
+        with self.service.metrics.lock:
+            self.service.metrics.in_flight += 1
+        try:
+            result, report = self.service.tag(template, tags, git_tags)
+        except CfnTaggerError as e:
+            self.respond(400, {"error": str(e)})
+        except Exception as e:  # pylint: disable=broad-except
+            self.respond(500, {"error": f"{type(e).__name__}: {e}"})
+        else:
+            self.respond(200, {"template": result, "report": report})
+        finally:
+            with self.service.metrics.lock:
+                self.service.metrics.in_flight -= 1
+            self.service.slots.release()
+
+    def content_length(self) -> Optional[int]:
+        """
+        Returns the length of the request body, or responds with an error (and
+        returns None) if the Content-Length header is missing or malformed
+        """
+        header = self.headers.get("Content-Length")
+        if header is None:
+            self.close_connection = True
+            self.respond(411, {"error": "a Content-Length header is required"})
+            return None
+        try:
+            length = int(header)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            self.respond(400, {"error": f"malformed Content-Length: {header}"})
+            return None
+        return length
+
+    def address_string(self) -> str:
+        # Unix socket clients don't have an address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class TaggingServerMixin:  # pylint: disable=too-few-public-methods
+    """
+    Serves TaggingRequestHandlers, which share the tagging service of the server
+    """
+    daemon_threads = True
+
+    def __init__(self, address, service: TaggingService, verbose: bool = False):
+        self.service = service
+        self.verbose = verbose
+        super().__init__(address, TaggingRequestHandler)
+
+
+class TaggingHTTPServer(TaggingServerMixin, ThreadingHTTPServer):
+    """
+    Serves tagging requests over HTTP on a TCP port
+    """
+
+
+class TaggingUnixServer(TaggingServerMixin, ThreadingMixIn, UnixStreamServer):
+    """
+    Serves tagging requests over HTTP on a unix socket, which is removed when
+    the server is closed
+    """
+    def server_close(self):
+        super().server_close()
+        remove_socket(self.server_address)
+
+
+def remove_socket(path: str):
+    """
+    Removes the unix socket at path, if there is one. Anything else is left
+    alone, so a mistyped address can't wipe a file.
+    """
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def make_server(address: str, service: TaggingService, verbose: bool = False):
+    """
+    Returns a server for an address, which is either [HOST:]PORT or unix:PATH
+    """
+    if address.startswith("unix:"):
+        path = address[len("unix:"):]
+        # A socket left behind by a server which didn't shut down cleanly
+        remove_socket(path)
+        return TaggingUnixServer(path, service, verbose=verbose)
+
+    host, _, port = address.rpartition(":")
+    return TaggingHTTPServer((host or "127.0.0.1", int(port)), service, verbose=verbose)
+
+
+def get_default_tags() -> Optional[Dict]:
+    """
+    Returns the configured tags (see load_config), None if there are none
+    """
+    configstr = load_config()
+    if configstr is None:
+        return None
+    try:
+        return json.loads(configstr)
+    except json.decoder.JSONDecodeError as e:
+        print(f"{Fore.RED}FAIL: malformed CFN_TAGS JSON => {e}{Style.RESET_ALL}")
+        sys.exit(1)
+
+
+def serve(address: str, max_concurrency: int = 0, max_pending: int = 0, verbose: bool = False) -> int:
+    """
+    Serves tagging requests until interrupted
+    """
+    service = TaggingService(max_concurrency, max_pending, default_tags=get_default_tags())
+    try:
+        server = make_server(address, service, verbose=verbose)
+    except (OSError, ValueError) as e:
+        print(f"{Fore.RED}FAIL: cannot listen on {address} => {e}{Style.RESET_ALL}")
+        return 1
+
+    service.warm_up()
+    name = server.server_address
+    if server.address_family != socket.AF_UNIX:
+        name = f"http://{name[0]}:{name[1]}"
+    print(f"[INFO] Serving on {name} with {service.max_concurrency} tagging threads", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+    return 0
@@ -0,0 +1,128 @@
+import time
+from typing import Dict, List
+
+# The phases of a run, in the order they happen
+PHASES = ("config", "discover", "load", "merge", "git", "transform", "write", "sync")
+
+
+class _Phase:
+    """
+    Context manager timing one phase of a Timings
+    """
+    def __init__(self, timings: "Timings", name: str):
+        self.timings = timings
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.timings._nested.append(0.0)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        nested = self.timings._nested.pop()
+        self.timings.add_phase(self.name, elapsed - nested)
+        if self.timings._nested:
+            self.timings._nested[-1] += elapsed
+        return False
+
+
+class _NoPhase:
+    """
+    Context manager of a disabled Timings, it doesn't record anything
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+class Timings:
+    """
+    Opt-in per-phase durations (in seconds) and counters, of a template or of
+    a whole run. Phases nest: the time spent in an inner phase is not counted
+    in the outer one, so the phases add up to the total time.
+    A disabled Timings records nothing and costs next to nothing.
+    """
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self._nested: List[float] = []
+
+    def phase(self, name: str):
+        """
+        Returns a context manager which adds the time spent in it to a phase
+        """
+        if not self.enabled:
+            return _NO_PHASE
+        return _Phase(self, name)
+
+    def add_phase(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self) -> Dict:
+        return {"phases": dict(self.phases), "counters": dict(self.counters)}
+
+
+def summarize(run_timings: Timings, results: List[Dict]) -> Dict:
+    """
+    Returns the machine readable timings of a run: the run-level phases and
+    counters, those of every template and their totals
+    """
+    files = [
+        {"filename": result["filename"], **result["timings"]}
+        for result in results if "timings" in result
+    ]
+
+    totals = Timings()
+    for name, seconds in run_timings.phases.items():
+        totals.add_phase(name, seconds)
+    for name, n in run_timings.counters.items():
+        totals.count(name, n)
+    for entry in files:
+        for name, seconds in entry["phases"].items():
+            totals.add_phase(name, seconds)
+        for name, n in entry["counters"].items():
+            totals.count(name, n)
+
+    return {"run": run_timings.as_dict(), "files": files, "totals": totals.as_dict()}
+
+
+def format_summary(summary: Dict) -> str:
+    """
+    Returns the timings of a run as a table: per phase the total time and the
+    mean and maximum per template, followed by the counters
+    """
+    files = summary["files"]
+    names = [name for name in PHASES if name in summary["totals"]["phases"]]
+    names += sorted(set(summary["totals"]["phases"]) - set(PHASES))
+
+    lines = [
+        f"[TIMINGS] {len(files)} templates",
+        f"{'phase':<16} {'total (ms)':>12} {'mean (ms)':>12} {'max (ms)':>12}",
+    ]
+    for name in names:
+        per_file = [entry["phases"][name] for entry in files if name in entry["phases"]]
+        mean = f"{sum(per_file) / len(per_file) * 1000:>12.2f}" if per_file else f"{'-':>12}"
+        maximum = f"{max(per_file) * 1000:>12.2f}" if per_file else f"{'-':>12}"
+        lines.append(f"{name:<16} {summary['totals']['phases'][name] * 1000:>12.2f} {mean} {maximum}")
+
+    total = sum(summary["totals"]["phases"].values())
+    lines.append(f"{'total':<16} {total * 1000:>12.2f}")
+
+    if summary["totals"]["counters"]:
+        lines.append(f"{'counter':<16} {'total':>12}")
+        for name, n in sorted(summary["totals"]["counters"].items()):
+            lines.append(f"{name:<16} {n:>12}")
+
+    return "\n".join(lines)
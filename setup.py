@@ -8,7 +8,7 @@ def get_version():
 setup(
     name="cfntagger",
     version=get_version(),
-    packages=find_packages(),
+    packages=find_packages(exclude=["tests", "tests.*", "benchmarks", "benchmarks.*"]),
     scripts=['cfntagger/cfntagger'],
 
     # metadata for upload to PyPI
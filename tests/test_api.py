@@ -0,0 +1,69 @@
+import io
+import pytest
+
+from cfntagger import tag_template, InvalidTemplateError, InvalidTagsError
+from cfntagger.cfntagger import Tagger, get_yaml
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+def read_template(name: str) -> str:
+    with open(f"./tests/templates/{name}", encoding='utf-8') as f:
+        return f.read()
+
+
+def test_text_matches_cli_output(mock_env_single_custom_tag, capsys):
+    result, report = tag_template(read_template("s3.yml"), {"Creator": "kristof"})
+    assert capsys.readouterr().out == ""
+
+    Tagger(filename="./tests/templates/s3.yml", simulate=True).tag()
+    assert capsys.readouterr().out.endswith(result)
+    assert report["changed"]
+    assert report["resources"]["AnotherBucket"] == {
+        "type": "AWS::S3::Bucket",
+        "foundtags": ["Name", "Environment", "Team"],
+        "addedtags": ["Creator"],
+        "updatedtags": [],
+    }
+
+
+def test_stream_and_bytes():
+    text = read_template("ec2.yml")
+    expected, _ = tag_template(text, {"Team": "Devops"})
+    assert tag_template(io.StringIO(text), {"Team": "Devops"})[0] == expected
+    assert tag_template(text.encode("utf-8"), {"Team": "Devops"})[0] == expected
+
+
+def test_parsed_template_is_tagged_in_place():
+    data = get_yaml().load(read_template("jsontags.yml"))
+    result, report = tag_template(data, {"Creator": "kristof"}, git_tags={"gitfile": "jsontags.yml"})
+    assert result is data
+    for name, entry in report["resources"].items():
+        tags = data["Resources"][name]["Properties"]["Tags"]
+        if isinstance(tags, dict):
+            assert tags["Creator"] == "kristof" and tags["gitfile"] == "jsontags.yml"
+        else:
+            assert {"Key": "gitfile", "Value": "jsontags.yml"} in tags
+        assert entry["addedtags"] == [] or entry["addedtags"] == ["Creator"]
+
+
+def test_unchanged_template():
+    tagged, _ = tag_template(read_template("s3.yml"), {"Creator": "kristof"})
+    result, report = tag_template(tagged, {"Creator": "kristof"})
+    assert result == tagged
+    assert not report["changed"]
+
+
+@pytest.mark.parametrize("template", ["Resources: [\n", "just a string", "Resources:\n  Foo: bar\n", b"\xff\xfe"])
+def test_invalid_template_raises(template):
+    with pytest.raises(InvalidTemplateError):
+        tag_template(template, {"Creator": "kristof"})
+
+
+@pytest.mark.parametrize("tags", [None, ["Creator"], {1: "one"}])
+def test_invalid_tags_raise(tags):
+    with pytest.raises(InvalidTagsError):
+        tag_template(read_template("s3.yml"), tags)
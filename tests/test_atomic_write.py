@@ -0,0 +1,100 @@
+import os
+import shutil
+import stat
+import pytest
+
+from cfntagger.cfntagger import Tagger
+from cfntagger.cli import main
+from cfntagger.fileio import atomic_write
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+@pytest.fixture
+def templatedir(tmp_path):
+    for template in ["ec2.yml", "s3.yml"]:
+        shutil.copy(f"./tests/templates/{template}", tmp_path / template)
+    return tmp_path
+
+
+def test_atomic_write_keeps_permissions(tmp_path):
+    target = tmp_path / "template.yml"
+    target.write_text("old", encoding='utf-8')
+    os.chmod(target, 0o640)
+
+    with atomic_write(str(target), fsync=True) as f:
+        f.write("new")
+
+    assert target.read_text(encoding='utf-8') == "new"
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o640
+    assert os.listdir(tmp_path) == ["template.yml"]
+
+
+def test_atomic_write_new_file_permissions(tmp_path):
+    target = tmp_path / "new.yml"
+    with atomic_write(str(target)) as f:
+        f.write("new")
+
+    umask = os.umask(0o022)
+    os.umask(umask)
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o666 & ~umask
+
+
+def test_failed_write_leaves_file_untouched(tmp_path):
+    target = tmp_path / "template.yml"
+    target.write_text("old", encoding='utf-8')
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(target)) as f:
+            f.write("half a templ")
+            raise RuntimeError("crash")
+
+    assert target.read_text(encoding='utf-8') == "old"
+    assert os.listdir(tmp_path) == ["template.yml"]
+
+
+def test_symlink_target_is_replaced(tmp_path):
+    target = tmp_path / "template.yml"
+    target.write_text("old", encoding='utf-8')
+    link = tmp_path / "link.yml"
+    link.symlink_to(target)
+
+    with atomic_write(str(link)) as f:
+        f.write("new")
+
+    assert link.is_symlink()
+    assert target.read_text(encoding='utf-8') == "new"
+
+
+def test_tagger_crash_mid_dump(mock_env_single_custom_tag, templatedir, monkeypatch):
+    def crashing_dump(self, stream):
+        stream.write("---\nResources:\n")
+        raise MemoryError
+
+    monkeypatch.setattr(Tagger, "dump", crashing_dump)
+    tagger = Tagger(filename=str(templatedir / "s3.yml"), simulate=False)
+    with pytest.raises(MemoryError):
+        tagger.tag()
+
+    with open("./tests/templates/s3.yml", encoding='utf-8') as original:
+        assert (templatedir / "s3.yml").read_text(encoding='utf-8') == original.read()
+    assert not tagger.written
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_fsync_batch(mock_env_single_custom_tag, templatedir, monkeypatch, jobs):
+    synced = []
+    monkeypatch.setattr("cfntagger.cli.sync_files", synced.extend)
+    assert main(["--directory", str(templatedir), "--fsync", "batch", "--jobs", jobs]) == 0
+    assert sorted(synced) == sorted(str(templatedir / name) for name in ["ec2.yml", "s3.yml"])
+
+
+def test_fsync_always(mock_env_single_custom_tag, templatedir, monkeypatch):
+    synced = []
+    monkeypatch.setattr("cfntagger.cli.sync_files", synced.extend)
+    assert main(["--file", str(templatedir / "s3.yml"), "--fsync", "always"]) == 0
+    assert not synced
+    assert "Creator" in (templatedir / "s3.yml").read_text(encoding='utf-8')
@@ -0,0 +1,60 @@
+from cfntagger.cfntagger import transform_cfn_lines
+
+
+def transform(s: str) -> str:
+    return '\n'.join(transform_cfn_lines(s.split('\n')))
+
+
+dumped_template = """\
+Resources:
+
+  MyParameter:
+    Type: AWS::SSM::Parameter
+    Properties:
+      Value: foo
+
+      Tags:
+        Creator: kristof
+
+
+  MyBucket:
+    Type: AWS::S3::Bucket
+    Properties:
+
+      Tags:
+      - Key: Creator
+        Value: kristof
+"""
+
+expected = """\
+Resources:
+
+  MyParameter:
+    Type: AWS::SSM::Parameter
+    Properties:
+      Value: foo
+      Tags:
+        Creator: kristof
+
+
+  MyBucket:
+    Type: AWS::S3::Bucket
+    Properties:
+      Tags:
+      - Key: Creator
+        Value: kristof
+"""
+
+
+def test_transform():
+    assert transform(dumped_template) == expected
+
+
+def test_blank_lines_are_kept_elsewhere():
+    s = "Resources:\n\n  MyBucket:\n    Type: AWS::S3::Bucket\n\n"
+    assert transform(s) == s
+
+
+def test_is_streaming():
+    lines = transform_cfn_lines(iter(dumped_template.split('\n')))
+    assert next(lines) == "Resources:"
@@ -0,0 +1,83 @@
+import shutil
+import pytest
+
+from cfntagger.cfntagger import Tagger
+from cfntagger.cli import main
+from cfntagger.runner import tag_file
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+@pytest.fixture
+def no_dump(monkeypatch):
+    def dump(self, stream):
+        raise AssertionError("a check must not serialize the template")
+    monkeypatch.setattr(Tagger, "dump", dump)
+
+
+@pytest.mark.parametrize("template", ["s3.yml", "ec2.yml", "jsontags.yml", "canary-template.yml", "nocfntags.yml"])
+def test_check_decides_like_tag(mock_env_single_custom_tag, template):
+    tagged = tag_file(f"./tests/templates/{template}", simulate=True)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(Tagger, "dump", lambda self, stream: pytest.fail("dumped"))
+        checked = tag_file(f"./tests/templates/{template}", check=True)
+
+    assert checked["stats"] == tagged["stats"]
+    assert checked["changed"] == tagged["changed"]
+    assert not checked["written"]
+
+
+def test_check_exit_codes(mock_env_single_custom_tag, no_dump, tmp_path, capsys):
+    shutil.copy("./tests/templates/s3.yml", tmp_path / "s3.yml")
+    assert main(["--file", str(tmp_path / "s3.yml"), "--check"]) == 1
+    output = capsys.readouterr().out
+    assert "[tag][MISSING] Creator" in output
+    assert "MyBucket" not in output
+    assert "[CHECK] 1 templates with missing or divergent tags" in output
+
+    with open("./tests/templates/s3.yml", encoding='utf-8') as original:
+        assert (tmp_path / "s3.yml").read_text(encoding='utf-8') == original.read()
+
+
+def test_tagged_template_is_compliant(mock_env_single_custom_tag, tmp_path, capsys):
+    shutil.copy("./tests/templates/jsontags.yml", tmp_path / "jsontags.yml")
+    assert main(["--file", str(tmp_path / "jsontags.yml")]) == 0
+    capsys.readouterr()
+
+    assert main(["--file", str(tmp_path / "jsontags.yml"), "--check"]) == 0
+    assert "is compliant" in capsys.readouterr().out
+
+
+def test_check_reports_format(mock_env_single_custom_tag, tmp_path, capsys):
+    (tmp_path / "ssm.yml").write_text("""\
+Resources:
+  Parameter:
+    Type: AWS::SSM::Parameter
+    Properties:
+      Tags:
+        - Key: Creator
+          Value: kristof
+""", encoding='utf-8')
+    assert main(["--file", str(tmp_path / "ssm.yml"), "--check"]) == 1
+    assert "[tag][ FORMAT]" in capsys.readouterr().out
+
+
+FLOW_TEMPLATE = """\
+Resources:
+  Bucket: {Type: AWS::S3::Bucket, Properties: {BucketName: logs}}
+"""
+
+
+def test_check_template_the_safe_loader_rejects(mock_env_single_custom_tag, tmp_path, capsys):
+    (tmp_path / "flow.yml").write_text(FLOW_TEMPLATE, encoding='utf-8')
+    tagged = tag_file(str(tmp_path / "flow.yml"), simulate=True)
+    checked = tag_file(str(tmp_path / "flow.yml"), check=True)
+
+    assert checked["exitcode"] == 0
+    assert checked["stats"] == tagged["stats"]
+    assert checked["changed"]
+    assert main(["--file", str(tmp_path / "flow.yml"), "--check"]) == 1
+    assert "[tag][MISSING] Creator" in capsys.readouterr().out
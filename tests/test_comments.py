@@ -26,7 +26,7 @@ def test_comments(mock_env_single_custom_tag):
     # restore original stdout
     sys.stdout = sys.__stdout__
 
-    match = re.findall('# Line [1-5]', result)
+    match = re.findall('# Line [1-6]', result)
 
     # Assume we have still some comments
     assert len(match) > 0
@@ -0,0 +1,44 @@
+import pytest
+
+from cfntagger import Tagger, RunContext
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+cfn_templates = ["./tests/templates/ec2.yml", "./tests/templates/s3.yml"]
+
+
+def test_config_is_loaded_once(mock_env_single_custom_tag, monkeypatch):
+    calls = []
+
+    def fake_load_config(repo_root=None):
+        calls.append(repo_root)
+        return '{"Creator": "kristof"}'
+
+    monkeypatch.setattr("cfntagger.cfntagger.load_config", fake_load_config)
+
+    context = RunContext()
+    for cfn_template in cfn_templates:
+        cfn_tagger = Tagger(filename=cfn_template, simulate=True, context=context)
+        assert cfn_tagger.get_obligatory_tags() == {"Creator": "kristof"}
+
+    assert len(calls) == 1
+
+
+def test_invalidate(mock_env_single_custom_tag, monkeypatch):
+    context = RunContext()
+    assert context.obligatory_tags == {"Creator": "kristof"}
+
+    monkeypatch.setenv("CFN_TAGS", '{"Team": "Devops"}')
+    assert context.obligatory_tags == {"Creator": "kristof"}
+
+    context.invalidate()
+    assert context.obligatory_tags == {"Team": "Devops"}
+
+
+def test_git_path():
+    context = RunContext()
+    assert context.get_git_path("./tests/templates/ec2.yml") == "tests/templates/ec2.yml"
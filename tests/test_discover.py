@@ -0,0 +1,141 @@
+import os
+import re
+import pytest
+
+from cfntagger.cli import main, parse_dir
+from cfntagger.discover import IgnoreRules, glob_to_regex, is_template
+
+TEMPLATE = """\
+Resources:
+  Bucket:
+    Type: AWS::S3::Bucket
+"""
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+def make_tree(root, paths):
+    for path in paths:
+        os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+        with open(os.path.join(root, path), "w", encoding='utf-8') as f:
+            f.write(TEMPLATE)
+
+
+def found(root, **kwargs):
+    return sorted(os.path.relpath(path, root).replace(os.sep, "/") for path in parse_dir(str(root), **kwargs))
+
+
+@pytest.mark.parametrize("pattern,path,matches", [
+    ("*.yml", "a.yml", True),
+    ("*.yml", "deep/down/a.yml", True),
+    ("*.yml", "a.yaml", False),
+    ("build/*.yml", "build/a.yml", True),
+    ("build/*.yml", "sub/build/a.yml", False),
+    ("build/*.yml", "build/sub/a.yml", False),
+    ("/a.yml", "a.yml", True),
+    ("/a.yml", "sub/a.yml", False),
+    ("**/build", "x/y/build", True),
+    ("**/build", "build", True),
+    ("a/**/b.yml", "a/b.yml", True),
+    ("a/**/b.yml", "a/x/y/b.yml", True),
+    ("a/**", "a/x/y.yml", True),
+    ("t?.yml", "t1.yml", True),
+    ("t?.yml", "t10.yml", False),
+    ("t[0-4].yml", "t3.yml", True),
+    ("t[!0-4].yml", "t3.yml", False),
+    ("t[!0-4].yml", "t7.yml", True),
+    ("\\#x.yml", "#x.yml", True),
+    ("a+b.yml", "a+b.yml", True),
+])
+def test_glob_to_regex(pattern, path, matches):
+    assert (re.fullmatch(glob_to_regex(pattern), path) is not None) == matches
+
+
+@pytest.mark.parametrize("filename,template", [
+    ("stack.yml", True),
+    ("stack.yaml", True),
+    ("stack.json", True),
+    ("stack.template", True),
+    ("foo.notyml", False),
+    ("notyaml", False),
+    ("stack.jsonl", False),
+    (".cfntagger-manifest.json", False),
+])
+def test_is_template(filename, template):
+    assert is_template(filename) == template
+
+
+def test_ignore_rules():
+    rules = IgnoreRules(["# comment", "", "*.yml", "!keep.yml", "build/", "trailing.yml   "])
+    assert rules.match("a.yml", False) is True
+    assert rules.match("sub/keep.yml", False) is False
+    assert rules.match("a.json", False) is None
+    assert rules.match("build", True) is True
+    assert rules.match("build", False) is None
+    assert rules.match("trailing.yml", False) is True
+    assert not IgnoreRules(["# nothing", ""])
+
+
+def test_prunes_well_known_directories(tmp_path):
+    make_tree(tmp_path, [
+        "stack.yml", "app/stack.yaml", "app/cdk.out/asset.123/x.json", "node_modules/pkg/package.json",
+        ".git/x.yml", ".venv/lib/x.yml", "env/lib/x.yml", "app/__pycache__/x.json",
+    ])
+    (tmp_path / "env" / "pyvenv.cfg").write_text("home = /usr/bin\n")
+
+    assert found(tmp_path) == ["app/stack.yaml", "stack.yml"]
+    assert len(found(tmp_path, ignore=False)) == 8
+
+
+def test_ignore_files(tmp_path):
+    make_tree(tmp_path, [
+        "stack.yml", "build/out.yml", "generated.yml", "app/stack.yml", "app/tmp.yml",
+        "app/keep/tmp.yml", "app/skip/stack.yml", "app/sub/generated.yml",
+    ])
+    (tmp_path / ".gitignore").write_text("build/\ngenerated.yml\n")
+    (tmp_path / "app" / ".gitignore").write_text("tmp.yml\n!keep/tmp.yml\n")
+    (tmp_path / "app" / ".cfntaggerignore").write_text("/skip\n!generated.yml\n")
+
+    assert found(tmp_path) == ["app/keep/tmp.yml", "app/stack.yml", "app/sub/generated.yml", "stack.yml"]
+
+
+def test_ignore_files_above_the_directory(tmp_path):
+    make_tree(tmp_path, ["infra/stack.yml", "infra/build/out.yml", "infra/local.yml"])
+    (tmp_path / ".git" / "info").mkdir(parents=True)
+    (tmp_path / ".git" / "info" / "exclude").write_text("local.yml\n")
+    (tmp_path / ".gitignore").write_text("infra/build/\n")
+
+    assert found(tmp_path / "infra") == ["stack.yml"]
+    assert found(tmp_path / "infra", ignore=False) == ["build/out.yml", "local.yml", "stack.yml"]
+
+
+def test_include_and_exclude(tmp_path):
+    make_tree(tmp_path, ["stacks/a.yml", "stacks/b.json", "stacks/old/c.yml", "tests/d.yml", "e.yml", "f.notyml"])
+
+    assert found(tmp_path, include=["*.yml"]) == ["e.yml", "stacks/a.yml", "stacks/old/c.yml", "tests/d.yml"]
+    assert found(tmp_path, include=["stacks/**"]) == ["stacks/a.yml", "stacks/b.json", "stacks/old/c.yml"]
+    assert found(tmp_path, exclude=["tests", "old/"]) == ["e.yml", "stacks/a.yml", "stacks/b.json"]
+    assert found(tmp_path, include=["stacks/**"], exclude=["*.json"]) == ["stacks/a.yml", "stacks/old/c.yml"]
+
+
+def test_symlinks(tmp_path):
+    make_tree(tmp_path, ["real/stack.yml", "other/stack.yml"])
+    (tmp_path / "linked").symlink_to(tmp_path / "real", target_is_directory=True)
+    (tmp_path / "link.yml").symlink_to(tmp_path / "other" / "stack.yml")
+    (tmp_path / "dangling.yml").symlink_to(tmp_path / "missing.yml")
+    (tmp_path / "real" / "loop").symlink_to(tmp_path, target_is_directory=True)
+
+    assert found(tmp_path) == ["other/stack.yml", "real/stack.yml"]
+    # Every template once, however many links lead to it
+    assert len(found(tmp_path, follow_symlinks=True)) == 2
+
+
+def test_cli_exclude(mock_env_single_custom_tag, tmp_path):
+    make_tree(tmp_path, ["stacks/a.yml", "legacy/b.yml"])
+
+    assert main(["--directory", str(tmp_path), "--exclude", "legacy"]) == 0
+    assert "Creator" in (tmp_path / "stacks" / "a.yml").read_text(encoding='utf-8')
+    assert (tmp_path / "legacy" / "b.yml").read_text(encoding='utf-8') == TEMPLATE
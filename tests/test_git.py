@@ -24,3 +24,18 @@ def test_git_tags(mock_env_single_custom_tag):
         assert repo_git == "https://github.com/kristofwillen/cfntagger.git"
     else:
         assert repo_git == "https://github.com/kristofwillen/cfntagger"
+
+
+def test_git_tags_are_not_duplicated(mock_env_single_custom_tag, tmp_path):
+    cfn_copy = tmp_path / "ec2.yml"
+    with open(cfn_template, encoding='utf-8') as f:
+        cfn_copy.write_text(f.read(), encoding='utf-8')
+
+    cfn_tagger = Tagger(filename=str(cfn_copy), simulate=False, setgit=True)
+    cfn_tagger.tag()
+    assert cfn_tagger.changed
+
+    cfn_tagger = Tagger(filename=str(cfn_copy), simulate=False, setgit=True, skip_unchanged=True)
+    cfn_tagger.tag()
+    assert not cfn_tagger.changed
+    assert cfn_copy.read_text(encoding='utf-8').count("Key: gitrepo") == 2
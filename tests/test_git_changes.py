@@ -0,0 +1,70 @@
+import os
+import shutil
+import git
+import pytest
+
+from cfntagger.cli import main, parse_git_changes
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+@pytest.fixture
+def gitrepo(tmp_path, monkeypatch):
+    repo = git.Repo.init(tmp_path)
+    for template in ["ec2.yml", "s3.yml"]:
+        shutil.copy(f"./tests/templates/{template}", tmp_path / template)
+    (tmp_path / "README.md").write_text("readme\n", encoding='utf-8')
+    repo.index.add(["ec2.yml", "s3.yml", "README.md"])
+    actor = git.Actor("pytest", "pytest@example.com")
+    repo.index.commit("initial", author=actor, committer=actor)
+    monkeypatch.chdir(tmp_path)
+    return repo
+
+
+def test_changed_since(gitrepo):
+    assert not parse_git_changes(ref="HEAD")
+
+    with open("s3.yml", "a", encoding='utf-8') as f:
+        f.write("# edited\n")
+    with open("README.md", "a", encoding='utf-8') as f:
+        f.write("edited\n")
+
+    assert parse_git_changes(ref="HEAD") == ["s3.yml"]
+    assert not parse_git_changes(staged=True)
+
+
+def test_staged(gitrepo):
+    with open("ec2.yml", "a", encoding='utf-8') as f:
+        f.write("# edited\n")
+    with open("s3.yml", "a", encoding='utf-8') as f:
+        f.write("# edited\n")
+    gitrepo.index.add(["ec2.yml"])
+
+    assert parse_git_changes(staged=True) == ["ec2.yml"]
+
+
+def test_relative_to_cwd(gitrepo, monkeypatch):
+    with open("s3.yml", "a", encoding='utf-8') as f:
+        f.write("# edited\n")
+    os.mkdir("sub")
+    monkeypatch.chdir("sub")
+
+    assert parse_git_changes(ref="HEAD") == ["../s3.yml"]
+
+
+def test_only_changed_are_tagged(mock_env_single_custom_tag, gitrepo, capsys):
+    with open("s3.yml", "a", encoding='utf-8') as f:
+        f.write("# edited\n")
+
+    assert main(["--changed-since", "HEAD", "--simulate"]) == 0
+    output = capsys.readouterr().out
+    assert "[s3.yml][Resource]" in output
+    assert "ec2.yml" not in output
+
+
+def test_unknown_ref(gitrepo):
+    with pytest.raises(SystemExit):
+        parse_git_changes(ref="doesnotexist")
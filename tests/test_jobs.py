@@ -0,0 +1,68 @@
+import shutil
+import pytest
+
+from cfntagger import Tagger
+from cfntagger.cli import main, parse_dir
+from cfntagger.options import RunOptions
+from cfntagger.runner import run, exit_code
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+@pytest.fixture
+def templatedir(tmp_path):
+    for template in ["ec2.yml", "s3.yml", "jsontags.yml", "canary-template.yml"]:
+        shutil.copy(f"./tests/templates/{template}", tmp_path / template)
+    return tmp_path
+
+
+def test_parallel_stats_match_sequential(mock_env_single_custom_tag, templatedir):
+    cfnfiles = sorted(parse_dir(str(templatedir)))
+    sequential = list(run(cfnfiles, simulate=True, jobs=1))
+    parallel = list(run(cfnfiles, simulate=True, jobs=2))
+
+    assert [r["filename"] for r in parallel] == cfnfiles
+    assert [r["stats"] for r in parallel] == [r["stats"] for r in sequential]
+    assert exit_code(parallel) == 0
+
+
+def test_run_options(mock_env_single_custom_tag, templatedir):
+    cfnfiles = sorted(parse_dir(str(templatedir)))
+    options = RunOptions(simulate=True, jobs=2)
+    listed = list(run(cfnfiles, options))
+    # A stream goes through the same pool, overrides apply on top of the options
+    streamed = list(run(iter(cfnfiles), options, skip_unchanged=True))
+
+    assert [r["filename"] for r in streamed] == cfnfiles
+    assert [r["stats"] for r in streamed] == [r["stats"] for r in listed]
+
+
+def test_tagger_positional_options(mock_env_single_custom_tag, templatedir):
+    # Tagger(filename, simulate, setgit), as before the run options
+    tagger = Tagger(str(templatedir / "s3.yml"), True, False)
+    assert tagger.simulate and not tagger.git
+
+    tagger = Tagger(str(templatedir / "s3.yml"), False, options=RunOptions(simulate=True, skip_unchanged=True))
+    assert not tagger.simulate and tagger.skip_unchanged
+
+
+def test_parallel_output_is_not_interleaved(mock_env_single_custom_tag, templatedir):
+    cfnfiles = sorted(parse_dir(str(templatedir)))
+    for result in run(cfnfiles, simulate=True, jobs=2):
+        assert f"[{result['filename']}]" in result["output"]
+        for other in cfnfiles:
+            if other != result["filename"]:
+                assert f"[{other}]" not in result["output"]
+
+
+def test_parallel_failure_exit_code(mock_env_single_custom_tag, templatedir):
+    # unparsable, but it does look like a template to the prefilter
+    (templatedir / "broken.yml").write_text("Resources: [\n  Type: AWS::S3::Bucket\n", encoding='utf-8')
+    assert main(["--directory", str(templatedir), "--jobs", "2"]) == 1
+
+    # the other templates were still tagged
+    with open("./tests/templates/s3.yml", encoding='utf-8') as original:
+        assert (templatedir / "s3.yml").read_text(encoding='utf-8') != original.read()
@@ -0,0 +1,88 @@
+import json
+import pytest
+
+from cfntagger.cfntagger import Tagger, get_json_style
+from cfntagger.cli import main, parse_dir
+
+TEMPLATE = {
+    "AWSTemplateFormatVersion": "2010-09-09",
+    "Description": "Bücket",
+    "Resources": {
+        "Queue": {"Type": "AWS::SQS::Queue"},
+        "Bucket": {
+            "Type": "AWS::S3::Bucket",
+            "Properties": {
+                "BucketName": {"Fn::Sub": "bucket-${AWS::AccountId}"},
+                "Tags": [{"Key": "Team", "Value": "Sales"}, {"Key": "Creator", "Value": "erlich"}],
+            },
+        },
+        "Parameter": {"Type": "AWS::SSM::Parameter", "Properties": {"Value": "x"}},
+    },
+}
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+@pytest.mark.parametrize("options", [
+    {"indent": 1},
+    {"indent": 4},
+    {"indent": "\t", "ensure_ascii": False},
+    {"separators": (",", ":")},
+    {},
+])
+def test_style_is_preserved(mock_env_single_custom_tag, tmp_path, options):
+    cfnfile = tmp_path / "stack.json"
+    cfnfile.write_text(json.dumps(TEMPLATE, **options), encoding='utf-8')
+
+    tagger = Tagger(str(cfnfile), simulate=False)
+    tagger.tag()
+
+    expected = json.loads(json.dumps(TEMPLATE))
+    expected["Resources"]["Queue"]["Properties"] = {"Tags": [{"Key": "Creator", "Value": "kristof"}]}
+    expected["Resources"]["Bucket"]["Properties"]["Tags"][1]["Value"] = "kristof"
+    expected["Resources"]["Parameter"]["Properties"]["Tags"] = {"Creator": "kristof"}
+    assert cfnfile.read_text(encoding='utf-8') == json.dumps(expected, **options)
+    assert tagger.stats["Bucket"]["updatedtags"] == ["Creator"]
+
+
+def test_get_json_style():
+    assert get_json_style('{\n  "a": [\n    1\n  ]\n}\n') == {
+        "indent": 2, "separators": (",", ": "), "ensure_ascii": True, "newline": True
+    }
+    assert get_json_style('{"a":1,"b":"é"}')["separators"] == (",", ":")
+    assert not get_json_style('{"a": "é"}')["ensure_ascii"]
+
+
+def test_template_extension(mock_env_single_custom_tag, tmp_path, capsys):
+    (tmp_path / "json.template").write_text(json.dumps(TEMPLATE), encoding='utf-8')
+    (tmp_path / "yaml.template").write_text("Resources:\n  Queue:\n    Type: AWS::SQS::Queue\n", encoding='utf-8')
+    (tmp_path / "package.json").write_text('{"name": "app"}', encoding='utf-8')
+
+    assert sorted(parse_dir(str(tmp_path))) == sorted(
+        str(tmp_path / name) for name in ("json.template", "yaml.template", "package.json")
+    )
+    assert main(["--directory", str(tmp_path)]) == 0
+    assert "Skipping 1 files without taggable CloudFormation resources" in capsys.readouterr().out
+
+    tagged = json.loads((tmp_path / "json.template").read_text(encoding='utf-8'))
+    assert tagged["Resources"]["Queue"]["Properties"]["Tags"] == [{"Key": "Creator", "Value": "kristof"}]
+    assert "- Key: Creator" in (tmp_path / "yaml.template").read_text(encoding='utf-8')
+
+
+def test_check_json(mock_env_single_custom_tag, tmp_path, capsys):
+    cfnfile = tmp_path / "stack.json"
+    cfnfile.write_text(json.dumps(TEMPLATE, indent=2), encoding='utf-8')
+    assert main(["--file", str(cfnfile), "--check"]) == 1
+    assert "[tag][MISSING] Creator" in capsys.readouterr().out
+    assert cfnfile.read_text(encoding='utf-8') == json.dumps(TEMPLATE, indent=2)
+
+
+def test_invalid_json(mock_env_single_custom_tag, tmp_path, capsys):
+    cfnfile = tmp_path / "stack.json"
+    cfnfile.write_text('{"Resources": {', encoding='utf-8')
+    with pytest.raises(SystemExit):
+        Tagger(str(cfnfile))
+    assert "valid JSON" in capsys.readouterr().out
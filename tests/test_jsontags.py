@@ -35,3 +35,18 @@ def test_json_tags(mock_env_single_custom_tag):
     assert len(cfn_tagger.get_added_tags("ResourceWithJsonTags")) == 0
     assert len(cfn_tagger.get_updated_tags("ResourceWithJsonTags")) == 1
     assert cfn_tagger.get_updated_tags("ResourceWithJsonTags") == ['Environment']
+
+
+def test_json_tags_are_maps(mock_env_single_custom_tag):
+    cfn_tagger = Tagger(filename=cfn_template, simulate=True)
+    cfn_tagger.tag()
+
+    for item in ["ResourceWithJsonTags", "ResourceWithoutJsonTags"]:
+        tags = cfn_tagger.resources[item]["Properties"]["Tags"]
+        assert isinstance(tags, dict)
+        assert tags["Environment"] == "Development"
+
+    for item in ["ResourceWithTags", "ResourceWithoutTags"]:
+        tags = cfn_tagger.resources[item]["Properties"]["Tags"]
+        assert isinstance(tags, list)
+        assert {"Key": "Environment", "Value": "Development"} in tags
@@ -0,0 +1,69 @@
+import io
+import json
+import os
+import random
+import tracemalloc
+import pytest
+
+import cfntagger.cfntagger
+from benchmarks.synthetic import BENCHMARK_TAGS, generate_template
+from cfntagger.cfntagger import Tagger, TransformStream, get_yaml, transform_cfn
+
+
+@pytest.fixture
+def mock_env_benchmark_tags(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", json.dumps(BENCHMARK_TAGS))
+
+
+def test_transform_stream_is_transform_cfn(monkeypatch):
+    rng = random.Random(0)
+    for _ in range(500):
+        text = "".join(rng.choice(["a", "\n", "\n", "Tags:", "  Tags: []", " ", "b\n"]) for _ in range(rng.randint(0, 40)))
+        monkeypatch.setattr(cfntagger.cfntagger, "TRANSFORM_CHUNK", rng.randint(1, 8))
+        stream = io.StringIO()
+        transformed = TransformStream(stream)
+        position = 0
+        while position < len(text):
+            size = rng.randint(1, 5)
+            transformed.write(text[position:position + size])
+            position += size
+        transformed.close()
+        assert stream.getvalue() == transform_cfn(text)
+
+
+def test_transform_stream_memory_is_bounded():
+    resource = "  Bucket:\n    Type: AWS::S3::Bucket\n\n    Properties:\n\n      Tags:\n      - Key: a\n        Value: b\n"
+    with open(os.devnull, "w", encoding='utf-8') as devnull:
+        transformed = TransformStream(devnull)
+        tracemalloc.start()
+        for _ in range(100000):
+            transformed.write(resource)
+        transformed.close()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    # 8 MB of yaml went through, never more than a few chunks were held
+    assert peak < 8 * cfntagger.cfntagger.TRANSFORM_CHUNK
+
+
+@pytest.mark.parametrize("fmt, patch, ceiling", [
+    ("yaml", False, 100),
+    ("yaml", True, 50),
+    ("json", False, 15),
+])
+def test_peak_memory_is_a_multiple_of_the_template_size(mock_env_benchmark_tags, tmp_path, fmt, patch, ceiling):
+    template = generate_template(resources=100, seed=1)
+    if fmt == "json":
+        template = json.dumps(get_yaml("safe").load(template), indent=2, default=str)
+    cfnfile = tmp_path / f"template.{fmt}"
+    cfnfile.write_text(template, encoding='utf-8')
+
+    tracemalloc.start()
+    tagger = Tagger(str(cfnfile), simulate=False, quiet=True, patch=patch, low_memory=True)
+    tagger.tag()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert tagger.written
+    assert tagger.data is None and tagger.resources is None
+    assert peak < ceiling * len(template)
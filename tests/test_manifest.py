@@ -0,0 +1,70 @@
+import shutil
+import pytest
+
+from cfntagger.cli import main, parse_dir
+from cfntagger.manifest import Manifest, MANIFEST_FILE, config_hash
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+@pytest.fixture
+def templatedir(tmp_path):
+    for template in ["ec2.yml", "s3.yml"]:
+        shutil.copy(f"./tests/templates/{template}", tmp_path / template)
+    return tmp_path
+
+
+def test_second_run_skips_everything(mock_env_single_custom_tag, templatedir, capsys):
+    assert main(["--directory", str(templatedir), "--manifest"]) == 0
+    assert (templatedir / MANIFEST_FILE).exists()
+    assert "Skipping 0 templates" in capsys.readouterr().out
+
+    assert main(["--directory", str(templatedir), "--manifest"]) == 0
+    output = capsys.readouterr().out
+    assert "Skipping 2 templates" in output
+    assert "[Resource]" not in output
+
+
+def test_manifest_is_no_template(mock_env_single_custom_tag, templatedir, capsys):
+    assert main(["--directory", str(templatedir), "--manifest"]) == 0
+    assert sorted(parse_dir(str(templatedir))) == sorted(str(templatedir / name) for name in ["ec2.yml", "s3.yml"])
+
+    assert main(["--directory", str(templatedir), "--no-prefilter"]) == 0
+    assert MANIFEST_FILE not in capsys.readouterr().out
+
+
+def test_edited_file_is_tagged_again(mock_env_single_custom_tag, templatedir, capsys):
+    main(["--directory", str(templatedir), "--manifest"])
+    with open(templatedir / "s3.yml", "a", encoding='utf-8') as f:
+        f.write("# edited\n")
+    capsys.readouterr()
+
+    main(["--directory", str(templatedir), "--manifest"])
+    output = capsys.readouterr().out
+    assert "Skipping 1 templates" in output
+    assert "s3.yml][Resource]" in output
+    assert "ec2.yml][Resource]" not in output
+
+
+def test_config_change_invalidates(mock_env_single_custom_tag, templatedir, monkeypatch, capsys):
+    main(["--directory", str(templatedir), "--manifest"])
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof", "Team": "Devops"}')
+    capsys.readouterr()
+
+    main(["--directory", str(templatedir), "--manifest"])
+    assert "Skipping 0 templates" in capsys.readouterr().out
+
+
+def test_same_contents_new_mtime(templatedir):
+    manifest = Manifest(str(templatedir / MANIFEST_FILE), config_hash({"Creator": "kristof"}))
+    cfn_template = templatedir / "ec2.yml"
+    manifest.update(str(cfn_template))
+    manifest.save()
+
+    cfn_template.write_text(cfn_template.read_text(encoding='utf-8'), encoding='utf-8')
+    manifest = Manifest(str(templatedir / MANIFEST_FILE), config_hash({"Creator": "kristof"}))
+    assert manifest.is_fresh(str(cfn_template))
+    assert not Manifest(str(templatedir / MANIFEST_FILE), config_hash({})).is_fresh(str(cfn_template))
@@ -0,0 +1,73 @@
+import io
+from ruamel.yaml import YAML
+
+from cfntagger.cfntagger import merge_tags
+
+
+def load(s: str):
+    yaml = YAML()
+    yaml.preserve_quotes = True
+    return yaml.load(s)
+
+
+def dump(data) -> str:
+    yaml = YAML()
+    stream = io.StringIO()
+    yaml.dump(data, stream)
+    return stream.getvalue()
+
+
+list_template = """\
+Tags:
+  - Key: Creator
+    Value: "erlich"
+  - Key: Team
+    Value: Devops  # the team
+# trailing comment
+"""
+
+
+def test_merge_reports_sets():
+    tags = load(list_template)["Tags"]
+    merged, found, added, updated = merge_tags(tags, {"Creator": "kristof", "Team": "Devops", "Env": "Dev"})
+
+    assert list(found) == ["Creator", "Team"]
+    assert added == {"Env"}
+    assert updated == {"Creator"}
+    assert [tag["Key"] for tag in merged] == ["Creator", "Team", "Env"]
+
+
+def test_merge_in_place():
+    tags = load(list_template)["Tags"]
+    nodes = list(tags)
+    merged, _, _, _ = merge_tags(tags, {"Creator": "kristof", "Team": "Devops"})
+
+    assert merged is tags
+    assert merged[0] is nodes[0]
+    assert merged[1] is nodes[1]
+
+
+def test_merge_keeps_quotes_and_comments():
+    data = load(list_template)
+    merge_tags(data["Tags"], {"Creator": "kristof", "Env": "Dev"})
+
+    result = dump(data)
+    assert 'Value: "kristof"' in result
+    assert "# the team" in result
+    # the trailing comment stays below the added tag
+    assert result.index("Value: Dev") < result.index("# trailing comment")
+
+
+def test_merge_converts_format():
+    tags = load(list_template)["Tags"]
+    merged, found, added, updated = merge_tags(tags, {"Creator": "kristof"}, json_tags=True)
+
+    assert dict(merged) == {"Creator": "kristof", "Team": "Devops"}
+    assert list(found) == ["Creator", "Team"]
+    assert (added, updated) == (set(), {"Creator"})
+
+
+def test_merge_without_tags():
+    merged, found, added, updated = merge_tags(None, {"Creator": "kristof"})
+    assert merged == [{"Key": "Creator", "Value": "kristof"}]
+    assert (found, added, updated) == ({}, {"Creator"}, set())
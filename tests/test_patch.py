@@ -0,0 +1,141 @@
+import shutil
+import pytest
+
+from cfntagger.cfntagger import Tagger, get_yaml
+from cfntagger.patch import format_scalar
+
+
+@pytest.fixture
+def mock_env_custom_tags(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof", "Team": "Ops"}')
+
+
+def tag(path, **options):
+    tagger = Tagger(str(path), simulate=False, **options)
+    tagger.tag()
+    return path.read_text(encoding='utf-8')
+
+
+@pytest.mark.parametrize("template", [
+    "s3.yml", "ec2.yml", "jsontags.yml", "canary-template.yml", "comments.yml", "noproperties.yml", "nocfntags.yml"
+])
+def test_patch_tags_like_a_dump(mock_env_custom_tags, tmp_path, template):
+    shutil.copy(f"./tests/templates/{template}", tmp_path / "dumped.yml")
+    shutil.copy(f"./tests/templates/{template}", tmp_path / "patched.yml")
+    dumped = tag(tmp_path / "dumped.yml")
+    patched = tag(tmp_path / "patched.yml", patch=True)
+
+    assert get_yaml("safe").load(patched) == get_yaml("safe").load(dumped)
+
+
+def test_patch_only_touches_tags(mock_env_custom_tags, tmp_path):
+    shutil.copy("./tests/templates/comments.yml", tmp_path / "comments.yml")
+    with open("./tests/templates/comments.yml", encoding='utf-8') as f:
+        original = f.read().splitlines()
+    patched = tag(tmp_path / "comments.yml", patch=True).splitlines()
+
+    # Only lines were inserted, the original ones are still there in the same order
+    remaining = iter(patched)
+    assert all(line in remaining for line in original)
+    assert len(patched) - len(original) == 7
+
+
+def test_patch_keeps_quotes(mock_env_custom_tags, tmp_path):
+    cfnfile = tmp_path / "quotes.yml"
+    cfnfile.write_text("""\
+Resources:
+  Bucket:
+    Type: AWS::S3::Bucket
+    Properties:
+      Tags:
+          - Key: Team
+            Value: "Sales"   # the team
+          - Key: 'Creator'
+            Value: 'erlich'
+""", encoding='utf-8')
+    assert tag(cfnfile, patch=True) == """\
+Resources:
+  Bucket:
+    Type: AWS::S3::Bucket
+    Properties:
+      Tags:
+          - Key: Team
+            Value: "Ops"   # the team
+          - Key: 'Creator'
+            Value: 'kristof'
+"""
+
+
+def test_patch_new_tags_indented_like_the_template(mock_env_custom_tags, tmp_path):
+    cfnfile = tmp_path / "indent.yml"
+    cfnfile.write_text("""\
+Resources:
+    Bucket:
+        Type: AWS::S3::Bucket
+        Properties:
+            Tags:
+                -   Key: Team
+                    Value: Ops
+    Queue:
+        Type: AWS::SQS::Queue""", encoding='utf-8')
+    assert tag(cfnfile, patch=True) == """\
+Resources:
+    Bucket:
+        Type: AWS::S3::Bucket
+        Properties:
+            Tags:
+                -   Key: Team
+                    Value: Ops
+                -   Key: Creator
+                    Value: kristof
+    Queue:
+        Type: AWS::SQS::Queue
+        Properties:
+            Tags:
+                - Key: Creator
+                  Value: kristof
+                - Key: Team
+                  Value: Ops"""
+
+
+@pytest.mark.parametrize("tags", [
+    "Tags: []",
+    "Tags: [{Key: Team, Value: Ops}]",
+    "Tags:\n        Team: Ops",
+    "Tags:\n      - Key: Team\n        Value: |\n          Ops\n",
+])
+def test_patch_falls_back_to_a_dump(mock_env_custom_tags, tmp_path, capsys, tags):
+    template = f"Resources:\n  Bucket:\n    Type: AWS::S3::Bucket\n    Properties:\n      {tags}\n"
+    (tmp_path / "dumped.yml").write_text(template, encoding='utf-8')
+    (tmp_path / "patched.yml").write_text(template, encoding='utf-8')
+    dumped = tag(tmp_path / "dumped.yml")
+    capsys.readouterr()
+    patched = tag(tmp_path / "patched.yml", patch=True)
+
+    assert "rewriting it in full" in capsys.readouterr().out
+    assert patched == dumped
+
+
+@pytest.mark.parametrize("template", [
+    "Resources:\n  Bucket: {Type: AWS::S3::Bucket}\n",
+    "Resources:\n  Bucket:\n    Type: AWS::S3::Bucket\n    Properties:\n      Policy: {Resource: arn:aws:s3:::logs}\n",
+])
+def test_patch_falls_back_when_the_safe_loader_fails(mock_env_custom_tags, tmp_path, capsys, template):
+    (tmp_path / "dumped.yml").write_text(template, encoding='utf-8')
+    (tmp_path / "patched.yml").write_text(template, encoding='utf-8')
+    dumped = tag(tmp_path / "dumped.yml")
+    capsys.readouterr()
+    patched = tag(tmp_path / "patched.yml", patch=True)
+
+    assert "the safe loader can't read it" in capsys.readouterr().out
+    assert patched == dumped
+
+
+def test_format_scalar():
+    assert format_scalar("kristof") == "kristof"
+    assert format_scalar("kristof", "'") == "'kristof'"
+    assert format_scalar("it's", "'") == "'it''s'"
+    assert format_scalar('say "hi"', '"') == '"say \\"hi\\""'
+    for value in ["yes", "on", "12", "1.5", "null", "a: b", "#x", "- x", "*x", "", " x", "2023-01-01"]:
+        assert format_scalar(value).startswith("'"), value
+        assert get_yaml("safe").load(f"v: {format_scalar(value)}") == {"v": value}
@@ -0,0 +1,95 @@
+import shutil
+import threading
+import time
+import pytest
+
+import cfntagger.runner
+from cfntagger.cli import main, parse_dir
+from cfntagger.runner import run
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+@pytest.fixture
+def templatedirs(tmp_path):
+    for name in ["plain", "pipelined", "parallel"]:
+        for template in ["ec2.yml", "s3.yml", "jsontags.yml", "canary-template.yml", "comments.yml"]:
+            (tmp_path / name).mkdir(exist_ok=True)
+            shutil.copy(f"./tests/templates/{template}", tmp_path / name / template)
+    return tmp_path
+
+
+def test_pipeline_writes_like_a_plain_run(mock_env_single_custom_tag, templatedirs):
+    assert main(["--directory", str(templatedirs / "plain")]) == 0
+    assert main(["--directory", str(templatedirs / "pipelined"), "--readers", "2", "--writers", "2"]) == 0
+    assert main([
+        "--directory", str(templatedirs / "parallel"), "--jobs", "2",
+        "--readers", "1", "--writers", "3", "--read-ahead", "1", "--write-behind", "1",
+    ]) == 0
+
+    for template in (templatedirs / "plain").iterdir():
+        expected = template.read_text(encoding='utf-8')
+        assert (templatedirs / "pipelined" / template.name).read_text(encoding='utf-8') == expected
+        assert (templatedirs / "parallel" / template.name).read_text(encoding='utf-8') == expected
+
+
+def test_results_are_yielded_once_written(mock_env_single_custom_tag, templatedirs):
+    cfnfiles = sorted(parse_dir(str(templatedirs / "pipelined")))
+    results = list(run(cfnfiles, simulate=False, readers=2, writers=2))
+
+    assert [result["filename"] for result in results] == cfnfiles
+    assert all(result["written"] and "template" not in result for result in results)
+
+
+def test_read_ahead_is_bounded(mock_env_single_custom_tag, templatedirs, monkeypatch):
+    reads = []
+    read_template = cfntagger.runner.read_template
+    monkeypatch.setattr(cfntagger.runner, "read_template", lambda cfnfile: reads.append(cfnfile) or read_template(cfnfile))
+
+    cfnfiles = sorted(parse_dir(str(templatedirs / "plain"))) * 4
+    for tagged, _ in enumerate(run(iter(cfnfiles), simulate=True, readers=2, read_depth=3), start=1):
+        time.sleep(0.01)
+        assert len(reads) <= tagged + 3
+    assert len(reads) == len(cfnfiles)
+
+
+def test_write_behind_is_bounded(mock_env_single_custom_tag, templatedirs, monkeypatch):
+    counts = {"tagged": 0, "written": 0, "behind": 0}
+    lock = threading.Lock()
+    tag_file, write_template = cfntagger.runner.tag_file, cfntagger.runner.write_template
+
+    def counting_tag_file(*args, **kwargs):
+        result = tag_file(*args, **kwargs)
+        with lock:
+            counts["tagged"] += 1
+            counts["behind"] = max(counts["behind"], counts["tagged"] - counts["written"])
+        return result
+
+    def slow_write_template(*args, **kwargs):
+        time.sleep(0.02)
+        result = write_template(*args, **kwargs)
+        with lock:
+            counts["written"] += 1
+        return result
+
+    monkeypatch.setattr(cfntagger.runner, "tag_file", counting_tag_file)
+    monkeypatch.setattr(cfntagger.runner, "write_template", slow_write_template)
+    cfnfiles = sorted(parse_dir(str(templatedirs / "pipelined"))) * 3
+    assert len(list(run(cfnfiles, simulate=False, writers=1, write_depth=2))) == len(cfnfiles)
+    assert counts["written"] == len(cfnfiles)
+    assert counts["behind"] <= 3
+
+
+def test_failing_write(mock_env_single_custom_tag, templatedirs, monkeypatch):
+    def failing_write_template(result, fsync=False):
+        raise OSError("disk full")
+    monkeypatch.setattr(cfntagger.runner, "write_template", failing_write_template)
+    cfnfiles = sorted(parse_dir(str(templatedirs / "pipelined")))
+
+    results = list(run(cfnfiles, simulate=False, writers=2, capture=True))
+    assert all(result["exitcode"] == 1 and "disk full" in result["output"] for result in results)
+    with pytest.raises(OSError):
+        list(run(cfnfiles, simulate=False, writers=2))
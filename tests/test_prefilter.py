@@ -0,0 +1,81 @@
+import shutil
+import pytest
+
+from cfntagger.cfntagger import Tagger
+from cfntagger.cli import main
+from cfntagger.prefilter import looks_like_template, has_taggable_resources
+import cfntagger.prefilter
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+WORKFLOW = """\
+name: ci
+on: [push]
+jobs:
+  test:
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v4
+"""
+
+NO_TAGGABLE = """\
+Resources:
+  Route:
+    Type: AWS::EC2::Route
+    Properties:
+      RouteTableId: !Ref RouteTable
+"""
+
+
+@pytest.mark.parametrize("template", ["s3.yml", "ec2.yml", "jsontags.yml", "canary-template.yml", "noproperties.yml"])
+def test_templates_pass(template):
+    assert looks_like_template(f"./tests/templates/{template}")
+
+
+@pytest.mark.parametrize("contents", [WORKFLOW, NO_TAGGABLE, "", "Resources:\n"])
+def test_others_are_rejected(tmp_path, contents):
+    (tmp_path / "file.yml").write_text(contents, encoding='utf-8')
+    assert not looks_like_template(str(tmp_path / "file.yml"))
+
+
+def test_json_and_flow_style():
+    assert has_taggable_resources(b'{"Resources": {"B": {"Type": "AWS::S3::Bucket"}}}')
+    assert has_taggable_resources(b"Resources: {B: {Type: 'AWS::S3::Bucket'}}")
+
+
+def test_big_files_are_mapped(tmp_path, monkeypatch):
+    monkeypatch.setattr(cfntagger.prefilter, "MMAP_THRESHOLD", 16)
+    shutil.copy("./tests/templates/s3.yml", tmp_path / "s3.yml")
+    (tmp_path / "workflow.yml").write_text(WORKFLOW, encoding='utf-8')
+    assert looks_like_template(str(tmp_path / "s3.yml"))
+    assert not looks_like_template(str(tmp_path / "workflow.yml"))
+
+
+def test_directory_run_skips_other_files(mock_env_single_custom_tag, tmp_path, capsys):
+    shutil.copy("./tests/templates/s3.yml", tmp_path / "s3.yml")
+    (tmp_path / "workflow.yml").write_text(WORKFLOW, encoding='utf-8')
+    (tmp_path / "routes.yml").write_text(NO_TAGGABLE, encoding='utf-8')
+
+    assert main(["--directory", str(tmp_path)]) == 0
+    assert "[INFO] Skipping 2 files without taggable CloudFormation resources" in capsys.readouterr().out
+    assert (tmp_path / "workflow.yml").read_text(encoding='utf-8') == WORKFLOW
+    assert (tmp_path / "routes.yml").read_text(encoding='utf-8') == NO_TAGGABLE
+
+
+def test_no_prefilter(mock_env_single_custom_tag, tmp_path, capsys):
+    (tmp_path / "workflow.yml").write_text(WORKFLOW, encoding='utf-8')
+    assert main(["--directory", str(tmp_path), "--no-prefilter"]) == 0
+    assert "has no CloudFormation Resources, skipping" in capsys.readouterr().out
+    assert (tmp_path / "workflow.yml").read_text(encoding='utf-8') == WORKFLOW
+
+
+@pytest.mark.parametrize("contents", ["", WORKFLOW, "Resources:\n", "- a list\n"])
+def test_tagger_without_resources(mock_env_single_custom_tag, tmp_path, contents):
+    (tmp_path / "file.yml").write_text(contents, encoding='utf-8')
+    tagger = Tagger(filename=str(tmp_path / "file.yml"), simulate=False)
+    assert tagger.tag() is None
+    assert not tagger.written
@@ -0,0 +1,84 @@
+import io
+import json
+import shutil
+import xml.etree.ElementTree as ET
+import pytest
+
+from cfntagger.cli import main
+from cfntagger.report import Report
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+@pytest.fixture
+def templates(tmp_path):
+    shutil.copy("./tests/templates/s3.yml", tmp_path / "s3.yml")
+    shutil.copy("./tests/templates/jsontags.yml", tmp_path / "jsontags.yml")
+    (tmp_path / "broken.yml").write_text("Resources:\n  Bucket:\n    Type: AWS::S3::Bucket\n  - broken\n", encoding='utf-8')
+    (tmp_path / "readme.yml").write_text("just: some yaml\n", encoding='utf-8')
+    return tmp_path
+
+
+def test_json_report(mock_env_single_custom_tag, templates, capsys):
+    assert main(["--directory", str(templates), "--report", "json"]) == 1
+    captured = capsys.readouterr()
+    report = json.loads(captured.out)
+
+    files = {entry["filename"].split("/")[-1]: entry for entry in report["files"]}
+    assert files["s3.yml"]["status"] == "changed"
+    assert files["s3.yml"]["written"]
+    assert files["s3.yml"]["resources"]["AnotherBucket"]["addedtags"] == ["Creator"]
+    assert files["broken.yml"]["status"] == "error"
+    assert "broken.yml" in files["broken.yml"]["error"]
+    assert files["readme.yml"]["status"] == "skipped"
+    assert report["summary"] == {"files": 4, "exitcode": 1, "changed": 2, "error": 1, "skipped": 1}
+    # The console output is left out, the other messages go to stderr
+    assert "[tag]" not in captured.out + captured.err
+    assert "[INFO]" in captured.err
+
+
+def test_jsonl_report_check(mock_env_single_custom_tag, templates, capsys):
+    (templates / "broken.yml").unlink()
+    assert main(["--directory", str(templates), "--check", "--report", "jsonl"]) == 1
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert [line["type"] for line in lines] == ["file", "file", "file", "summary"]
+    statuses = {line["filename"].split("/")[-1]: line["status"] for line in lines[:-1]}
+    assert statuses == {"s3.yml": "noncompliant", "jsontags.yml": "noncompliant", "readme.yml": "skipped"}
+    assert lines[-1]["noncompliant"] == 2
+    with open("./tests/templates/s3.yml", encoding='utf-8') as original:
+        assert (templates / "s3.yml").read_text(encoding='utf-8') == original.read()
+
+
+def test_junit_report_file(mock_env_single_custom_tag, templates, capsys):
+    report = templates / "report.xml"
+    assert main(["--directory", str(templates), "--check", "--jobs", "2",
+                 "--report", "junit", "--report-file", str(report)]) == 1
+    assert "[tag]" not in capsys.readouterr().out
+
+    suite = ET.parse(report).getroot().find("testsuite")
+    cases = {case.get("name").split("/")[-1]: case for case in suite.findall("testcase")}
+    assert set(cases) == {"s3.yml", "jsontags.yml", "broken.yml", "readme.yml"}
+    assert "AnotherBucket (AWS::S3::Bucket): added Creator" in cases["s3.yml"].find("failure").text
+    assert cases["broken.yml"].find("error") is not None
+    assert cases["readme.yml"].find("skipped") is not None
+
+
+def test_report_simulate_needs_report_file(mock_env_single_custom_tag, templates):
+    with pytest.raises(SystemExit):
+        main(["--file", str(templates / "s3.yml"), "--simulate", "--report", "json"])
+
+
+def test_incomplete_report_fails_when_created():
+    class EntriesOnly(Report):  # pylint: disable=abstract-method
+        """
+        A report format without a summary
+        """
+        def write_entry(self, entry):
+            self.stream.write(json.dumps(entry))
+
+    with pytest.raises(TypeError):
+        EntriesOnly(io.StringIO())  # pylint: disable=abstract-class-instantiated
@@ -0,0 +1,37 @@
+import pytest
+
+from cfntagger import Tagger, RESOURCE_TYPES, TAGFORMAT_LIST, TAGFORMAT_JSON
+from cfntagger import get_tag_format, supports_tags, uses_json_tags
+
+
+def test_tag_format():
+    assert get_tag_format("AWS::S3::Bucket") == TAGFORMAT_LIST
+    assert get_tag_format("AWS::SSM::Parameter") == TAGFORMAT_JSON
+    assert get_tag_format("AWS::Serverless::Function") == TAGFORMAT_JSON
+    assert get_tag_format("AWS::CloudFormation::WaitConditionHandle") is None
+
+
+def test_lookups():
+    assert supports_tags("AWS::EC2::Instance")
+    assert not supports_tags("AWS::EC2::Route")
+    assert uses_json_tags("AWS::SSM::Parameter")
+    assert not uses_json_tags("AWS::EC2::Instance")
+
+
+def test_unhashable_type():
+    # Type: !Ref or a mapping must not blow up the lookup
+    assert not supports_tags({"Ref": "SomeType"})
+    assert not supports_tags(None)
+
+
+def test_registry_is_readonly():
+    with pytest.raises(TypeError):
+        RESOURCE_TYPES["AWS::Foo::Bar"] = TAGFORMAT_LIST
+
+
+def test_registry_is_shared(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+    tagger1 = Tagger(filename="./tests/templates/ec2.yml", simulate=True)
+    tagger2 = Tagger(filename="./tests/templates/s3.yml", simulate=True)
+    assert tagger1.resourcetypes_to_tag is tagger2.resourcetypes_to_tag
+    assert tagger1.resourcetypes_json <= tagger1.resourcetypes_to_tag
@@ -0,0 +1,138 @@
+import http.client
+import json
+import os
+import socket
+import threading
+import pytest
+
+from cfntagger.server import TaggingService, make_server
+
+
+@pytest.fixture
+def service():
+    service = TaggingService(max_concurrency=2, max_pending=0, default_tags={"Creator": "kristof"})
+    yield service
+    service.shutdown()
+
+
+@pytest.fixture
+def server(service):
+    server = make_server("127.0.0.1:0", service)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, method: str, path: str, body=None):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+    payload = json.dumps(body) if isinstance(body, dict) else body
+    connection.request(method, path, body=payload)
+    response = connection.getresponse()
+    data = response.read().decode("utf-8")
+    connection.close()
+    if response.getheader("Content-Type") == "application/json":
+        data = json.loads(data)
+    return response.status, data
+
+
+def read_template(name: str) -> str:
+    with open(f"./tests/templates/{name}", encoding='utf-8') as f:
+        return f.read()
+
+
+def test_health(server):
+    status, body = request(server, "GET", "/health")
+    assert status == 200
+    assert body["status"] == "ok"
+
+
+def test_tag_with_default_tags(server):
+    status, body = request(server, "POST", "/tag", {"template": read_template("s3.yml")})
+    assert status == 200
+    assert body["report"]["resources"]["AnotherBucket"]["addedtags"] == ["Creator"]
+    assert "Value: kristof" in body["template"]
+
+
+def test_tag_with_request_tags(server):
+    status, body = request(server, "POST", "/tag", {"template": read_template("s3.yml"), "tags": {"Team": "Devops"}})
+    assert status == 200
+    assert body["report"]["resources"]["MyBucket"]["updatedtags"] == ["Team"]
+
+
+@pytest.mark.parametrize("body", ["not json", {"tags": {}}, {"template": "Resources: [\n"}])
+def test_bad_requests(server, body):
+    status, response = request(server, "POST", "/tag", body)
+    assert status == 400
+    assert "error" in response
+
+
+def raw_request(server, data: bytes) -> bytes:
+    with socket.create_connection(server.server_address, timeout=10) as client:
+        client.sendall(data)
+        with client.makefile("rb") as f:
+            return f.read()
+
+
+@pytest.mark.parametrize("length,status", [(None, b"411"), (b"ten", b"400"), (b"-1", b"400")])
+def test_bad_content_length(server, length, status):
+    header = b"" if length is None else b"Content-Length: " + length + b"\r\n"
+    response = raw_request(server, b"POST /tag HTTP/1.1\r\nHost: localhost\r\n" + header + b"\r\n")
+    assert response.startswith(b"HTTP/1.1 " + status)
+
+
+def test_busy(server, service):
+    for _ in range(service.max_concurrency):
+        service.slots.acquire()
+    try:
+        status, _ = request(server, "POST", "/tag", {"template": read_template("s3.yml")})
+        assert status == 503
+    finally:
+        for _ in range(service.max_concurrency):
+            service.slots.release()
+
+
+def test_metrics(server):
+    request(server, "POST", "/tag", {"template": read_template("s3.yml")})
+    status, body = request(server, "GET", "/metrics")
+    assert status == 200
+    assert 'cfntagger_requests_total{status="200"} 1' in body
+    assert "cfntagger_tag_seconds_count 1" in body
+    assert "cfntagger_resources_tagged_total 4" in body
+
+
+def test_unix_socket(service, tmp_path):
+    path = str(tmp_path / "cfntagger.sock")
+    server = make_server(f"unix:{path}", service)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            client.sendall(b"GET /health HTTP/1.0\r\n\r\n")
+            with client.makefile("rb") as f:
+                response = f.read()
+        assert response.startswith(b"HTTP/1.1 200")
+        assert b'"status": "ok"' in response
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert not os.path.exists(path)
+
+
+def test_unix_socket_leaves_files_alone(service, tmp_path):
+    path = tmp_path / "important.txt"
+    path.write_text("keep me", encoding='utf-8')
+    with pytest.raises(OSError):
+        make_server(f"unix:{path}", service)
+    assert path.read_text(encoding='utf-8') == "keep me"
+
+
+def test_unix_socket_replaces_stale_socket(service, tmp_path):
+    path = str(tmp_path / "cfntagger.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+        stale.bind(path)
+    server = make_server(f"unix:{path}", service)
+    server.server_close()
+    assert not os.path.exists(path)
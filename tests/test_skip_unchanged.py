@@ -0,0 +1,88 @@
+import os
+import pytest
+
+from cfntagger import Tagger
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+compliant_template = """\
+---
+AWSTemplateFormatVersion: 2010-09-09
+Resources:
+  OkBucket:
+    Type: AWS::S3::Bucket
+    Properties:
+      Tags:
+        - Key: Creator
+          Value: kristof
+  OkParameter:
+    Type: AWS::SSM::Parameter
+    Properties:
+      Type: String
+      Value: foo
+      Tags:
+        Creator: kristof
+"""
+
+wrong_format_template = """\
+---
+AWSTemplateFormatVersion: 2010-09-09
+Resources:
+  NOkParameter:
+    Type: AWS::SSM::Parameter
+    Properties:
+      Type: String
+      Value: foo
+      Tags:
+        - Key: Creator
+          Value: kristof
+"""
+
+
+def write_template(tmp_path, contents):
+    cfn_template = tmp_path / "template.yml"
+    cfn_template.write_text(contents, encoding='utf-8')
+    os.utime(cfn_template, (0, 0))
+    return cfn_template
+
+
+def test_unchanged_is_not_written(mock_env_single_custom_tag, tmp_path):
+    cfn_template = write_template(tmp_path, compliant_template)
+    cfn_tagger = Tagger(filename=str(cfn_template), simulate=False, skip_unchanged=True)
+    cfn_tagger.tag()
+
+    assert not cfn_tagger.changed
+    assert cfn_template.stat().st_mtime == 0
+    assert cfn_template.read_text(encoding='utf-8') == compliant_template
+
+
+def test_unchanged_is_not_dumped(mock_env_single_custom_tag, tmp_path, capsys):
+    cfn_template = write_template(tmp_path, compliant_template)
+    Tagger(filename=str(cfn_template), simulate=True, skip_unchanged=True).tag()
+
+    output = capsys.readouterr().out
+    assert "is unchanged" in output
+    assert "AWSTemplateFormatVersion" not in output
+
+
+def test_changed_is_written(mock_env_single_custom_tag, tmp_path):
+    cfn_template = write_template(tmp_path, compliant_template.replace("kristof", "erlich"))
+    cfn_tagger = Tagger(filename=str(cfn_template), simulate=False, skip_unchanged=True)
+    cfn_tagger.tag()
+
+    assert cfn_tagger.changed
+    assert cfn_template.stat().st_mtime != 0
+    assert "erlich" not in cfn_template.read_text(encoding='utf-8')
+
+
+def test_tag_format_conversion_is_a_change(mock_env_single_custom_tag, tmp_path):
+    cfn_template = write_template(tmp_path, wrong_format_template)
+    cfn_tagger = Tagger(filename=str(cfn_template), simulate=False, skip_unchanged=True)
+    cfn_tagger.tag()
+
+    assert cfn_tagger.changed
+    assert "- Key" not in cfn_template.read_text(encoding='utf-8')
@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = {"git", "ruamel.yaml", "colorama", "http.server"}
+
+
+def run_python(code: str, env: dict = None) -> set:
+    """
+    Runs code in a fresh interpreter, returns the modules it imported
+    """
+    code += "\nimport sys, json\nprint(json.dumps(sorted(sys.modules)))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env
+    ).stdout
+    return set(json.loads(output.splitlines()[-1]))
+
+
+def test_import_package_is_light():
+    assert not run_python("import cfntagger") & HEAVY_MODULES
+
+
+def test_version_is_light():
+    modules = run_python(
+        "from cfntagger.cli import main\n"
+        "try:\n"
+        "    main(['--version'])\n"
+        "except SystemExit:\n"
+        "    pass"
+    )
+    assert not modules & HEAVY_MODULES
+
+
+def test_tagging_without_git_features(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+    modules = run_python("from cfntagger.cli import main\nmain(['--file', './tests/templates/s3.yml', '--simulate'])")
+    assert "ruamel.yaml" in modules
+    # no --git, and the output is no terminal
+    assert "git" not in modules
+    assert "colorama" not in modules
+
+
+def test_lazy_exports():
+    modules = run_python("import cfntagger\nassert cfntagger.supports_tags('AWS::S3::Bucket')\nassert 'Tagger' in dir(cfntagger)")
+    assert "cfntagger.resourcetypes" in modules
+    assert "cfntagger.cfntagger" not in modules
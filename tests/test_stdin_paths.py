@@ -0,0 +1,68 @@
+import io
+import os
+import shutil
+import pytest
+
+from cfntagger.cli import main, read_paths
+from cfntagger.runner import run
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+@pytest.fixture
+def templatedir(tmp_path):
+    for template in ["ec2.yml", "s3.yml", "jsontags.yml"]:
+        shutil.copy(f"./tests/templates/{template}", tmp_path / template)
+    return tmp_path
+
+
+def test_read_paths():
+    assert list(read_paths(io.BytesIO(b"a.yml\nb.yml\r\n\nc.yml"))) == ["a.yml", "b.yml", "c.yml"]
+    assert list(read_paths(io.BytesIO(b"a.yml\0with\nnewline.yml\0"), null=True)) == ["a.yml", "with\nnewline.yml"]
+
+
+def test_paths_are_yielded_as_they_arrive():
+    readfd, writefd = os.pipe()
+    with open(readfd, "rb") as stream, open(writefd, "wb", buffering=0) as writer:
+        writer.write(b"a.yml\nb.")
+        paths = read_paths(stream)
+        # The rest hasn't been written yet, so this would block if read_paths waited for it
+        assert next(paths) == "a.yml"
+        writer.write(b"yml\n")
+        writer.close()
+        assert list(paths) == ["b.yml"]
+
+
+def test_files_from(mock_env_single_custom_tag, templatedir, capsys):
+    listing = templatedir / "files.txt"
+    listing.write_text(
+        f"{templatedir / 's3.yml'}\n{templatedir / 'README.md'}\n{templatedir / 'missing.yml'}\n", encoding='utf-8'
+    )
+    assert main(["--files-from", str(listing)]) == 0
+
+    output = capsys.readouterr().out
+    assert "Skipping" in output and "missing.yml" in output
+    with open("./tests/templates/s3.yml", encoding='utf-8') as original:
+        assert (templatedir / "s3.yml").read_text(encoding='utf-8') != original.read()
+    with open("./tests/templates/ec2.yml", encoding='utf-8') as original:
+        assert (templatedir / "ec2.yml").read_text(encoding='utf-8') == original.read()
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_stdin_paths_null(mock_env_single_custom_tag, templatedir, monkeypatch, capsys, jobs):
+    paths = [str(templatedir / name) for name in ["ec2.yml", "s3.yml", "jsontags.yml"]]
+    monkeypatch.setattr("sys.stdin", io.TextIOWrapper(io.BytesIO("\0".join(paths).encode())))
+    assert main(["--stdin-paths", "-0", "--simulate", "--jobs", jobs]) == 0
+
+    output = capsys.readouterr().out
+    positions = [output.index(f"[{path}]") for path in paths]
+    assert positions == sorted(positions)
+
+
+def test_streaming_run_keeps_order(mock_env_single_custom_tag, templatedir):
+    cfnfiles = [str(templatedir / name) for name in ["ec2.yml", "s3.yml", "jsontags.yml"]] * 4
+    results = list(run(iter(cfnfiles), jobs=2, simulate=True))
+    assert [result["filename"] for result in results] == cfnfiles
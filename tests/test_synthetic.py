@@ -0,0 +1,43 @@
+import json
+import pytest
+
+from benchmarks.synthetic import BENCHMARK_TAGS, generate_template, generate_tree
+from cfntagger.cfntagger import Tagger, get_yaml
+
+
+@pytest.fixture
+def mock_env_benchmark_tags(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", json.dumps(BENCHMARK_TAGS))
+
+
+def test_generate_template_size():
+    data = get_yaml().load(generate_template(resources=50, seed=1))
+    assert len(data["Resources"]) == 50
+    assert generate_template(resources=50, seed=1) == generate_template(resources=50, seed=1)
+
+
+def test_generate_template_options():
+    template = generate_template(resources=20, comments=False, intrinsics=False)
+    assert "#" not in template
+    assert "!Sub" not in template and "!Ref" not in template
+
+
+def test_generated_template_is_tagged(mock_env_benchmark_tags, tmp_path):
+    cfnfile = tmp_path / "template.yml"
+    cfnfile.write_text(generate_template(resources=30, json_ratio=0.5), encoding='utf-8')
+    tagger = Tagger(filename=str(cfnfile), simulate=False)
+    tagger.tag()
+
+    for resource in get_yaml().load(cfnfile.read_text(encoding='utf-8'))["Resources"].values():
+        if resource["Type"].startswith("AWS::EC2::Route") or resource["Type"] == "AWS::IAM::Policy":
+            continue
+        tags = resource["Properties"]["Tags"]
+        if isinstance(tags, list):
+            tags = {tag["Key"]: tag["Value"] for tag in tags}
+        assert tags["Creator"] == "cfntagger"
+
+
+def test_generate_tree(tmp_path):
+    paths = generate_tree(str(tmp_path), files=12, files_per_dir=5, noise_ratio=0.5, resources=3)
+    assert len(paths) == 12
+    assert len({p.parent for p in tmp_path.glob("*/*.yml")}) == 3
@@ -0,0 +1,73 @@
+import json
+import shutil
+import time
+import pytest
+
+from cfntagger.cli import main
+from cfntagger.runner import tag_file
+from cfntagger.timings import Timings, summarize, format_summary
+
+
+@pytest.fixture
+def mock_env_single_custom_tag(monkeypatch):
+    monkeypatch.setenv("CFN_TAGS", '{"Creator": "kristof"}')
+
+
+def test_nested_phases_are_exclusive():
+    timings = Timings()
+    with timings.phase("write"):
+        with timings.phase("transform"):
+            time.sleep(0.02)
+    assert timings.phases["transform"] >= 0.02
+    assert timings.phases["write"] < 0.02
+
+
+def test_disabled_timings_record_nothing():
+    timings = Timings(enabled=False)
+    with timings.phase("load"):
+        timings.count("resources")
+    assert timings.as_dict() == {"phases": {}, "counters": {}}
+
+
+def test_tag_file_timings(mock_env_single_custom_tag, tmp_path):
+    shutil.copy("./tests/templates/s3.yml", tmp_path / "s3.yml")
+    result = tag_file(str(tmp_path / "s3.yml"), simulate=False, timings=True)
+
+    assert set(result["timings"]["phases"]) >= {"load", "merge", "transform", "write"}
+    counters = result["timings"]["counters"]
+    assert counters["resources"] == counters["tagged_resources"] == 4
+    assert counters["tags_added"] == 3
+    assert counters["bytes_written"] == (tmp_path / "s3.yml").stat().st_size
+
+
+def test_no_timings_by_default(mock_env_single_custom_tag):
+    assert "timings" not in tag_file("./tests/templates/s3.yml", simulate=True)
+
+
+def test_summary(mock_env_single_custom_tag):
+    results = [tag_file(f"./tests/templates/{t}", simulate=True, timings=True) for t in ["s3.yml", "ec2.yml"]]
+    summary = summarize(Timings(), results)
+
+    assert [entry["filename"] for entry in summary["files"]] == [r["filename"] for r in results]
+    assert summary["totals"]["counters"]["resources"] == sum(
+        r["timings"]["counters"]["resources"] for r in results
+    )
+    table = format_summary(summary)
+    assert table.startswith("[TIMINGS] 2 templates")
+    assert "tags_added" in table
+
+
+def test_cli_timings_and_profile(mock_env_single_custom_tag, tmp_path, capsys):
+    shutil.copy("./tests/templates/s3.yml", tmp_path / "s3.yml")
+    timingsfile = tmp_path / "timings.json"
+    profile = tmp_path / "cfntagger.prof"
+
+    assert main([
+        "--directory", str(tmp_path), "--timings", str(timingsfile), "--profile", str(profile)
+    ]) == 0
+
+    assert "[TIMINGS] 1 templates" in capsys.readouterr().out
+    summary = json.loads(timingsfile.read_text(encoding='utf-8'))
+    assert "config" in summary["run"]["phases"]
+    assert summary["files"][0]["counters"]["tags_added"] == 3
+    assert profile.stat().st_size > 0
@@ -0,0 +1,35 @@
+import threading
+
+from cfntagger.cfntagger import get_yaml
+
+
+def test_engine_is_reused():
+    assert get_yaml() is get_yaml()
+    assert get_yaml("safe") is get_yaml("safe")
+    assert get_yaml() is not get_yaml("safe")
+
+
+def test_engine_per_thread():
+    engines = []
+    thread = threading.Thread(target=lambda: engines.append(get_yaml()))
+    thread.start()
+    thread.join()
+    assert engines[0] is not get_yaml()
+
+
+def test_safe_engine_loads_intrinsic_functions():
+    data = get_yaml("safe").load("""\
+Resources:
+  MyBucket:
+    Type: AWS::S3::Bucket
+    Properties:
+      BucketName: !Sub "${AWS::StackName}-bucket"
+      Tags:
+        - Key: Creator
+          Value: !Ref Creator
+        - Key: Team
+          Value: !Join ["-", [a, b]]
+""")
+    tags = data["Resources"]["MyBucket"]["Properties"]["Tags"]
+    assert tags[0] == {"Key": "Creator", "Value": {"Ref": "Creator"}}
+    assert tags[1] == {"Key": "Team", "Value": {"Fn::Join": ["-", ["a", "b"]]}}